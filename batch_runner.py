@@ -0,0 +1,250 @@
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import pygame as pg
+
+import shootinggame as sg
+
+
+# 調整できるパラメータ -> (クラス名, 属性名)
+TUNABLES = {
+    "enemy_interval": ("Game", "enemy_interval"),
+    "boss_hp": ("Boss", "max_hp"),
+    "beam1_score": ("Bird", "beam1_score"),
+    "beam2_score": ("Bird", "beam2_score"),
+}
+
+
+def bomb_positions(game: sg.Game) -> list[tuple[float, float]]:
+    """
+    画面上の爆弾の中心座標のリストを返す（NumPy版の弾エンジンにも対応）
+    """
+    if game.engine is None:
+        return [bomb.rect.center for bomb in game.bombs]
+    bombs = game.engine.bombs
+    return list(zip(bombs.x[:bombs.n].tolist(), bombs.y[:bombs.n].tolist()))
+
+
+class Policy:
+    """
+    自動で操作するプレイヤーの基底クラス
+    actで毎フレームの入力を返す
+    """
+    name = "idle"
+    description = "何も操作しない"
+
+    def __init__(self, rng: random.Random):
+        """
+        引数 rng：操作を決める乱数生成器（ゲームの乱数とは別にする）
+        """
+        self.rng = rng
+
+    def act(self, game: sg.Game) -> tuple[dict, list[pg.event.Event]]:
+        """
+        次のフレームの入力を返す
+        戻り値：押下キーの真理値辞書，キーイベントのリスト
+        """
+        return collections.defaultdict(bool), []
+
+    def unlock(self, game: sg.Game) -> list[pg.event.Event]:
+        """
+        スコアが解放条件に達したら，強いビームに切り替えるキーイベントを返す
+        """
+        if game.keytype < 2 and game.score.value >= sg.Bird.beam2_score:
+            return [pg.event.Event(pg.KEYDOWN, key=pg.K_2)]
+        if game.keytype < 1 and game.score.value >= sg.Bird.beam1_score:
+            return [pg.event.Event(pg.KEYDOWN, key=pg.K_1)]
+        return []
+
+
+class RandomPolicy(Policy):
+    """
+    移動方向を一定間隔でランダムに変え，ランダムにビームを撃つプレイヤー
+    """
+    name = "random"
+    description = "ランダムに移動し，ランダムにビームを撃つ"
+    hold = 15  # 同じ方向に移動し続けるフレーム数
+    fire_rate = 0.3  # 1フレームにビームを撃つ確率
+
+    def __init__(self, rng: random.Random):
+        super().__init__(rng)
+        self.keys = ()
+
+    def act(self, game: sg.Game) -> tuple[dict, list[pg.event.Event]]:
+        if game.tmr % __class__.hold == 0:
+            self.keys = tuple(k for k in sg.Bird.delta if self.rng.random() < 0.3)
+        key_lst = collections.defaultdict(bool)
+        for k in self.keys:
+            key_lst[k] = True
+        events = self.unlock(game)
+        if self.rng.random() < __class__.fire_rate:
+            events.append(pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE))
+        return key_lst, events
+
+
+class ScriptedPolicy(Policy):
+    """
+    一番近い爆弾から上下に逃げながら，一定間隔でビームを撃ち続けるプレイヤー
+    """
+    name = "scripted"
+    description = "近い爆弾を上下によけながら一定間隔でビームを撃つ"
+    fire_interval = 4  # ビームを撃つ間隔（フレーム数）
+    danger = 200  # よけ始める爆弾までの距離（px）
+
+    def act(self, game: sg.Game) -> tuple[dict, list[pg.event.Event]]:
+        key_lst = collections.defaultdict(bool)
+        bird = game.bird.rect
+        nearest = None
+        for x, y in bomb_positions(game):
+            d = abs(x-bird.centerx) + abs(y-bird.centery)
+            if d < __class__.danger and (nearest is None or d < nearest[0]):
+                nearest = d, y
+        if nearest is not None:
+            key_lst[pg.K_UP if nearest[1] >= bird.centery else pg.K_DOWN] = True
+        else:  # 画面中央の高さに戻る
+            if bird.centery < sg.HEIGHT//2 - 50:
+                key_lst[pg.K_DOWN] = True
+            elif bird.centery > sg.HEIGHT//2 + 50:
+                key_lst[pg.K_UP] = True
+        events = self.unlock(game)
+        if game.tmr % __class__.fire_interval == 0:
+            events.append(pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE))
+        return key_lst, events
+
+
+POLICIES = {cls.name: cls for cls in (Policy, RandomPolicy, ScriptedPolicy)}
+
+
+def init_worker(params: dict[str, int]):
+    """
+    ワーカープロセスの初期化（画面なしでpygameを初期化し，画像を読み込み，パラメータを設定する）
+    引数 params：TUNABLESの名前 -> 値
+    """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pg.init()
+    pg.display.set_mode((1, 1))  # convertに画面が必要なだけなので最小の大きさにする
+    sg.load_assets()
+    for name, value in params.items():
+        cls, attr = TUNABLES[name]
+        setattr(getattr(sg, cls), attr, value)
+
+
+def play(seed: int, policy: str, ticks: int, soa: bool = False) -> dict:
+    """
+    1回のゲームを画面なし・描画なしで最後まで（またはticksフレームまで）進める
+    引数1 seed：ゲームとプレイヤーの乱数の種
+    引数2 policy：プレイヤーの名前（POLICIESのキー）
+    引数3 ticks：1ゲームのフレーム数の上限
+    引数4 soa：ビームと爆弾をNumPy配列でまとめて処理するか
+    戻り値：ゲームの結果の辞書
+    """
+    start = time.perf_counter()
+    game = sg.Game(soa, seed, particles=False)  # 描画しないので爆発の粒子は作らない
+    player = POLICIES[policy](random.Random(seed ^ 0x5EED))
+    peak = dict.fromkeys(game.counts(), 0)  # 一度も出現しなかった種類も0として残す（結果のキーをそろえる）
+    boss_kill = None
+    grid = collections.Counter()  # 格子の候補ペア数と衝突ペア数の合計と，1フレームの最大
+    while game.tmr < ticks:
+        key_lst, events = player.act(game)
+        for event in events:
+            game.handle_event(event)
+        game.step(key_lst)
+        for name, n in game.counts().items():
+            if n > peak[name]:
+                peak[name] = n
+        for name, n in game.stats()["grid"].items():
+            grid[name] += n
+            grid[f"{name}_max"] = max(grid[f"{name}_max"], n)
+        if game.scene == sg.Game.GAME_CLEAR:
+            boss_kill = game.tmr - game.boss_tick  # ボス出現から倒すまでのフレーム数
+        if game.scene in sg.Game.END_SCENES:
+            break
+    result = game.summary()
+    result.update(
+        seed=seed, policy=policy, survival=game.tmr, cleared=game.scene == sg.Game.GAME_CLEAR,
+        boss_kill=boss_kill, peak=dict(peak), seconds=time.perf_counter() - start,
+        grid={
+            "candidates_per_tick": grid["candidates"] / max(game.tmr, 1), "candidates_max": grid["candidates_max"],
+            "hits_per_tick": grid["hits"] / max(game.tmr, 1), "hits_max": grid["hits_max"],
+        },
+    )
+    return result
+
+
+def aggregate(results: list[dict]) -> dict:
+    """
+    ゲームごとの結果をまとめた統計値を求める
+    """
+    def stats(values: list[float]) -> dict[str, float] | None:
+        if not values:
+            return None
+        return {
+            "mean": statistics.fmean(values), "median": statistics.median(values),
+            "min": min(values), "max": max(values),
+        }
+
+    kills = [r["boss_kill"] for r in results if r["boss_kill"] is not None]
+    peak = collections.Counter()
+    for r in results:
+        for name, n in r["peak"].items():
+            peak[name] = max(peak[name], n)
+    return {
+        "games": len(results),
+        "score": stats([r["score"] for r in results]),
+        "survival": stats([r["survival"] for r in results]),
+        "clear_rate": len(kills) / len(results) if results else 0.0,
+        "boss_kill": stats(kills),
+        "game_over_rate": sum(r["scene"] == sg.Game.GAME_OVER for r in results) / len(results) if results else 0.0,
+        "peak": dict(peak),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="shootinggame.pyを自動プレイで大量に並列実行する")
+    parser.add_argument("--games", type=int, default=100, help="実行するゲーム数")
+    parser.add_argument("--seed", type=int, default=0, help="最初のゲームの乱数の種（ゲームごとに1ずつ増やす）")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="scripted", help="自動で操作するプレイヤー")
+    parser.add_argument("--ticks", type=int, default=3000, help="1ゲームのフレーム数の上限")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPUコア数）")
+    parser.add_argument("--soa", action="store_true", help="ビームと爆弾をNumPy配列でまとめて処理する")
+    parser.add_argument("--out", default="batch_results.jsonl", help="ゲームごとの結果を届いた順に書き出すJSON Linesファイル")
+    for name, (cls, attr) in TUNABLES.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=None,
+                            help=f"{cls}.{attr}（既定値 {getattr(getattr(sg, cls), attr)}）")
+    args = parser.parse_args()
+
+    params = {name: getattr(args, name) for name in TUNABLES if getattr(args, name) is not None}
+    results = []
+    start = time.perf_counter()
+    with open(args.out, "w") as out, concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.workers, initializer=init_worker, initargs=(params,)
+    ) as pool:
+        futures = [
+            pool.submit(play, args.seed + i, args.policy, args.ticks, args.soa) for i in range(args.games)
+        ]
+        for future in concurrent.futures.as_completed(futures):  # 終わったゲームから順に受け取る
+            result = future.result()
+            results.append(result)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            print(f"[{len(results)}/{args.games}] seed={result['seed']} score={result['score']} "
+                  f"survival={result['survival']} {result['scene']}", flush=True)
+    elapsed = time.perf_counter() - start
+
+    summary = aggregate(results)
+    summary.update(params=params, policy=args.policy, ticks=args.ticks, seconds=elapsed,
+                   games_per_second=len(results) / max(elapsed, 1e-9))
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
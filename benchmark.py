@@ -0,0 +1,369 @@
+import argparse
+import collections
+import gc
+import json
+import os
+import platform
+import random
+import sys
+
+import pygame as pg
+
+import shootinggame as sg
+
+
+# 計測する処理の段階 -> 対応するPROFILERの段階名
+STAGE_SECTIONS = {
+    "update": ("events", "spawn", "update"),
+    "collision": ("collision",),
+    "draw": ("background", "sprites", "hud"),
+    "audio": ("audio",),
+    "flip": ("flip",),
+}
+STAGES = tuple(STAGE_SECTIONS)
+# 処理時間が変わる設定（ベースラインと違えば比較しない）
+META_KEYS = ("render", "soa", "dirty", "pixel_collision", "particles", "resolution", "sound")
+
+
+class Scenario:
+    """
+    人の操作なしで再現できる負荷シナリオの基底クラス
+    setupでゲームの初期状態を作り，inputで毎フレームの入力を返す
+    """
+    name = "idle"
+    description = "敵機の出現だけの通常プレイ（入力なし）"
+
+    def new_game(self, soa: bool, seed: int, pixel: bool = False, particles: bool = True) -> sg.Game:
+        """
+        計測するGameを作る
+        """
+        return sg.Game(soa, seed, pixel=pixel, particles=particles)
+
+    def setup(self, game: sg.Game):
+        """
+        ゲームの初期状態を作る
+        引数 game：ベンチマーク対象のGame
+        """
+        game.invincible = True  # 残機切れで止まらないようにする
+
+    def input(self, game: sg.Game, tick: int) -> tuple[dict, list[pg.event.Event]]:
+        """
+        tickフレーム目の入力を返す
+        戻り値：押下キーの真理値辞書，キーイベントのリスト
+        """
+        return collections.defaultdict(bool), []
+
+
+class EnemiesStop(Scenario):
+    """
+    停止状態のN体の敵機が爆弾を投下し続けるシナリオ
+    """
+    name = "enemies_stop"
+    description = "停止状態の敵機N体が爆弾を投下し続ける"
+
+    def __init__(self, enemies: int = 200):
+        self.enemies = enemies
+
+    def setup(self, game: sg.Game):
+        super().setup(game)
+        for _ in range(self.enemies):
+            emy = sg.Enemy()
+            emy.rect.center = random.randint(sg.WIDTH//2, sg.WIDTH-100), random.randint(50, sg.HEIGHT-200)
+            emy.vx = emy.vy = 0
+            emy.state = "stop"
+            game.add_enemy(emy)
+
+
+class BossFight(Scenario):
+    """
+    ボス戦で横長ビーム（Beam2）を撃ち続けるシナリオ
+    """
+    name = "boss_fight"
+    description = "ボスに横長ビームを2フレームに1回撃ち続ける"
+
+    def setup(self, game: sg.Game):
+        super().setup(game)
+        game.tmr = game.boss_tick  # ボス出現のフレーム
+        game.start_stage(game.tmr)  # それより前の敵機の出現は飛ばす
+        game.score.value = 100  # 横長ビームの解放条件
+        game.handle_event(pg.event.Event(pg.KEYDOWN, key=pg.K_2))
+
+    def input(self, game: sg.Game, tick: int) -> tuple[dict, list[pg.event.Event]]:
+        for boss in game.boss_group:
+            boss.hp = max(boss.hp, 10**6)  # 計測中に倒してしまわないようにする
+        key_lst = collections.defaultdict(bool)
+        key_lst[(pg.K_UP, pg.K_DOWN)[tick // 40 % 2]] = True  # 上下に動きながら撃つ
+        key_lst[pg.K_RIGHT] = True
+        events = [pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE)] if tick % 2 == 0 else []
+        return key_lst, events
+
+
+class ExplosionStorm(Scenario):
+    """
+    毎フレーム大量の爆発エフェクトを発生させるシナリオ
+    """
+    name = "explosion_storm"
+    description = "毎フレームN個の爆発エフェクトを発生させる"
+
+    def __init__(self, per_tick: int = 20):
+        self.per_tick = per_tick
+
+    def input(self, game: sg.Game, tick: int) -> tuple[dict, list[pg.event.Event]]:
+        for _ in range(self.per_tick):
+            obj = pg.sprite.Sprite()
+            obj.rect = pg.Rect(random.randint(0, sg.WIDTH), random.randint(0, sg.HEIGHT), 1, 1)
+            game.exps.add(sg.Explosion.spawn(obj, 100))
+        return super().input(game, tick)
+
+
+class ReplayScenario(Scenario):
+    """
+    shootinggame.py --recordで記録したプレイを再生するシナリオ
+    記録したプレイを集めておけば，そのまま性能の回帰テストに使える
+    """
+    description = "記録した入力を再生する"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = f"replay:{os.path.basename(path)}"
+        self.replay = None
+
+    def new_game(self, soa: bool, seed: int, pixel: bool = False, particles: bool = True) -> sg.Game:
+        self.replay = sg.InputReplay(self.path)  # 乱数の種とsoaは記録時のものを使う
+        return self.replay.new_game(particles=particles)
+
+    def setup(self, game: sg.Game):
+        pass  # 記録時と同じ結果になるように無敵にしない
+
+    def input(self, game: sg.Game, tick: int) -> tuple[dict, list[pg.event.Event]]:
+        frame = self.replay.next()
+        return frame if frame is not None else super().input(game, tick)
+
+
+SCENARIOS = {cls.name: cls for cls in (Scenario, EnemiesStop, BossFight, ExplosionStorm)}
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    値のリストのq分位点（0〜100）を線形補間で求める
+    """
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values)-1) * q / 100
+    i = int(k)
+    j = min(i+1, len(values)-1)
+    return values[i] + (values[j]-values[i]) * (k-i)
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """
+    1フレームごとの処理時間（ミリ秒）のリストから統計値を求める
+    """
+    return {
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "mean": sum(samples) / len(samples) if samples else 0.0,
+    }
+
+
+def run_scenario(scenario: Scenario, screen: pg.Surface, ticks: int, warmup: int,
+                 seed: int, render: bool = True, soa: bool = False, dirty: bool = False, pixel: bool = False,
+                 particles: bool = True) -> dict:
+    """
+    シナリオを実行し，段階ごとの処理時間の統計値を返す
+    引数1 scenario：実行するシナリオ
+    引数2 screen：描画先の画面Surface
+    引数3 ticks：計測するフレーム数
+    引数4 warmup：計測前に捨てるフレーム数
+    引数5 seed：乱数の種
+    引数6 render：描画と画面更新を行うか
+    引数7 soa：ビームと爆弾をNumPy配列でまとめて処理するか
+    引数8 dirty：背景が静止している間は変化した矩形だけを描き直すか
+    引数9 pixel：画像のマスクを使ってピクセル単位で当たり判定するか
+    引数10 particles：爆発を粒子で描くか
+    戻り値：段階名 -> 統計値の辞書
+    """
+    random.seed(seed)
+    game = scenario.new_game(soa, seed, pixel, particles)
+    scenario.setup(game)
+    samples = {stage: [] for stage in STAGES + ("total",)}
+    profiler = sg.PROFILER
+    profiler.configure(recording=True)
+    sg.AUDIO.stats.clear()
+    sg.reset_pool_stats()
+    peak = 0
+    grid = {"candidates": [], "hits": []}  # フレームごとの格子の候補ペア数と衝突ペア数
+    for tick in range(warmup + ticks):
+        key_lst, events = scenario.input(game, tick)
+        profiler.begin_frame()
+        with profiler.section("events"):
+            for event in events:
+                game.handle_event(event)
+        game.step(key_lst)
+        with profiler.section("audio"):
+            sg.AUDIO.flush()
+        if render:
+            rects = game.draw(screen, dirty)
+            with profiler.section("flip"):
+                if rects is None:
+                    pg.display.flip()
+                else:
+                    pg.display.update(rects)
+        profiler.end_frame()
+        pg.event.pump()
+        peak = max(peak, sum(game.counts().values()))
+        if tick < warmup:
+            continue
+        for name, n in game.stats()["grid"].items():
+            grid[name].append(n)
+        for stage, names in STAGE_SECTIONS.items():
+            samples[stage].append(sum(profiler.last.get(name, 0.0) for name in names))
+        samples["total"].append(profiler.frame_ms)
+    profiler.configure(recording=False)
+    result = {stage: summarize(values) for stage, values in samples.items()}
+    result["peak_entities"] = peak
+    result["grid"] = {name: summarize(values) for name, values in grid.items()}
+    result["pools"] = sg.pool_stats()  # スプライトのプールの最大使用数，新規生成数，再利用数
+    result["sounds"] = dict(sg.AUDIO.stats)  # 鳴らした・まとめた・間引いた効果音の数
+    return result
+
+
+def meta_mismatch(results: dict, baseline: dict) -> list[str]:
+    """
+    今回とベースラインで違う設定を探す（古いベースラインに無い設定は調べない）
+    戻り値：違う設定の説明のリスト
+    """
+    new, old = results["meta"], baseline.get("meta", {})
+    return [f"{key}: baseline {old[key]} != {new[key]}" for key in META_KEYS if key in old and old[key] != new[key]]
+
+
+def compare(results: dict, baseline: dict, threshold: float, floor: float = 0.05) -> list[str]:
+    """
+    ベースラインと比べてp95が悪化した段階を探す
+    引数1 results：今回の結果
+    引数2 baseline：保存済みの結果
+    引数3 threshold：悪化とみなす増加率（0.15なら15%）
+    引数4 floor：悪化とみなす最小の増加量（ミリ秒）
+    戻り値：悪化した項目の説明のリスト
+    """
+    regressions = []
+    for name, stages in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        for stage in STAGES + ("total",):
+            if stage not in base:  # 古いベースラインに無い段階
+                continue
+            new, old = stages[stage]["p95"], base[stage]["p95"]
+            if new > old * (1 + threshold) and new - old > floor:
+                regressions.append(f"{name}/{stage}: p95 {old:.3f} ms -> {new:.3f} ms (+{(new/old-1)*100 if old else 0:.0f}%)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="shootinggame.pyのベンチマーク")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="実行するシナリオ（複数指定可，省略時は全て）")
+    parser.add_argument("--ticks", type=int, default=500, help="計測するフレーム数")
+    parser.add_argument("--warmup", type=int, default=50, help="計測前に捨てるフレーム数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+    parser.add_argument("--enemies", type=int, default=200, help="enemies_stopの敵機数")
+    parser.add_argument("--explosions", type=int, default=20, help="explosion_stormの1フレームあたりの爆発数")
+    parser.add_argument("--no-render", action="store_true", help="描画と画面更新を計測しない")
+    parser.add_argument("--soa", action="store_true", help="ビームと爆弾をNumPy配列でまとめて処理する")
+    parser.add_argument("--dirty", action="store_true", help="背景が静止している間は変化した矩形だけを描き直す")
+    parser.add_argument("--pixel-collision", action="store_true", help="画像のマスクを使ってピクセル単位で当たり判定する")
+    parser.add_argument("--no-particles", action="store_true", help="爆発を粒子ではなくExplosionスプライトで描く")
+    parser.add_argument("--resolution", choices=list(sg.RenderView.PRESETS), default="high", help="描画解像度")
+    parser.add_argument("--mute", action="store_true", help="効果音を鳴らさない")
+    parser.add_argument("--window", action="store_true", help="dummyドライバではなく実際のウィンドウに描画する")
+    parser.add_argument("--out", default="benchmark_results.json", help="結果を書き出すJSONファイル")
+    parser.add_argument("--baseline", help="比較するベースラインのJSONファイル")
+    parser.add_argument("--save-baseline", action="store_true", help="結果を--baselineのファイルに保存する")
+    parser.add_argument("--replay", action="append", default=[], metavar="PATH",
+                        help="shootinggame.py --recordで記録したプレイもシナリオとして実行する（複数指定可）")
+    parser.add_argument("--threshold", type=float, default=0.15, help="悪化とみなすp95の増加率")
+    args = parser.parse_args()
+
+    if not args.window:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+    sg.AUDIO.pre_init()
+    pg.init()
+    sg.VIEW.configure(args.resolution)
+    screen = pg.display.set_mode(sg.VIEW.size, pg.SCALED if sg.VIEW.scaled and args.window else 0)
+    sg.load_assets()
+    if not args.mute:
+        sg.AUDIO.preload()
+    gc.collect()
+    gc.freeze()  # shootinggame.mainと同じく，起動時のオブジェクトをGCの対象から外す
+
+    scenarios = {
+        "idle": Scenario(),
+        "enemies_stop": EnemiesStop(args.enemies),
+        "boss_fight": BossFight(),
+        "explosion_storm": ExplosionStorm(args.explosions),
+    }
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pg.version.ver,
+            "platform": platform.platform(),
+            "ticks": args.ticks,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "render": not args.no_render,
+            "soa": args.soa,
+            "dirty": args.dirty,
+            "pixel_collision": args.pixel_collision,
+            "particles": not args.no_particles,
+            "resolution": args.resolution,
+            "sound": bool(sg.AUDIO.sounds),
+        },
+        "scenarios": {},
+    }
+    for path in args.replay:
+        scenario = ReplayScenario(path)
+        scenarios[scenario.name] = scenario
+    # --replayだけを指定したときは記録したプレイだけを実行する
+    names = args.scenario or [name for name in scenarios if not args.replay or name.startswith("replay:")]
+    for name in names:
+        result = run_scenario(scenarios[name], screen, args.ticks, args.warmup, args.seed,
+                              render=not args.no_render, soa=args.soa, dirty=args.dirty,
+                              pixel=args.pixel_collision, particles=not args.no_particles)
+        results["scenarios"][name] = result
+        print(f"{name:16s} " + "  ".join(
+            f"{stage} {result[stage]['p50']:.2f}/{result[stage]['p95']:.2f}/{result[stage]['p99']:.2f}"
+            for stage in STAGES + ("total",)
+        ) + f"  (p50/p95/p99 ms, peak {result['peak_entities']})")
+    pg.quit()
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {args.out}")
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved baseline {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        mismatches = meta_mismatch(results, baseline)
+        for line in mismatches:
+            print(f"BASELINE MISMATCH {line}")
+        if mismatches:  # 設定が違う計測どうしを比べても意味が無い
+            print("not comparing: rerun with the baseline's settings or refresh it with --save-baseline")
+            return 2
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+import os
+import random
+
+import numpy as np
+import pygame as pg
+
+import shootinggame as sg
+
+
+# 行動番号 % 9 -> 押す移動キー（行動番号 // 9 が1ならビームも撃つ）
+MOVES = (
+    (),
+    (pg.K_UP,), (pg.K_UP, pg.K_RIGHT), (pg.K_RIGHT,), (pg.K_DOWN, pg.K_RIGHT),
+    (pg.K_DOWN,), (pg.K_DOWN, pg.K_LEFT), (pg.K_LEFT,), (pg.K_UP, pg.K_LEFT),
+)
+ACTIONS = 2 * len(MOVES)  # 行動の数（移動9通り×撃つ/撃たない）
+FIRE = pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE)
+
+
+def init():
+    """
+    pygameと画面（無ければウィンドウなし）を初期化し，画像を読み込む（済んでいるものは飛ばす）
+    ゲームの画面が既にあればそれを使い，描画解像度の設定（VIEW）は変えない
+    """
+    if pg.display.get_surface() is None:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        pg.init()
+        pg.display.set_mode((1, 1))  # convertに画面が必要なだけなので最小の大きさにする
+    if not sg.ASSETS.surfaces:
+        sg.load_assets()
+
+
+class ShootingEnv:
+    """
+    ゲームをreset/stepで1フレームずつ進める，自動プレイの学習・評価用の環境
+    観測は状態（固定長のfloat32配列）か，縮小した画面（uint8のRGB配列）
+    状態の配列は [戦闘機 | ボス | 敵機×max_enemies | 爆弾×max_bombs | ドロップ×max_drops] の順に並べ，
+    座標は画面の幅と高さで0〜1に，速度はspeed_scaleで割って正規化する
+    空いている枠は0で埋め，先頭の値（存在フラグ）で区別する
+    """
+    max_enemies = 16
+    max_bombs = 32  # 戦闘機に近い順に入れる
+    max_drops = 8
+    speed_scale = 10  # 速度（px/フレーム）を割る値
+    life_penalty = 50  # 残機が1減ったときの報酬
+    layout = {  # 種類 -> (枠の数, 1枠の値の数)
+        "bird": (1, 5),  # x, y, 残機/3, 無敵中か, ビームの種類/2
+        "boss": (1, 4),  # 存在, x, y, HP/最大HP
+        "enemies": (max_enemies, 5),  # 存在, x, y, vx, vy
+        "bombs": (max_bombs, 5),  # 存在, x, y, vx, vy
+        "drops": (max_drops, 3),  # 存在, x, y
+    }
+    observation_size = sum(n * k for n, k in layout.values())
+
+    def __init__(self, observation: str = "state", frame_size: tuple[int, int] = (160, 90),
+                 max_steps: int = 3000, soa: bool = True, auto_unlock: bool = True, resolution: str = "lowest"):
+        """
+        引数1 observation："state"なら状態の配列，"frame"なら縮小した画面を観測として返す
+        引数2 frame_size：画面を観測するときの大きさ（幅, 高さ）
+        引数3 max_steps：1エピソードのフレーム数の上限（超えたらtruncated）
+        引数4 soa：ビームと爆弾をNumPy配列でまとめて処理するか（状態の観測も速くなる）
+        引数5 auto_unlock：スコアが解放条件に達したら強いビームに自動で切り替えるか
+        引数6 resolution：画面を観測するときに描く解像度（RenderView.PRESETSのキー，この環境だけの設定）
+        """
+        if observation not in ("state", "frame"):
+            raise ValueError(f"observationは'state'か'frame'です: {observation}")
+        init()
+        self.observation = observation
+        self.frame_size = frame_size
+        self.max_steps = max_steps
+        self.soa = soa
+        self.auto_unlock = auto_unlock
+        self.view = sg.RenderView()  # 他の環境やゲームの描画解像度を変えないように，環境ごとに持つ
+        self.view.configure(resolution)
+        self.seeds = random.Random()  # 種を指定しないresetで使う乱数
+        self.game = None
+        self.canvas = None  # 画面を観測するときの描画先
+        self.keys = [{} for _ in MOVES]  # 移動番号 -> 押下キーの真理値辞書
+        for keys, move in zip(self.keys, MOVES):
+            for k in sg.Bird.delta:
+                keys[k] = k in move
+
+    @property
+    def observation_shape(self) -> tuple[int, ...]:
+        if self.observation == "frame":
+            return self.frame_size[1], self.frame_size[0], 3
+        return (__class__.observation_size,)
+
+    def reset(self, seed: int | None = None) -> tuple[np.ndarray, dict]:
+        """
+        新しいゲームを始める
+        引数 seed：ゲームの乱数の種（Noneなら前回の種から決まる乱数で選ぶ）
+        戻り値：最初の観測，情報の辞書
+        """
+        if seed is None:
+            seed = self.seeds.randrange(2**63)
+        else:
+            self.seeds.seed(seed)
+        with sg.using_view(self.view):  # 背景をこの環境の描画解像度で作る
+            self.game = sg.Game(self.soa, seed, particles=self.observation == "frame")
+        return self.observe(), self.info()
+
+    def step(self, action: int) -> tuple[np.ndarray, float, bool, bool, dict]:
+        """
+        行動を1フレーム分入力してゲームを進める
+        引数 action：行動番号（0〜ACTIONS-1）
+        戻り値：観測，報酬，終了したか（ゲームオーバー/クリアー），打ち切ったか（max_steps），情報の辞書
+        """
+        game = self.game
+        score, life = game.score.value, game.score.bird_life
+        move, fire = action % len(MOVES), action // len(MOVES)
+        if self.auto_unlock:
+            self.unlock()
+        if fire:
+            game.handle_event(FIRE)
+        game.step(self.keys[move])
+        reward = game.score.value - score - __class__.life_penalty * (life - game.score.bird_life)
+        terminated = game.scene in sg.Game.END_SCENES
+        truncated = not terminated and game.tmr >= self.max_steps
+        return self.observe(), float(reward), terminated, truncated, self.info()
+
+    def unlock(self):
+        """
+        スコアが解放条件に達したら強いビームに切り替える（batch_runner.Policy.unlockと同じ条件）
+        """
+        game = self.game
+        if game.keytype < 2 and game.score.value >= sg.Bird.beam2_score:
+            game.handle_event(pg.event.Event(pg.KEYDOWN, key=pg.K_2))
+        elif game.keytype < 1 and game.score.value >= sg.Bird.beam1_score:
+            game.handle_event(pg.event.Event(pg.KEYDOWN, key=pg.K_1))
+
+    def info(self) -> dict:
+        return self.game.summary()
+
+    def observe(self) -> np.ndarray:
+        return self.frame() if self.observation == "frame" else self.state()
+
+    def state(self) -> np.ndarray:
+        """
+        状態の観測（固定長のfloat32配列）を返す
+        """
+        game = self.game
+        w, h, v = sg.WIDTH, sg.HEIGHT, __class__.speed_scale
+        obs = np.zeros(__class__.observation_size, dtype=np.float32)
+        bird = game.bird.rect
+        obs[:5] = (bird.centerx / w, bird.centery / h, game.score.bird_life / 3,
+                   game.scene == sg.Game.HIT, game.keytype / 2)
+        i = 5
+        if game.boss is not None and game.boss.alive():
+            boss = game.boss
+            obs[i:i+4] = 1, boss.rect.centerx / w, boss.rect.centery / h, boss.hp / sg.Boss.max_hp
+        i += 4
+        rows = [(1, e.rect.centerx / w, e.rect.centery / h, e.vx / v, e.vy / v) for e in game.emys]
+        i = self.fill(obs, i, rows[:__class__.max_enemies], *__class__.layout["enemies"])
+        self.bombs(obs[i:i + __class__.max_bombs*5].reshape(__class__.max_bombs, 5), bird.center)
+        i += __class__.max_bombs*5
+        rows = [(1, d.rect.centerx / w, d.rect.centery / h) for d in game.drops]
+        self.fill(obs, i, rows[:__class__.max_drops], *__class__.layout["drops"])
+        return obs
+
+    def bombs(self, out: np.ndarray, center: tuple[int, int]):
+        """
+        戦闘機に近い順に最大max_bombs個の爆弾の (存在, x, y, vx, vy) をoutの各行に書き込む
+        """
+        game = self.game
+        if game.engine is None:
+            if not game.bombs:
+                return
+            cols = np.array([(b.rect.centerx, b.rect.centery, b.speed * b.vx, b.speed * b.vy)
+                             for b in game.bombs], dtype=np.float64).T
+        else:
+            bombs = game.engine.bombs  # compact済みなので先頭n個が生きている爆弾
+            if not bombs.n:
+                return
+            n = bombs.n
+            cols = bombs.x[:n], bombs.y[:n], bombs.vx[:n], bombs.vy[:n]
+        x, y, vx, vy = cols
+        k = len(x)
+        if k > len(out):
+            k = len(out)
+            sel = np.argpartition(np.abs(x - center[0]) + np.abs(y - center[1]), k)[:k]
+            x, y, vx, vy = x[sel], y[sel], vx[sel], vy[sel]
+        v = __class__.speed_scale
+        out[:k, 0] = 1
+        out[:k, 1] = x / sg.WIDTH
+        out[:k, 2] = y / sg.HEIGHT
+        out[:k, 3] = vx / v
+        out[:k, 4] = vy / v
+
+    @staticmethod
+    def fill(obs: np.ndarray, start: int, rows, slots: int, size: int) -> int:
+        """
+        obs[start:]にrowsを1枠size個ずつ書き込み，次の種類の開始位置を返す
+        """
+        if rows:
+            obs[start:start + len(rows)*size] = np.asarray(rows, dtype=np.float32).ravel()
+        return start + slots*size
+
+    def frame(self) -> np.ndarray:
+        """
+        縮小した画面の観測（高さ×幅×3のuint8配列）を返す（ウィンドウには表示しない）
+        """
+        if self.canvas is None:
+            self.canvas = pg.Surface(self.view.size).convert()
+        with sg.using_view(self.view):
+            self.game.draw(self.canvas)
+        small = pg.transform.smoothscale(self.canvas, self.frame_size)
+        return pg.surfarray.array3d(small).transpose(1, 0, 2)
+
+
+class VectorShootingEnv:
+    """
+    独立した複数のShootingEnvを1回の呼び出しでまとめて進める環境
+    終了または打ち切りになった環境は自動で次のゲームを始め，最後の観測をinfoの"final_observation"に入れる
+    環境を順に進めるだけなので，1環境あたりの速さはShootingEnvと同じ（まとめて扱うためのインターフェースで，高速化はしない）
+    """
+    def __init__(self, n: int, **kwargs):
+        """
+        引数1 n：環境の数
+        引数2 kwargs：ShootingEnvに渡す引数
+        """
+        self.envs = [ShootingEnv(**kwargs) for _ in range(n)]
+
+    def __len__(self) -> int:
+        return len(self.envs)
+
+    def reset(self, seed: int | None = None) -> tuple[np.ndarray, list[dict]]:
+        """
+        全ての環境で新しいゲームを始める
+        引数 seed：最初の環境の乱数の種（環境ごとに1ずつ増やす，Noneならランダム）
+        戻り値：観測を並べた配列，情報の辞書のリスト
+        """
+        results = [env.reset(None if seed is None else seed + i) for i, env in enumerate(self.envs)]
+        return np.stack([obs for obs, _ in results]), [info for _, info in results]
+
+    def step(self, actions) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, list[dict]]:
+        """
+        環境ごとの行動で全ての環境を1フレーム進める
+        引数 actions：環境ごとの行動番号
+        戻り値：観測，報酬，終了したか，打ち切ったか（それぞれ環境の数の長さの配列），情報の辞書のリスト
+        """
+        n = len(self.envs)
+        obs = np.empty((n, *self.envs[0].observation_shape), dtype=np.uint8 if self.envs[0].observation == "frame" else np.float32)
+        rewards = np.empty(n, dtype=np.float32)
+        terminated = np.empty(n, dtype=bool)
+        truncated = np.empty(n, dtype=bool)
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            o, rewards[i], terminated[i], truncated[i], info = env.step(int(action))
+            if terminated[i] or truncated[i]:
+                info["final_observation"] = o
+                o, _ = env.reset()
+            obs[i] = o
+            infos.append(info)
+        return obs, rewards, terminated, truncated, infos
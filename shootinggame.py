@@ -1,11 +1,36 @@
+import argparse
+import array
+import bisect
+import collections
+import contextlib
+import functools
+import gc
+import hashlib
+import heapq
+import itertools
+import json
+import logging
 import math
 import os
+import queue
 import random
+import struct
 import sys
+import threading
 import time
+import tracemalloc
+import types
+import weakref
+import zlib
 import pygame as pg
 
+try:  # NumPy版の弾エンジン（--soa）でのみ使う
+    import numpy as np
+except ImportError:
+    np = None
 
+
+LOG = logging.getLogger("shootinggame")
 WIDTH = 1600  # ゲームウィンドウの幅
 HEIGHT = 900  # ゲームウィンドウの高さ
 MAIN_DIR = os.path.split(os.path.abspath(__file__))[0]
@@ -25,6 +50,41 @@ def check_bound(obj: pg.Rect) -> tuple[bool, bool]:
     return yoko, tate
 
 
+class Despawn:
+    """
+    エンティティの種類ごとの消滅条件（スプライトのクラス属性despawnに置き，Lifecycleが1フレームに1回まとめて調べる）
+    """
+    def __init__(self, margin: int | None = None, max_age: int | None = None, parent: bool = False):
+        """
+        引数1 margin：画面をこれだけ広げた範囲から少しでもはみ出したら消す（0ならcheck_boundと同じ，Noneなら消さない）
+        引数2 max_age：出現からこのフレーム数を超えたら消す（Noneなら無制限）
+        引数3 parent：親（parent属性のスプライト）が消えたら一緒に消す
+        """
+        self.bounds = None if margin is None else pg.Rect(0, 0, WIDTH, HEIGHT).inflate(2*margin, 2*margin)
+        self.max_age = max_age
+        self.parent = parent
+
+    def expired(self, sprite: pg.sprite.Sprite, tick: int) -> bool:
+        """
+        スプライトが消滅条件を満たしたか
+        引数1 sprite：調べるスプライト（出現フレームはborn属性に記録する）
+        引数2 tick：今のフレーム番号
+        """
+        if self.bounds is not None and not self.bounds.contains(sprite.rect):
+            return True
+        if self.max_age is not None:
+            born = getattr(sprite, "born", None)
+            if born is None:  # 初めて調べたフレームを出現フレームとする
+                sprite.born = born = tick
+            if tick - born > self.max_age:
+                return True
+        if self.parent:
+            parent = getattr(sprite, "parent", None)
+            if parent is not None and not parent.alive():
+                return True
+        return False
+
+
 def calc_orientation(org: pg.Rect, dst: pg.Rect) -> tuple[float, float]:
     """
     orgから見て，dstがどこにあるかを計算し，方向ベクトルをタプルで返す
@@ -37,10 +97,678 @@ def calc_orientation(org: pg.Rect, dst: pg.Rect) -> tuple[float, float]:
     return x_diff/norm, y_diff/norm
 
 
+class AssetRegistry:
+    """
+    fig/以下の画像を一度だけ読み込み，各スプライトに共有Surfaceとして配布するクラス
+    画面生成後にpreloadを呼ぶと，画面のピクセル形式に変換（convert/convert_alpha）して保持する
+    start_preloadでデコードだけを別スレッドで始め，finish_preloadで変換を画面のスレッドで行うこともできる
+    配布するSurfaceは全インスタンスで共有されるので，書き込みをしてはならない
+    """
+    image_exts = (".png", ".gif", ".jpg", ".jpeg", ".bmp")
+    alpha_exts = (".png", ".gif")  # 透過情報を持つ形式
+
+    def __init__(self, directory: str):
+        """
+        引数 directory：画像ファイルのあるディレクトリ
+        """
+        self.directory = directory
+        self.surfaces = {}  # ファイル名 -> 読み込み済みSurface
+        self.derived = {}  # 任意のキー -> 加工済みSurface（拡大，反転など）
+        self.hits = 0
+        self.misses = 0
+        self.names = []  # 先読みする画像のファイル名
+        self.decoded = {}  # ファイル名 -> デコード済み（未変換）のSurface（読み込みスレッドが書き込む）
+        self.decode_ms = {}  # ファイル名 -> デコード時間（ミリ秒）
+        self.convert_ms = {}  # ファイル名 -> 変換時間（ミリ秒）
+        self.thread = None
+
+    def preload(self):
+        """
+        ディレクトリ内の全画像を読み込み，画面のピクセル形式に変換する
+        pg.display.set_modeの後に呼ぶこと
+        """
+        self.start_preload()
+        self.finish_preload()
+
+    def start_preload(self):
+        """
+        ディレクトリ内の全画像のデコードを別スレッドで始める（この間に読み込み画面を描画できる）
+        """
+        self.names = sorted(name for name in os.listdir(self.directory) if name.lower().endswith(__class__.image_exts))
+        self.decoded = {}
+        self.thread = threading.Thread(target=self._decode_all, args=(self.names,), name="asset-loader", daemon=True)
+        self.thread.start()
+
+    def _decode_all(self, names: list[str]):
+        for name in names:
+            start = time.perf_counter()
+            img = pg.image.load(os.path.join(self.directory, name))
+            self.decode_ms[name] = (time.perf_counter()-start) * 1000
+            self.decoded[name] = img
+
+    @property
+    def loading(self) -> bool:
+        """
+        読み込みスレッドがまだデコード中か
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def progress(self) -> float:
+        """
+        デコードが終わった画像の割合（0〜1）
+        """
+        return len(self.decoded) / len(self.names) if self.names else 1.0
+
+    def finish_preload(self):
+        """
+        デコードの終了を待ち，画面のピクセル形式への変換を呼び出したスレッド（画面のスレッド）で行う
+        """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.derived.clear()  # 変換前の画像から作った加工済みSurfaceは作り直す
+        for name in self.names:
+            start = time.perf_counter()
+            self.surfaces[name] = self._convert(name, self.decoded[name])
+            self.convert_ms[name] = (time.perf_counter()-start) * 1000
+        self.decoded = {}
+
+    def _load(self, name: str) -> pg.Surface:
+        return self._convert(name, pg.image.load(os.path.join(self.directory, name)))
+
+    def _convert(self, name: str, img: pg.Surface) -> pg.Surface:
+        if pg.display.get_surface() is None:  # 画面がまだ無い場合は変換できない
+            return img
+        if name.lower().endswith(__class__.alpha_exts):
+            return img.convert_alpha()
+        return img.convert()
+
+    def get(self, name: str) -> pg.Surface:
+        """
+        読み込み済みの画像Surfaceを返す（未読み込みならここで読み込む）
+        引数 name：fig/以下のファイル名
+        戻り値：共有Surface
+        """
+        img = self.surfaces.get(name)
+        if img is None:
+            self.misses += 1
+            img = self.surfaces[name] = self._load(name)
+        else:
+            self.hits += 1
+        return img
+
+    def derive(self, key, factory):
+        """
+        画像を加工したSurface（またはそのリスト）をkeyごとに一度だけ生成して返す
+        引数1 key：加工結果を識別するキー
+        引数2 factory：加工結果を生成する引数なしの関数
+        戻り値：共有Surface
+        """
+        img = self.derived.get(key)
+        if img is None:
+            self.misses += 1
+            img = self.derived[key] = factory()
+        else:
+            self.hits += 1
+        return img
+
+    def stats(self) -> dict[str, int]:
+        """
+        キャッシュのヒット数，ミス数，保持数を辞書で返す
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "images": len(self.surfaces),
+            "derived": len(self.derived),
+        }
+
+    def report(self) -> str:
+        """
+        キャッシュの状態を1行の文字列で返す
+        """
+        return "assets: " + ", ".join(f"{k}={v}" for k, v in self.stats().items())
+
+    def timing_report(self) -> list[str]:
+        """
+        画像ごとのデコード時間と変換時間を，デコードが遅い順に1行ずつ返す
+        """
+        return [
+            f"  {name:16s} decode {ms:6.2f} ms  convert {self.convert_ms.get(name, 0.0):6.2f} ms"
+            for name, ms in sorted(self.decode_ms.items(), key=lambda item: -item[1])
+        ]
+
+
+ASSETS = AssetRegistry(f"{MAIN_DIR}/fig")
+
+# 戦闘機が向きうる8方向（Bird.deltaの組み合わせ）
+DIRECTIONS = [(+1, 0), (+1, -1), (0, -1), (-1, -1), (-1, 0), (-1, +1), (0, +1), (+1, +1)]
+
+
+def direction_angle(dire: tuple[int, int]) -> float:
+    """
+    向きタプルを画像の回転角度（度，反時計回り）に変換する
+    引数 dire：Bird.dire形式の向きタプル
+    戻り値：回転角度
+    """
+    return math.degrees(math.atan2(-dire[1], dire[0]))
+
+
+# 向きタプル -> 単位速度ベクトル(vx, vy)の表
+DIRECTION_VECTORS = {
+    dire: (math.cos(math.radians(direction_angle(dire))), -math.sin(math.radians(direction_angle(dire))))
+    for dire in DIRECTIONS
+}
+
+
+class RotationCache:
+    """
+    (画像の種類, 向き, 倍率)ごとに回転済み画像Surfaceを保持するクラス
+    起動時にprefillで8方向すべてを生成しておき，発射時は辞書を引くだけにする
+    """
+    def __init__(self):
+        self.builders = {}  # 種類 -> (生成関数, 倍率のタプル)
+        self.images = {}  # (種類, 向き, 倍率) -> Surface
+
+    def register(self, kind: str, builder=None, scales: tuple[float, ...] = (1.0,)):
+        """
+        画像の種類を登録する
+        引数1 kind：種類名（builder省略時はfig/以下のファイル名）
+        引数2 builder：(向き, 倍率)から回転済みSurfaceを作る関数（省略時はrotozoom）
+        引数3 scales：prefillで生成する倍率
+        """
+        if builder is None:
+            builder = lambda dire, scale: pg.transform.rotozoom(ASSETS.get(kind), direction_angle(dire), scale)
+        self.builders[kind] = builder, scales
+
+    def prefill(self):
+        """
+        登録済みの全種類について8方向・全倍率の画像を生成し直す
+        ASSETS.preloadの後に呼ぶこと
+        """
+        self.images.clear()
+        for kind, (builder, scales) in self.builders.items():
+            for scale in scales:
+                for dire in DIRECTIONS:
+                    self.images[kind, dire, scale] = builder(dire, scale)
+
+    def get(self, kind: str, dire: tuple[int, int], scale: float = 1.0) -> pg.Surface:
+        """
+        回転済み画像を返す（未生成ならここで生成する）
+        引数1 kind：種類名
+        引数2 dire：向きタプル
+        引数3 scale：倍率
+        戻り値：共有Surface
+        """
+        key = kind, dire, scale
+        img = self.images.get(key)
+        if img is None:
+            img = self.images[key] = self.builders[kind][0](dire, scale)
+        return img
+
+
+ROTATIONS = RotationCache()
+
+
+class RenderView:
+    """
+    論理座標（WIDTH×HEIGHT）のゲームを，それより小さい描画解像度の画面に描くための変換を持つクラス
+    ゲームの処理（移動，当たり判定）は論理座標のまま行い，描画の直前にだけ位置と画像を縮小する
+    縮小した画像は元の画像ごとに一度だけ作っておく（元の画像が消えたら一緒に消える）
+    """
+    PRESETS = {"high": (1600, 900), "medium": (1280, 720), "low": (960, 540), "lowest": (800, 450)}
+
+    def __init__(self):
+        self.preset = "high"
+        self.size = WIDTH, HEIGHT  # 描画解像度
+        self.scale = 1.0  # 論理座標 -> 描画解像度の倍率
+        self.images = weakref.WeakKeyDictionary()  # 元のSurface -> 縮小したSurface
+
+    def configure(self, preset: str = "high"):
+        """
+        引数 preset：描画解像度の名前（PRESETSのキー）
+        """
+        self.preset = preset
+        self.size = __class__.PRESETS[preset]
+        self.scale = self.size[0] / WIDTH
+        self.images.clear()
+
+    @property
+    def scaled(self) -> bool:
+        return self.scale != 1.0
+
+    def resize(self, surface: pg.Surface) -> pg.Surface:
+        """
+        画像を描画解像度に合わせて縮小する（カラーキーの画像は縁が混ざらないように最近傍で縮小する）
+        """
+        w, h = surface.get_size()
+        size = max(1, round(w*self.scale)), max(1, round(h*self.scale))
+        colorkey = surface.get_colorkey()
+        if colorkey is not None or surface.get_bitsize() < 24:
+            img = pg.transform.scale(surface, size)
+            if colorkey is not None:
+                img.set_colorkey(colorkey, surface.get_flags() & pg.RLEACCEL)
+            return img
+        return pg.transform.smoothscale(surface, size)
+
+    def image(self, surface: pg.Surface) -> pg.Surface:
+        """
+        描画解像度の画像を返す（未生成ならここで縮小する）
+        """
+        if self.scale == 1.0:
+            return surface
+        img = self.images.get(surface)
+        if img is None:
+            img = self.images[surface] = self.resize(surface)
+        return img
+
+    def prefill(self, surfaces):
+        """
+        画像を描画解像度に縮小しておく（等倍なら何もしない）
+        """
+        if self.scaled:
+            for surface in surfaces:
+                self.image(surface)
+
+    def point(self, x: float, y: float) -> tuple[int, int]:
+        """
+        論理座標を描画解像度の座標に変換する
+        """
+        return round(x*self.scale), round(y*self.scale)
+
+    def rect(self, rect: pg.Rect) -> pg.Rect:
+        """
+        論理座標の矩形を描画解像度の矩形に変換する
+        """
+        if self.scale == 1.0:
+            return rect
+        s = self.scale
+        return pg.Rect(round(rect.x*s), round(rect.y*s), round(rect.w*s), round(rect.h*s))
+
+    def blit(self, screen: pg.Surface, surface: pg.Surface, pos: pg.Rect | tuple[float, float]) -> pg.Rect:
+        """
+        論理座標posに画像を描画する
+        """
+        x, y = pos.topleft if isinstance(pos, pg.Rect) else pos
+        return screen.blit(self.image(surface), self.point(x, y))
+
+    @contextlib.contextmanager
+    def sprites(self, groups: tuple):
+        """
+        with文の間だけ，スプライトの画像と位置を描画解像度のものに差し替えておく（NumPy版の弾は除く）
+        """
+        swapped = []
+        if self.scaled:
+            for group in groups:
+                if isinstance(group, pg.sprite.AbstractGroup):
+                    for sprite in group:
+                        swapped.append((sprite, sprite.image, sprite.rect))
+                        sprite.image = self.image(sprite.image)
+                        sprite.rect = self.rect(sprite.rect)
+        try:
+            yield
+        finally:
+            for sprite, image, rect in swapped:
+                sprite.image = image
+                sprite.rect = rect
+
+
+VIEW = RenderView()
+
+
+@contextlib.contextmanager
+def using_view(view: RenderView):
+    """
+    with文の間だけ，描画解像度の設定（VIEW）をviewに差し替える（画面を持たない環境ごとに別の解像度で描くため）
+    """
+    global VIEW
+    saved, VIEW = VIEW, view
+    try:
+        yield view
+    finally:
+        VIEW = saved
+
+
+class SpritePool:
+    """
+    killされたスプライトを保管しておき，次の生成時に再初期化して再利用するクラス
+    """
+    pools = []  # 生成された全プール（統計表示用）
+
+    def __init__(self, name: str, capacity: int = 256):
+        """
+        引数1 name：プール名（クラス名）
+        引数2 capacity：保管しておくインスタンス数の上限
+        """
+        self.name = name
+        self.capacity = capacity
+        self.free = []  # 保管中のインスタンス
+        self.live = 0  # 使用中のインスタンス数
+        self.high_water = 0  # 使用中のインスタンス数の最大値
+        self.created = 0  # 新規生成した数
+        self.reused = 0  # 再利用した数
+        self.released = 0  # 返却された数
+        self.discarded = 0  # 上限を超えて捨てた数
+        __class__.pools.append(self)
+
+    def acquire(self, cls: type, *args) -> pg.sprite.Sprite:
+        """
+        保管中のインスタンスを再初期化して返す（無ければ新規生成する）
+        引数1 cls：生成するクラス
+        引数2以降 args：__init__に渡す引数
+        """
+        if self.free:
+            obj = self.free.pop()
+            obj.__init__(*args)
+            self.reused += 1
+        else:
+            obj = cls(*args)
+            self.created += 1
+        obj.pooled = False
+        self.live += 1
+        if self.live > self.high_water:
+            self.high_water = self.live
+        return obj
+
+    def release(self, obj: pg.sprite.Sprite):
+        """
+        killされたインスタンスを保管する
+        引数 obj：返却するインスタンス
+        """
+        pooled = getattr(obj, "pooled", None)
+        if pooled:  # 既に返却済み（同じフレームでの二重kill）
+            return
+        if pooled is not None:  # acquireで払い出したもの
+            self.live -= 1
+        obj.pooled = True
+        self.released += 1
+        if len(self.free) < self.capacity:
+            self.free.append(obj)
+        else:
+            self.discarded += 1
+
+    def stats(self) -> dict[str, int]:
+        """
+        プールのカウンタを辞書で返す
+        """
+        return {
+            "capacity": self.capacity,
+            "free": len(self.free),
+            "live": self.live,
+            "high_water": self.high_water,
+            "created": self.created,
+            "reused": self.reused,
+            "released": self.released,
+            "discarded": self.discarded,
+        }
+
+    def reset_stats(self):
+        """
+        カウンタを0に戻し，最大値を今の使用中の数からにする（計測の区切りで呼ぶ）
+        """
+        self.high_water = self.live
+        self.created = self.reused = self.released = self.discarded = 0
+
+
+def pool_stats() -> dict[str, dict[str, int]]:
+    """
+    全プールのカウンタをプール名ごとの辞書で返す
+    """
+    return {pool.name: pool.stats() for pool in SpritePool.pools}
+
+
+def reset_pool_stats():
+    """
+    全プールのカウンタを0に戻す
+    """
+    for pool in SpritePool.pools:
+        pool.reset_stats()
+
+
+class MaskCache:
+    """
+    Surfaceごとの衝突判定用マスク（pg.mask）を一度だけ生成して保持するクラス
+    画像は回転・拡大済みのものを含めて共有Surfaceなので，異なる画像の数だけマスクができる
+    """
+    def __init__(self):
+        self.masks = {}  # Surface -> Mask
+        self.checks = 0  # マスクで判定したペア数
+        self.hits = 0  # マスクでも重なっていたペア数
+
+    def get(self, surface: pg.Surface) -> pg.mask.Mask:
+        """
+        surfaceの不透明な部分（カラーキー・透明度を考慮）のマスクを返す
+        """
+        mask = self.masks.get(surface)
+        if mask is None:
+            mask = self.masks[surface] = pg.mask.from_surface(surface)
+        return mask
+
+    def overlap(self, image_a: pg.Surface, pos_a: tuple[int, int], image_b: pg.Surface, pos_b: tuple[int, int]) -> bool:
+        """
+        位置pos_aの画像image_aと位置pos_bの画像image_bの不透明な部分が重なっているか
+        """
+        self.checks += 1
+        hit = self.get(image_a).overlap(self.get(image_b), (pos_b[0]-pos_a[0], pos_b[1]-pos_a[1])) is not None
+        self.hits += hit
+        return hit
+
+    def prefill(self, surfaces):
+        """
+        surfacesのマスクを生成しておく（最初の衝突でまとめて生成して時間がかからないように）
+        """
+        for surface in surfaces:
+            self.get(surface)
+
+    def stats(self) -> dict[str, int]:
+        return {"masks": len(self.masks), "checks": self.checks, "hits": self.hits}
+
+    def clear(self):
+        self.masks.clear()
+
+
+MASKS = MaskCache()
+
+
+def collide_mask(a: pg.sprite.Sprite, b: pg.sprite.Sprite) -> bool:
+    """
+    2つのスプライトの画像の不透明な部分が重なっているか（矩形が重なっているものにだけ使う）
+    pg.sprite.collide_maskと同じ判定を，キャッシュしたマスクで行う
+    """
+    return MASKS.overlap(a.image, a.rect.topleft, b.image, b.rect.topleft)
+
+
+class SpatialHash:
+    """
+    画面を一様な格子に区切り，スプライトを格子ごとに登録して衝突判定の候補を絞るクラス
+    フレームごとにrebuildで登録し直し，pg.sprite.spritecollide/groupcollideの代わりに使う
+    """
+    def __init__(self, width: int, height: int, cell: int = 100):
+        """
+        引数1 width：格子で覆う領域の幅
+        引数2 height：格子で覆う領域の高さ
+        引数3 cell：1マスの一辺の長さ
+        """
+        self.cell = cell
+        self.cols = (width + cell - 1) // cell
+        self.rows = (height + cell - 1) // cell
+        self.index = {}  # グループ -> {マス番号: [スプライト]}
+        self.candidates = 0  # 矩形判定した候補ペア数
+        self.hits = 0  # 実際に衝突したペア数
+        self.collided = None  # 矩形が重なったペアの追加の判定（collide_maskならピクセル単位の判定になる）
+
+    def _cells(self, rect: pg.Rect) -> range | list[int]:
+        """
+        矩形が重なるマス番号のリストを返す（画面外は端のマスに含める）
+        """
+        c = self.cell
+        x0 = min(max(rect.left // c, 0), self.cols-1)
+        x1 = min(max((rect.right-1) // c, 0), self.cols-1)
+        y0 = min(max(rect.top // c, 0), self.rows-1)
+        y1 = min(max((rect.bottom-1) // c, 0), self.rows-1)
+        if y0 == y1:
+            return range(y0*self.cols+x0, y0*self.cols+x1+1)
+        return [y*self.cols+x for y in range(y0, y1+1) for x in range(x0, x1+1)]
+
+    def clear(self):
+        """
+        全グループの登録を消す（フレームの最初に呼ぶ）
+        """
+        self.index.clear()
+
+    def rebuild(self, *groups: pg.sprite.AbstractGroup):
+        """
+        グループのスプライトを現在の位置で格子に登録し直す
+        引数 groups：登録するグループ
+        """
+        for group in groups:
+            cells = {}
+            for sprite in group:
+                for key in self._cells(sprite.rect):
+                    if key in cells:
+                        cells[key].append(sprite)
+                    else:
+                        cells[key] = [sprite]
+            self.index[group] = cells
+
+    def query(self, rect: pg.Rect, group: pg.sprite.AbstractGroup) -> list[pg.sprite.Sprite]:
+        """
+        rectと同じマスに登録されているgroupのスプライトを返す
+        groupが未登録の場合は全スプライトを返す
+        """
+        cells = self.index.get(group)
+        if cells is None:
+            return group.sprites()
+        keys = self._cells(rect)
+        if len(keys) == 1:
+            return cells.get(keys[0], [])
+        found = {}
+        for key in keys:
+            for sprite in cells.get(key, ()):
+                found[sprite] = None
+        return list(found)
+
+    def spritecollide(self, sprite: pg.sprite.Sprite, group: pg.sprite.AbstractGroup, dokill: bool) -> list:
+        """
+        pg.sprite.spritecollideと同じ結果を格子で候補を絞って求める
+        引数1 sprite：判定するスプライト
+        引数2 group：相手のグループ
+        引数3 dokill：衝突した相手をkillするか
+        戻り値：衝突した相手のリスト
+        """
+        rect = sprite.rect
+        collided = self.collided
+        hits = []
+        for other in self.query(rect, group):
+            self.candidates += 1
+            if group.has(other) and rect.colliderect(other.rect):  # 既にkillされたものは除く
+                if collided is None or collided(sprite, other):  # 矩形が重なったときだけ詳しく判定する
+                    hits.append(other)
+        self.hits += len(hits)
+        if dokill:
+            for other in hits:
+                other.kill()
+        return hits
+
+    def groupcollide(self, groupa, groupb, dokilla: bool, dokillb: bool) -> dict:
+        """
+        pg.sprite.groupcollideと同じ結果を格子で候補を絞って求める（groupbは登録済みであること）
+        戻り値：groupaのスプライト -> 衝突したgroupbのスプライトのリスト
+        """
+        crashed = {}
+        for sprite in groupa.sprites():
+            hits = self.spritecollide(sprite, groupb, dokillb)
+            if hits:
+                crashed[sprite] = hits
+                if dokilla:
+                    sprite.kill()
+        return crashed
+
+    def stats(self) -> dict[str, int]:
+        """
+        候補ペア数と衝突ペア数を辞書で返す
+        """
+        return {"candidates": self.candidates, "hits": self.hits}
+
+    def reset_counters(self):
+        """
+        候補ペア数と衝突ペア数を0に戻す（Game.stepが毎フレームの当たり判定の前に呼ぶ）
+        """
+        self.candidates = 0
+        self.hits = 0
+
+
+GRID = SpatialHash(WIDTH, HEIGHT)
+
+
+class PooledSprite(pg.sprite.Sprite):
+    """
+    プールから生成し，kill時にプールへ返却されるスプライトの基底クラス
+    サブクラスごとにプールを持つ（class Foo(PooledSprite, capacity=...)で上限を指定）
+    """
+    pool: SpritePool
+
+    def __init_subclass__(cls, capacity: int = 256, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.pool = SpritePool(cls.__name__, capacity)
+
+    @classmethod
+    def spawn(cls, *args) -> "PooledSprite":
+        """
+        プールからインスタンスを取り出して初期化する（コンストラクタの代わりに使う）
+        """
+        obj = cls.pool.acquire(cls, *args)
+        obj.prev_pos = None  # 再利用前の位置から補間しないようにする
+        obj.born = None  # 出現フレームはLifecycleが記録し直す
+        return obj
+
+    def kill(self):
+        super().kill()
+        self.pool.release(self)
+
+
+def bird_image() -> pg.Surface:
+    """
+    100x100に縮小した戦闘機画像（共有Surface）を返す
+    """
+    return ASSETS.derive(
+        "bird", lambda: pg.transform.scale(pg.transform.rotozoom(ASSETS.get("2091142.png"), 0, 2.0), (100, 100))
+    )
+
+
+# 向き -> (左右反転した画像を使うか, 回転角度)
+BIRD_ROTATIONS = {
+    (+1, 0): (True, -90),  # 右
+    (+1, -1): (True, -45),  # 右上
+    (0, -1): (True, 0),  # 上
+    (-1, -1): (False, 45),  # 左上
+    (-1, 0): (False, 90),  # 左
+    (-1, +1): (False, 135),  # 左下
+    (0, +1): (True, 180),  # 下
+    (+1, +1): (True, -135),  # 右下
+}
+
+
+def rotate_bird(dire: tuple[int, int], scale: float) -> pg.Surface:
+    """
+    向きに応じた戦闘機画像を生成する（ROTATIONSの生成関数）
+    """
+    flip, angle = BIRD_ROTATIONS[dire]
+    img = bird_image()
+    if flip:
+        img = ASSETS.derive("bird_flip", lambda: pg.transform.flip(bird_image(), True, False))  # デフォルトの戦闘機
+    return pg.transform.rotozoom(img, angle, scale)
+
+
+ROTATIONS.register("bird", rotate_bird)
+
+
 class Bird(pg.sprite.Sprite):
     """
     ゲームキャラクター（戦闘機）に関するクラス
     """
+    beam1_score = 50  # 縦長ビーム（キー1）を使えるようになるスコア
+    beam2_score = 100  # 横長ビーム（キー2）を使えるようになるスコア
     delta = {  # 押下キーと移動量の辞書
         pg.K_UP: (0, -1),
         pg.K_DOWN: (0, +1),
@@ -55,20 +783,7 @@ class Bird(pg.sprite.Sprite):
         引数2 xy：こうかとん画像の位置座標タプル
         """
         super().__init__()
-        img0 = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/2091142.png"), 0, 2.0)
-        img = pg.transform.flip(img0, True, False)  # デフォルトの戦闘機
-        img = pg.transform.scale(img,(100,100))
-        img0 = pg.transform.scale(img0,(100,100))
-        self.imgs = {
-            (+1, 0): pg.transform.rotozoom(img, -90, 1.0),  # 右
-            (+1, -1): pg.transform.rotozoom(img, -45, 1.0),  # 右上
-            (0, -1): pg.transform.rotozoom(img, 0, 1.0),  # 上
-            (-1, -1): pg.transform.rotozoom(img0, 45, 1.0),  # 左上
-            (-1, 0): pg.transform.rotozoom(img0, 90, 1.0),  # 左
-            (-1, +1): pg.transform.rotozoom(img0, 135, 1.0),  # 左下
-            (0, +1): pg.transform.rotozoom(img, 180, 1.0),  # 下
-            (+1, +1): pg.transform.rotozoom(img, -135, 1.0),  # 右下
-        }
+        self.imgs = {dire: ROTATIONS.get("bird", dire) for dire in DIRECTIONS}
         self.dire = (+1, 0)
         self.image = self.imgs[self.dire]
         self.rect = self.image.get_rect()
@@ -77,42 +792,38 @@ class Bird(pg.sprite.Sprite):
         self.beam_type = 0
         self.boss_group = boss_group
 
-    def change_img(self, num: int, screen: pg.Surface):
+    def change_img(self, num: int, screen: pg.Surface | None = None):
         """
         こうかとん画像を切り替え，画面に転送する
         引数1 num：こうかとん画像ファイル名の番号
-        引数2 screen：画面Surface
+        引数2 screen：画面Surface（Noneなら転送しない）
         """
-        self.image = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/2091142.png"), 0, 2.0)
-        self.image = pg.transform.scale(self.image,(100,100))
-        screen.blit(self.image, self.rect)
+        self.image = bird_image()
+        if screen is not None:
+            screen.blit(self.image, self.rect)
 
     def change_beam_type(self, key, score:"Score"):
         # キーに応じてビームの種類を切り替える
-        if key == pg.K_1 and score.value >= 50:
-            self.kill()
+        if key == pg.K_1 and score.value >= __class__.beam1_score:
             self.beam_type = 1
-        elif key == pg.K_2 and score.value >= 100:
-            self.kill()
+        elif key == pg.K_2 and score.value >= __class__.beam2_score:
             self.beam_type = 2
         elif key == pg.K_0:
-            self.kill()
             self.beam_type = 0
 
     def create_beam(self):
         # 現在のビームの種類に応じてビームを作成する
         if self.beam_type == 1:
-            return Beam1(self,self.boss_group)
+            return Beam1.spawn(self, self.boss_group)
         elif self.beam_type == 2:
-            return Beam2(self,self.boss_group)
+            return Beam2.spawn(self, self.boss_group)
         elif self.beam_type == 0:
-            return Beam(self,self.boss_group)
+            return Beam.spawn(self, self.boss_group)
 
-    def update(self, key_lst: list[bool], screen: pg.Surface):
+    def update(self, key_lst: list[bool]):
         """
-        押下キーに応じて戦闘機を移動させる
-        引数1 key_lst：押下キーの真理値リスト
-        引数2 screen：画面Surface
+        押下キーに応じて戦闘機を移動させる（描画はGame.drawで行う）
+        引数 key_lst：押下キーの真理値リスト
         """
         sum_mv = [0, 0]
         for k, mv in __class__.delta.items():
@@ -127,48 +838,72 @@ class Bird(pg.sprite.Sprite):
         if not (sum_mv[0] == 0 and sum_mv[1] == 0):
             self.dire = tuple(sum_mv)
             self.image = self.imgs[self.dire]
-        screen.blit(self.image, self.rect)
 
 
-class Bomb(pg.sprite.Sprite):
+def bomb_image(rad: int, color: tuple[int, int, int]) -> pg.Surface:
+    """
+    半径と色に応じた爆弾円Surface（共有Surface）を返す
+    """
+    def draw() -> pg.Surface:
+        img = pg.Surface((2*rad, 2*rad))
+        pg.draw.circle(img, color, (rad, rad), rad)
+        img.set_colorkey((0, 0, 0))
+        return img
+    return ASSETS.derive(("bomb", rad, color), draw)
+
+
+class Bomb(PooledSprite, capacity=1024):
     """
     爆弾に関するクラス
     """
+    despawn = Despawn(margin=0, parent=True)  # 画面の端に触れるか，投下したボスが倒れたら消える
     colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)]
+    rad_range = 10, 50  # 爆弾円の半径の範囲
+
+    @classmethod
+    def prebuild(cls):
+        """
+        全ての半径と色の爆弾円Surfaceを生成しておく
+        """
+        for rad in range(cls.rad_range[0], cls.rad_range[1]+1):
+            for color in cls.colors:
+                bomb_image(rad, color)
 
-    def __init__(self, emy: "Enemy", bird: Bird):
+    def __init__(self, emy: "Enemy", bird: Bird, rng: random.Random = random):
         """
         爆弾円Surfaceを生成する
         引数1 emy：爆弾を投下する敵機
         引数2 bird：攻撃対象のこうかとん
+        引数3 rng：乱数生成器（再現できるようにGameの乱数を渡す）
         """
         super().__init__()
-        rad = random.randint(10, 50)  # 爆弾円の半径：10以上50以下の乱数
-        color = random.choice(__class__.colors)  # 爆弾円の色：クラス変数からランダム選択
-        self.image = pg.Surface((2*rad, 2*rad))
-        pg.draw.circle(self.image, color, (rad, rad), rad)
-        self.image.set_colorkey((0, 0, 0))
+        rad = rng.randint(*__class__.rad_range)  # 爆弾円の半径：10以上50以下の乱数
+        color = rng.choice(__class__.colors)  # 爆弾円の色：クラス変数からランダム選択
+        self.image = bomb_image(rad, color)
+        self.rad = rad
         self.rect = self.image.get_rect()
         # 爆弾を投下するemyから見た攻撃対象のbirdの方向を計算
         self.vx, self.vy = calc_orientation(emy.rect, bird.rect)  
         self.rect.centerx = emy.rect.centerx
         self.rect.centery = emy.rect.centery+emy.rect.height/2
         self.speed = 6
+        self.parent = None  # 一緒に消える親（ボスの爆弾だけ）
 
     def update(self):
         """
-        爆弾を速度ベクトルself.vx, self.vyに基づき移動させる
-        引数 screen：画面Surface
+        爆弾を速度ベクトルself.vx, self.vyに基づき移動させる（画面外に出たらLifecycleが消す）
         """
         self.rect.move_ip(+self.speed*self.vx, +self.speed*self.vy)
-        if check_bound(self.rect) != (True, True):
-            self.kill()
 
 
-class Beam(pg.sprite.Sprite):
+class Beam(PooledSprite):
     """
     ビームに関するクラス
     """
+    img_name = "beam.png"  # ビーム画像のファイル名
+    scale = 2.0  # ビーム画像の倍率
+    despawn = Despawn(margin=0)  # 画面の端に触れたら消える
+
     def __init__(self, bird: Bird, boss_group: pg.sprite.Group):
         """
         ビーム画像Surfaceを生成する
@@ -176,17 +911,10 @@ class Beam(pg.sprite.Sprite):
         引数 boss_group：ボスのグループ
         """
         super().__init__()
-        self.vx, self.vy = bird.dire
-        angle = math.degrees(math.atan2(-self.vy, self.vx))
-        angle0 = 0
-        angle += angle0
-        self.image = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/beam.png"), angle, 2.0)
-        self.vx = math.cos(math.radians(angle))
-        self.vy = -math.sin(math.radians(angle))
+        # 画像と速度ベクトルは向きごとの表から引く
+        self.image = ROTATIONS.get(self.img_name, bird.dire, self.scale)
+        self.vx, self.vy = DIRECTION_VECTORS[bird.dire]
         self.rect = self.image.get_rect()
-        self.rect.centery = bird.rect.centery+bird.rect.height*self.vy
-        self.rect.centerx = bird.rect.centerx+bird.rect.width*self.vx
-        self.speed = 10
         self.rect.centery = bird.rect.centery + bird.rect.height * self.vy
         self.rect.centerx = bird.rect.centerx + bird.rect.width * self.vx
         self.speed = 10
@@ -194,85 +922,43 @@ class Beam(pg.sprite.Sprite):
 
     def update(self):
         """
-        ビームを速度ベクトルself.vx, self.vyに基づき移動させる
+        ビームを速度ベクトルself.vx, self.vyに基づき移動させる（画面外に出たらLifecycleが消す）
         """
         self.rect.move_ip(+self.speed * self.vx, +self.speed * self.vy)
-        if check_bound(self.rect) != (True, True):
-            self.kill()
 
         # ボスに当たった場合
-        boss_hit = pg.sprite.spritecollide(self, self.boss_group, False)
+        boss_hit = GRID.spritecollide(self, self.boss_group, False)
         if boss_hit:
             boss_hit[0].damage()  # ボスにダメージを与える
             self.kill()  # ビームを削除する
 
 
-class Beam1(pg.sprite.Sprite):
-    def __init__(self, bird: Bird, boss_group: pg.sprite.Group):
-        super().__init__()
-        self.vx, self.vy = bird.dire
-        angle = math.degrees(math.atan2(-self.vy, self.vx))
-        angle0 = 0
-        angle += angle0
-        self.image = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/beam_1.png"), angle, 0.5)
-        self.vx = math.cos(math.radians(angle))
-        self.vy = -math.sin(math.radians(angle))
-        self.rect = self.image.get_rect()
-        self.rect.centery = bird.rect.centery+bird.rect.height*self.vy
-        self.rect.centerx = bird.rect.centerx+bird.rect.width*self.vx
-        self.speed = 10
-        self.boss_group = boss_group  # ボスのグループを保持
+class Beam1(Beam):
+    """
+    縦長なビーム
+    """
+    img_name = "beam_1.png"
+    scale = 0.5
 
-    def update(self):
-        """
-        ビームを速度ベクトルself.vx, self.vyに基づき移動させる
-        引数 screen：画面Surface
-        """
-        self.rect.move_ip(+self.speed*self.vx, +self.speed*self.vy)
-        if check_bound(self.rect) != (True, True):
-            self.kill()
-        # ボスに当たった場合
-        boss_hit = pg.sprite.spritecollide(self, self.boss_group, False)
-        if boss_hit:
-            boss_hit[0].damage()  # ボスにダメージを与える
-            self.kill()  # ビームを削除する
 
+class Beam2(Beam):
+    """
+    横長なビーム
+    """
+    img_name = "beam_2.png"
+    scale = 0.5
 
-class Beam2(pg.sprite.Sprite):
-    def __init__(self, bird: Bird, boss_group: pg.sprite.Group):
-        super().__init__()
-        self.vx, self.vy = bird.dire
-        angle = math.degrees(math.atan2(-self.vy, self.vx))
-        angle0 = 0
-        angle += angle0
-        self.image = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/beam_2.png"), angle, 0.5)
-        self.vx = math.cos(math.radians(angle))
-        self.vy = -math.sin(math.radians(angle))
-        self.rect = self.image.get_rect()
-        self.rect.centery = bird.rect.centery+bird.rect.height*self.vy
-        self.rect.centerx = bird.rect.centerx+bird.rect.width*self.vx
-        self.speed = 10
-        self.boss_group = boss_group  # ボスのグループを保持
 
-    def update(self):
-        """
-        ビームを速度ベクトルself.vx, self.vyに基づき移動させる
-        引数 screen：画面Surface
-        """
-        self.rect.move_ip(+self.speed*self.vx, +self.speed*self.vy)
-        if check_bound(self.rect) != (True, True):
-            self.kill()
-        # ボスに当たった場合
-        boss_hit = pg.sprite.spritecollide(self, self.boss_group, False)
-        if boss_hit:
-            boss_hit[0].damage()  # ボスにダメージを与える
-            self.kill()  # ビームを削除する
+for _beam in (Beam, Beam1, Beam2):
+    ROTATIONS.register(_beam.img_name, scales=(_beam.scale,))
 
 
-class Explosion(pg.sprite.Sprite):
+class Explosion(PooledSprite):
     """
     爆発に関するクラス
     """
+    despawn = None  # 寿命（life）はupdateで数えて消える
+
     def __init__(self, obj: "Bomb|Enemy", life: int):
         """
         爆弾が爆発するエフェクトを生成する
@@ -280,8 +966,9 @@ class Explosion(pg.sprite.Sprite):
         引数2 life：爆発時間
         """
         super().__init__()
-        img = pg.image.load(f"{MAIN_DIR}/fig/explosion.gif")
-        self.imgs = [img, pg.transform.flip(img, 1, 1)]
+        self.imgs = ASSETS.derive("explosion", lambda: [
+            ASSETS.get("explosion.gif"), pg.transform.flip(ASSETS.get("explosion.gif"), 1, 1)
+        ])
         self.image = self.imgs[0]
         self.rect = self.image.get_rect(center=obj.rect.center)
         self.life = life
@@ -304,18 +991,24 @@ class Enemy(pg.sprite.Sprite):
     ランダムな距離移動して止まる
     移動中に画面外に出そうになった時も止まる
     """
-    imgs = [pg.image.load(f"{MAIN_DIR}/fig/alien{i}.png") for i in range(1, 4)]
+    imgs = [f"alien{i}.png" for i in range(1, 4)]  # 画像はASSETSから取得する
+    # 出現位置は画面の右端にはみ出しているので広めにとる．画面内で止まった敵機はビームで倒すまで残す（寿命は決めない）
+    despawn = Despawn(margin=200)
     
-    def __init__(self):
+    def __init__(self, rng: random.Random = random):
+        """
+        引数 rng：乱数生成器（再現できるようにGameの乱数を渡す）
+        """
         super().__init__()
-        self.image = random.choice(__class__.imgs)
+        self.image = ASSETS.get(rng.choice(__class__.imgs))
         self.rect = self.image.get_rect()
-        self.rect.center = WIDTH, random.randint(200, HEIGHT-200)
-        self.vx = random.randint(-10, -6)
-        self.vy = random.randint(-6, 6)
-        self.bound = random.randint(WIDTH/2, WIDTH-100)  # 停止位置
+        self.rect.center = WIDTH, rng.randint(200, HEIGHT-200)
+        self.vx = rng.randint(-10, -6)
+        self.vy = rng.randint(-6, 6)
+        self.bound = rng.randint(WIDTH//2, WIDTH-100)  # 停止位置
         self.state = "down"  # 移動状態or停止状態
-        self.interval = random.randint(50, 200)  # 爆弾投下インターバル
+        self.interval = rng.randint(50, 200)  # 爆弾投下インターバル
+        self.on_stop = None  # 停止状態になったときに呼ぶ関数（Gameが爆弾投下を予約する）
 
     def update(self):
         """
@@ -325,21 +1018,85 @@ class Enemy(pg.sprite.Sprite):
         if self.rect.centerx < self.bound or self.rect.centery < 50 or HEIGHT-200 < self.rect.centery:  # xが停止位置に到達 or yが画面端になったら停止
             self.vx = 0
             self.vy = 0
+            if self.state != "stop" and self.on_stop is not None:
+                self.on_stop(self)
             self.state = "stop"
         self.rect.centerx += self.vx
         self.rect.centery += self.vy
 
-    def update(self):
+
+@functools.lru_cache(maxsize=None)
+def get_font(name: str | None, size: int) -> pg.font.Font:
+    """
+    フォントをプロセス全体で共有する（同じ名前と大きさなら同じFontを返す）
+    引数1 name：フォントファイル名（Noneなら既定のフォント）
+    引数2 size：文字の大きさ
+    """
+    return pg.font.Font(name, size)
+
+
+class TextCache:
+    """
+    描画済みの文字列Surfaceを(フォント, 大きさ, 文字列, 色)ごとに保持するLRUキャッシュ
+    """
+    def __init__(self, maxsize: int = 128):
         """
-        敵機を速度ベクトルself.vx, self.vyに基づき移動させる
-        ランダムに決めた停止位置_boundまで降下したら，_stateを停止状態に変更する
+        引数 maxsize：保持するSurfaceの数の上限（超えたら最も古く使われたものから捨てる）
         """
-        if self.rect.centerx < self.bound or self.rect.centery < 50 or HEIGHT-200 < self.rect.centery:  # xが停止位置に到達 or yが画面端になったら停止
-            self.vx = 0
-            self.vy = 0
-            self.state = "stop"
-        self.rect.centerx += self.vx
-        self.rect.centery += self.vy
+        self.maxsize = maxsize
+        self.surfaces = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text: str, size: int, color: tuple[int, int, int],
+               antialias: bool = False, name: str | None = None) -> pg.Surface:
+        """
+        文字列を描画したSurface（共有Surface）を返す
+        引数1 text：文字列
+        引数2 size：文字の大きさ
+        引数3 color：文字色
+        引数4 antialias：アンチエイリアスをかけるか
+        引数5 name：フォントファイル名（Noneなら既定のフォント）
+        """
+        key = name, size, text, color, antialias
+        img = self.surfaces.get(key)
+        if img is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return img
+        self.misses += 1
+        img = self.surfaces[key] = get_font(name, size).render(text, antialias, color)
+        if len(self.surfaces) > self.maxsize:
+            self.surfaces.popitem(last=False)
+        return img
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+TEXTS = TextCache()
+
+
+def draw_end_screen(screen: pg.Surface, title: str, color: tuple[int, int, int], value: int):
+    """
+    画面を暗くして，ゲームオーバー/ゲームクリアーの文字とスコアを描画する
+    引数1 screen：画面Surface
+    引数2 title：表示する文字列
+    引数3 color：文字色
+    引数4 value：スコア
+    """
+    # ダークなオーバーレイを描画
+    def make_overlay() -> pg.Surface:
+        overlay = pg.Surface(screen.get_size(), pg.SRCALPHA)
+        overlay.fill((0, 0, 0, 150))  # 黒色で透明度を指定
+        return overlay
+    screen.blit(ASSETS.derive(("overlay", screen.get_size()), make_overlay), (0, 0))
+
+    # 文字とスコアを描画（文字は描画解像度の大きさで描く）
+    text = TEXTS.render(title, round(300*VIEW.scale), color, True)
+    screen.blit(text, text.get_rect(center=VIEW.point(WIDTH // 2, HEIGHT // 2 - 30)))
+    score_text = TEXTS.render(f"Score: {value}", round(200*VIEW.scale), (255, 255, 255), True)
+    screen.blit(score_text, score_text.get_rect(center=VIEW.point(WIDTH // 2, HEIGHT // 2 + 120)))
 
 
 class Score:
@@ -347,34 +1104,53 @@ class Score:
     打ち落とした爆弾，敵機の数をスコアとして表示するクラス
     爆弾：1点
     敵機：10点
+    スコアと残機画像は1枚のHUD Surfaceに合成しておき，値が変わったときだけ作り直す
     """
     def __init__(self):
-        self.font = pg.font.Font(None, 50)
+        self.font = get_font(None, 50)
         self.color = (0, 0, 255)
         self.value = 0
         self.score_value = 0
-        self.image = self.font.render(f"Score: {self.value}", 0, self.color)
+        self.image = TEXTS.render(f"Score: {self.value}", 50, self.color)
         self.rect = self.image.get_rect()
         self.rect.center = 100, HEIGHT-50
         self.bird_life = 3
-        self.score_image = self.font.render(f"Score: {self.score_value}", 0, self.color)
         self.load_life_image()  # 残機画像の読み込み
-        self.score_rect = self.score_image.get_rect()
-        self.score_rect.center = 100, HEIGHT-50
-        self.life_images = [self.life_image.copy() for _ in range(self.bird_life)]
         self.life_rects = [
-            self.life_images[i].get_rect(center=(250 + i * 40, HEIGHT-50)) for i in range(self.bird_life)
+            self.life_image.get_rect(center=(250 + i * 40, HEIGHT-50)) for i in range(self.bird_life)
         ]
+        self.hud = None  # スコアと残機画像を合成したSurface
+        self.hud_rect = None
+        self.hud_key = None  # hudを作ったときの(スコア, 残機)
 
     def load_life_image(self):
-        self.life_image = pg.image.load(f"{MAIN_DIR}/fig/2091142.png")
-        self.life_image = pg.transform.scale(self.life_image,(30,30))
+        self.life_image = ASSETS.derive("life", lambda: pg.transform.scale(ASSETS.get("2091142.png"), (30, 30)))
 
-    def update(self, screen: pg.Surface):
-        self.image = self.font.render(f"Score: {self.value}", 0, self.color)
+    def render_hud(self):
+        """
+        スコアの文字と残機画像を1枚のSurfaceに合成する
+        """
+        self.image = TEXTS.render(f"Score: {self.value}", 50, self.color)
+        self.hud_rect = self.area()
+        self.hud = pg.Surface(self.hud_rect.size, pg.SRCALPHA)
+        ox, oy = self.hud_rect.topleft
         for life_rect in self.life_rects:
-            screen.blit(self.life_image, life_rect)  # 同じ画像を表示
-        screen.blit(self.image, self.rect)
+            self.hud.blit(self.life_image, life_rect.move(-ox, -oy))  # 同じ画像を表示
+        self.hud.blit(self.image, self.rect.move(-ox, -oy))
+        if pg.display.get_surface():  # 画面のピクセル形式にしておくと毎フレームのblitが速い
+            self.hud = self.hud.convert_alpha()
+        self.hud_key = self.value, self.bird_life
+
+    def update(self, screen: pg.Surface):
+        if self.hud_key != (self.value, self.bird_life):  # 値が変わったときだけ作り直す
+            self.render_hud()
+        VIEW.blit(screen, self.hud, self.hud_rect)
+
+    def area(self) -> pg.Rect:
+        """
+        スコアと残機画像を描画する範囲を返す
+        """
+        return self.image.get_rect(topleft=self.rect.topleft).unionall(self.life_rects)
 
     def decrease_life(self):
         """
@@ -390,61 +1166,33 @@ class Score:
         """
         self.score_value = value
 
-    def show_game_over(self, screen):
+    def draw_game_over(self, screen: pg.Surface):
         """
-        ゲームオーバー画面を表示するメソッド
+        ゲームオーバー画面を描画するメソッド（キー入力の待ち受けはGameのシーンで行う）
         """
-        # ダークなオーバーレイを描画
-        overlay = pg.Surface((WIDTH, HEIGHT), pg.SRCALPHA)
-        overlay.fill((0, 0, 0, 150))  # 黒色で透明度を指定
-
-        # ゲームオーバーのテキストを描画
-        game_over_font = pg.font.Font(None, 300)
-        game_over_text = game_over_font.render("Game Over", True, (255, 0, 0))
-        game_over_rect = game_over_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 30))
-
-        # スコアの表示
-        score_font = pg.font.Font(None, 200)
-        score_text = score_font.render(f"Score: {self.value}", True, (255, 255, 255))
-        score_rect = score_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + 120))
-
-        # オーバーレイを画面に描画
-        screen.blit(overlay, (0, 0))
-        
-        # テキストを描画
-        screen.blit(game_over_text, game_over_rect)
-        screen.blit(score_text, score_rect)
-        pg.display.flip()
-
-        # キー入力を待つ
-        wait_for_key = True
-        while wait_for_key:
-            for event in pg.event.get():
-                if event.type == pg.QUIT:
-                    pg.quit()
-                    sys.exit()
-                elif event.type == pg.KEYDOWN:
-                    wait_for_key = False
-
-            pg.time.Clock().tick(30)  # イベントをチェックする頻度を制御
+        draw_end_screen(screen, "Game Over", (255, 0, 0), self.value)
             
             
 class Boss(pg.sprite.Sprite):
     """
     ボスに関するクラス
     """
-    def __init__(self,exps,screen):
+    bomb_interval = 30  # 爆弾を投下する間隔（シミュレーションのフレーム数）
+    max_hp = 15  # ボスのHP
+    despawn = None  # HPが0になったらupdateで消える
+
+    def __init__(self, exps, rng: random.Random = random):
         super().__init__()
-        original_image = pg.image.load(f"{MAIN_DIR}/fig/alien1.png")
-        self.image = pg.transform.scale(original_image, (200, 200))  # 画像のサイズを拡大
+        self.image = ASSETS.derive("boss", lambda: pg.transform.scale(ASSETS.get("alien1.png"), (200, 200)))  # 画像のサイズを拡大
         self.rect = self.image.get_rect()
         self.rect.center = WIDTH + self.rect.width // 2, HEIGHT // 2
         self.speed = 5
         self.max_x = 1400  # 移動を止めるx座標の上限
-        self.hp = 15  # ボスのHP
-        self.bombs = pg.sprite.Group()
+        self.hp = __class__.max_hp
         self.exps = exps
-        self.screen = screen
+        self.value = 0
+        self.age = 0  # 出現してからのフレーム数（爆弾投下のタイマー）
+        self.rng = rng
 
     def update(self, bird: Bird, bombs: pg.sprite.Group,value) -> None:
         """
@@ -452,8 +1200,7 @@ class Boss(pg.sprite.Sprite):
         """
         if self.hp <= 0:  # HPが0以下になったらボスは死亡
             self.explode(self.exps)
-            self.show_game_clear(self.screen)
-            self.kill()
+            self.kill()  # Gameがボスの死亡を見てクリアー画面に切り替える
             return
         
         # 上下に移動
@@ -471,11 +1218,12 @@ class Boss(pg.sprite.Sprite):
         if self.rect.right > WIDTH:  
             self.rect.right = WIDTH  # 右端に戻す
             
-        # 定期的に爆弾を生成
-        if pg.time.get_ticks() % 30 == 0:
-            bomb = Bomb(self, bird)
-            self.bombs.add(bomb)
-            bombs.add(bomb)  # ボスの爆弾を全体の爆弾グループにも追加   
+        # 定期的に爆弾を生成（実時間ではなくシミュレーションのフレーム数で数える）
+        self.age += 1
+        if self.age % __class__.bomb_interval == 0:
+            bomb = Bomb.spawn(self, bird, self.rng)
+            bomb.parent = self  # ボスが倒れたら一緒に消える
+            bombs.add(bomb)
         self.value = value    
 
     def damage(self):
@@ -488,164 +1236,2310 @@ class Boss(pg.sprite.Sprite):
         """
         ボスが爆発するエフェクトを生成する
         """
-        explosion = Explosion(self, 200)  # 爆発エフェクト
+        explosion = Explosion.spawn(self, 200)  # 爆発エフェクト
         exps.add(explosion)
 
     
-    def show_game_clear(self, screen):
+    def draw_game_clear(self, screen: pg.Surface, value: int):
         """
-        ゲームクリアー画面を表示するメソッド
+        ゲームクリアー画面を描画するメソッド（キー入力の待ち受けはGameのシーンで行う）
+        引数1 screen：画面Surface
+        引数2 value：最終スコア（self.valueはボスの最後のupdateの時点のスコアなので使わない）
         """
-        # ダークなオーバーレイを描画
-        overlay = pg.Surface((WIDTH, HEIGHT), pg.SRCALPHA)
-        overlay.fill((0, 0, 0, 150))  # 黒色で透明度を指定
-
-        # ゲームオーバーのテキストを描画
-        game_over_font = pg.font.Font(None, 300)
-        game_over_text = game_over_font.render("Game Clear", True, (0, 255, 0))
-        game_over_rect = game_over_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 30))
-
-        # スコアの表示
-        score_font = pg.font.Font(None, 200)
-        score_text = score_font.render(f"Score: {self.value}", True, (255, 255, 255))
-        score_rect = score_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + 120))
-
-        # オーバーレイを画面に描画
-        screen.blit(overlay, (0, 0))
-        
-        # テキストを描画
-        screen.blit(game_over_text, game_over_rect)
-        screen.blit(score_text, score_rect)
-        pg.display.flip()
-
-        # キー入力を待つ
-        wait_for_key = True
-        while wait_for_key:
-            for event in pg.event.get():
-                if event.type == pg.QUIT:
-                    pg.quit()
-                    sys.exit()
-                elif event.type == pg.KEYDOWN:
-                    wait_for_key = False
-
-            pg.time.Clock().tick(1)  # イベントをチェックする頻度を制御
+        draw_end_screen(screen, "Game Clear", (0, 255, 0), value)
             
             
-class Drop(pg.sprite.Sprite):
+class Drop(PooledSprite):
+    despawn = Despawn(margin=50)  # 左へ流れて画面外に出たら消える
+
     def __init__(self,enemy: Enemy):
         super().__init__()
-        self.image = pg.Surface((15, 15))
-        pg.draw.rect(self.image, (0,0,0),(0, 0, 15, 15))
+        self.image = ASSETS.derive("drop", lambda: pg.Surface((15, 15)))  # 黒い四角
         self.rect= self.image.get_rect(center=enemy.rect.center)
     
     def update(self):
         self.rect.centerx -= 9
         
         
-def main():
-    pg.display.set_caption("シューティング")
-    screen = pg.display.set_mode((WIDTH, HEIGHT))
-    bg_img = pg.image.load(f"{MAIN_DIR}/fig/pg_bg.jpg")
-    bg_img2 = pg.transform.flip(bg_img, True, False)  # scroll 反転した背景を準備
-    score = Score()
-    boss_group = pg.sprite.Group()
-    bird = Bird(3, (900, 400),boss_group)
-    bombs = pg.sprite.Group()
-    beams = pg.sprite.Group()
-    exps = pg.sprite.Group()
-    emys = pg.sprite.Group()
-    drops = pg.sprite.Group()
-    Bird_life = 3
-    tmr = 0
-    clock = pg.time.Clock()
-    keytype = 0
-    while True:
-        key_lst = pg.key.get_pressed()
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                return 0
-            if event.type == pg.KEYDOWN:
-                if event.key == pg.K_0:
-                    keytype = 0
-                if event.key == pg.K_1:
-                    keytype = 1
-                if event.key == pg.K_2:
-                    keytype = 2
-                
-                bird.change_beam_type(event.key,score)
-                if event.key == pg.K_SPACE:
-                    
-                    if keytype == 0:
-                        beams.add(Beam(bird,boss_group))
-                    if keytype == 1 and score.value >= 50:
-                        beams.add(Beam1(bird,boss_group))
-                    if keytype == 2 and score.value >= 100:
-                        beams.add(Beam2(bird,boss_group))
-                    beams.add(bird.create_beam()) 
-        if tmr * 8 < 9600:  # scroll tmrが一定の値以下の間スクロールする 6400n + 3200
-            x = tmr * 8 % 3200
-            screen.blit(bg_img, [-x, 0])
-            screen.blit(bg_img2, [1600-x, 0])
-            screen.blit(bg_img, [3200-x, 0])
-        else:  # ボスが出現したらストップ
-             screen.blit(bg_img, [0, 0])
-            
-        if tmr%200 == 0:  # 200フレームに1回，敵機を出現させる
-            emys.add(Enemy())
-
-        for emy in emys:
-            if emy.state == "stop" and tmr%emy.interval == 0:
-                # 敵機が停止状態に入ったら，intervalに応じて爆弾投下
-                bombs.add(Bomb(emy, bird))
-                
-        for emy in pg.sprite.groupcollide(emys, beams, True, True).keys():
-            exps.add(Explosion(emy, 100))  # 爆発エフェクト
-            score.value += 10  # 10点アップ
-            bird.change_img(6, screen)
-            if random.randint(0,100)<50:
-                drops.add(Drop(emy))
-       
-        for bomb in pg.sprite.groupcollide(bombs, beams, True, True).keys():
-            exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-            score.value += 1  # 1点アップ
-            
-        if len(pg.sprite.spritecollide(bird, bombs, True)) != 0:
-            score.decrease_life()
-            bird.change_img(8, screen) 
-            time.sleep(1)
-            if score.bird_life == 0:
-                score.show_game_over(screen)
-                score.update(screen)
-                pg.display.update()
-                return
-              
-        if tmr*8 == 9600:
-            boss_group.add(Boss(exps,screen))
-            
-        for drop in pg.sprite.spritecollide(bird, drops, True):
-            score.value += 10 
-          
-        boss_group.update(bird,bombs,score.value)
-        boss_group.draw(screen)
-        bird.update(key_lst, screen)
-        beams.update()
-        beams.draw(screen)
-        emys.update()
-        emys.draw(screen)
-        bombs.update()
-        bombs.draw(screen)
-        exps.update()
-        exps.draw(screen)
-        score.update(screen)
-        drops.update()
-        drops.draw(screen)
-        pg.display.update()
-        tmr += 1
-        clock.tick(50)
+class ProjectileArray:
+    """
+    弾（ビームまたは爆弾）の位置・速度・大きさ・生存フラグをNumPy配列で保持するクラス
+    スプライトグループと同じくadd/update/drawを持ち，移動と画面外判定をまとめて行う
+    """
+    fields = ("x", "y", "px", "py", "vx", "vy", "hw", "hh", "rad", "img", "parent", "alive")  # 要素ごとの配列（拡張と詰め直しの対象）
+
+    def __init__(self, circle: bool, capacity: int = 256):
+        """
+        引数1 circle：円として当たり判定するか（爆弾：True，ビーム：False）
+        引数2 capacity：配列の初期容量（足りなくなったら倍に拡張する）
+        """
+        self.circle = circle
+        self.n = 0  # 使用中の要素数（alive=Falseのものを含む）
+        self.x, self.y, self.vx, self.vy, self.hw, self.hh, self.rad = (np.zeros(capacity) for _ in range(7))
+        self.px, self.py = np.zeros(capacity), np.zeros(capacity)  # 1フレーム前の位置（補間描画用，snapshotで記録する）
+        self.img = np.zeros(capacity, dtype=np.int32)  # surfaces内の画像番号
+        self.parent = np.zeros(capacity, dtype=np.int32)  # parents内の親の番号+1（0なら親なし）
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.surfaces = []  # 画像番号 -> Surface
+        self.surface_ids = {}  # Surface -> 画像番号
+        self.parents = []  # 親の番号 -> 親のスプライト（親が消えたら一緒に消す弾だけ）
+        self.parent_ids = {}  # 親のスプライト -> 親の番号
+        self.drawn = []  # 前回描画した矩形
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.alive[:self.n]))
+
+    def _grow(self):
+        for name in self.fields:
+            old = getattr(self, name)
+            new = np.zeros(2*len(old), dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def add(self, *sprites: pg.sprite.Sprite):
+        """
+        Beam/Bombスプライトの状態を配列に移し，スプライトはプールへ返す
+        引数 sprites：Beam/Bombのインスタンス
+        """
+        for sprite in sprites:
+            if self.n == len(self.x):
+                self._grow()
+            i = self.n
+            img = sprite.image
+            if img not in self.surface_ids:
+                self.surface_ids[img] = len(self.surfaces)
+                self.surfaces.append(img)
+            self.img[i] = self.surface_ids[img]
+            rect = sprite.rect
+            # 要素ごとの代入はNumPyでは遅いので，配列から読み戻さずに済むようにする
+            self.x[i] = self.px[i] = rect.centerx
+            self.y[i] = self.py[i] = rect.centery
+            self.vx[i] = sprite.speed * sprite.vx
+            self.vy[i] = sprite.speed * sprite.vy
+            self.hw[i] = rect.width / 2
+            self.hh[i] = rect.height / 2
+            self.rad[i] = getattr(sprite, "rad", 0)
+            parent = getattr(sprite, "parent", None)
+            if parent is None:
+                self.parent[i] = 0
+            else:
+                if parent not in self.parent_ids:
+                    self.parent_ids[parent] = len(self.parents)
+                    self.parents.append(parent)
+                self.parent[i] = self.parent_ids[parent] + 1
+            self.alive[i] = True
+            self.n += 1
+            sprite.kill()
+
+    def snapshot(self):
+        """
+        補間描画のために，移動前の位置を記録する（補間しないときは呼ばなくてよい）
+        """
+        n = self.n
+        self.px[:n] = self.x[:n]
+        self.py[:n] = self.y[:n]
+
+    def update(self):
+        """
+        全ての弾を速度ベクトルに基づき移動させ，画面外に出たものを消す（check_boundと同じ判定）
+        """
+        n = self.n
+        if not n:  # 弾が無いフレームは配列の操作を省く
+            return
+        x, y, hw, hh = self.x[:n], self.y[:n], self.hw[:n], self.hh[:n]
+        x += self.vx[:n]
+        y += self.vy[:n]
+        # x-hw >= 0 は x >= hw と同じ結果になる（浮動小数点の引き算の符号は正確）ので，引き算を省く
+        self.alive[:n] &= (x >= hw) & (x+hw <= WIDTH) & (y >= hh) & (y+hh <= HEIGHT)
+        self.compact()
+
+    def compact(self):
+        """
+        消えた弾を配列から取り除き，生きている弾を順番を保ったまま前に詰める
+        """
+        n = self.n
+        keep = self.alive[:n]
+        m = int(np.count_nonzero(keep))
+        if m == n:
+            return
+        for name in self.fields:
+            if name == "alive":
+                continue
+            arr = getattr(self, name)
+            arr[:m] = arr[:n][keep]
+        self.alive[:m] = True
+        self.alive[m:n] = False
+        self.n = m
+
+    def orphans(self):
+        """
+        親が消えた弾を消す（Despawn(parent=True)と同じ判定）
+        """
+        if not self.parents or not self.n:
+            return
+        dead = [i+1 for i, parent in enumerate(self.parents) if not parent.alive()]
+        if not dead:
+            return
+        n = self.n
+        self.alive[:n] &= ~np.isin(self.parent[:n], dead)
+        self.compact()
+
+    def overlap(self, rect: pg.Rect) -> np.ndarray:
+        """
+        rectと重なっている生存中の弾の番号の配列を返す（爆弾は円と矩形で判定する）
+        """
+        n = self.n
+        if not n:
+            return np.empty(0, dtype=np.intp)
+        x, y = self.x[:n], self.y[:n]
+        if self.circle:
+            dx = x - np.clip(x, rect.left, rect.right)
+            dy = y - np.clip(y, rect.top, rect.bottom)
+            hit = dx*dx + dy*dy < self.rad[:n]**2
+        else:
+            hw, hh = self.hw[:n], self.hh[:n]
+            hit = (x-hw < rect.right) & (x+hw > rect.left) & (y-hh < rect.bottom) & (y+hh > rect.top)
+        return np.nonzero(hit & self.alive[:n])[0]
+
+    def topleft(self, i: int) -> tuple[int, int]:
+        """
+        i番目の弾の画像を描く位置（drawと同じ丸め方）を返す
+        """
+        return int(self.x[i] - self.hw[i]), int(self.y[i] - self.hh[i])
+
+    def refine(self, idx: np.ndarray, image: pg.Surface, pos: tuple[int, int]) -> np.ndarray:
+        """
+        overlapで見つけた弾のうち，位置posの画像imageと不透明な部分が重なっているものだけを返す
+        """
+        surfaces = self.surfaces
+        return np.array(
+            [i for i in idx.tolist() if MASKS.overlap(image, pos, surfaces[self.img[i]], self.topleft(i))],
+            dtype=np.intp,
+        )
+
+    def rect(self, i: int) -> pg.Rect:
+        """
+        i番目の弾の矩形を返す
+        """
+        rect = pg.Rect(0, 0, 2*self.hw[i], 2*self.hh[i])
+        rect.center = self.x[i], self.y[i]
+        return rect
+
+    def draw(self, screen: pg.Surface, alpha: float = 1.0) -> list[pg.Rect]:
+        """
+        生存中の弾を1回のblitsでまとめて描画する
+        引数1 screen：画面Surface
+        引数2 alpha：1フレーム前の位置と今の位置の補間係数（1.0なら今の位置）
+        戻り値：前回と今回の描画範囲（RenderUpdates.drawと同じ）
+        """
+        idx = np.nonzero(self.alive[:self.n])[0]
+        dirty = self.drawn
+        if not len(idx):
+            self.drawn = []
+            return dirty
+        surfaces = self.surfaces
+        x, y = self.x[idx], self.y[idx]
+        if alpha < 1.0:
+            px, py = self.px[idx], self.py[idx]
+            x, y = px + (x-px)*alpha, py + (y-py)*alpha
+        left, top = x - self.hw[idx], y - self.hh[idx]
+        if VIEW.scaled:  # 描画解像度の画像と座標にする
+            surfaces = [VIEW.image(surface) for surface in surfaces]
+            left, top = left*VIEW.scale, top*VIEW.scale
+        left = left.astype(np.int32).tolist()
+        top = top.astype(np.int32).tolist()
+        self.drawn = screen.blits(
+            [(surfaces[i], (l, t)) for i, l, t in zip(self.img[idx].tolist(), left, top)]
+        )
+        return dirty + self.drawn
+
+    def clear(self, screen: pg.Surface, bg: pg.Surface):
+        """
+        前回描画した位置を背景で塗りつぶす（RenderUpdates.clearと同じ）
+        """
+        for rect in self.drawn:
+            screen.blit(bg, rect, rect)
+
+
+def particle_frames() -> list[pg.Surface]:
+    """
+    爆発の粒子の画像（色ごとに，寿命に応じて小さくなり炎の色から煙の色に変わる段階の画像）を生成して返す
+    透明度の代わりにRLE圧縮したカラーキーで抜くので，大量にblitしても速い
+    戻り値：色番号*段階数+段階番号 -> Surface のリスト（共有Surface）
+    """
+    def build() -> list[pg.Surface]:
+        base = ASSETS.get("explosion.gif")
+        frames = []
+        big, small = ParticleSystem.sizes
+        steps = ParticleSystem.steps
+        for tint in ParticleSystem.tints:
+            for step in range(steps):
+                size = round(big + (small-big) * step / (steps-1))
+                img = pg.Surface((size, size))
+                img.blit(pg.transform.scale(base, (size, size)), (0, 0))
+                # 色をあらかじめ掛けておき，描画時はblitするだけにする
+                t = step / (steps-1)
+                color = [round(a + (b-a)*t) for a, b in zip(*tint)]
+                img.fill(color, special_flags=pg.BLEND_RGB_MULT)
+                if pg.display.get_surface():
+                    img = img.convert()
+                img.set_colorkey((0, 0, 0), pg.RLEACCEL)
+                frames.append(img)
+        return frames
+    return ASSETS.derive("particles", build)
+
+
+class ParticleSystem(ProjectileArray):
+    """
+    爆発の粒子の位置・速度・寿命をNumPy配列で保持し，まとめて更新・描画するクラス
+    Explosionスプライトをaddすると，その位置から寿命に応じた数の粒子を放出する（スプライトはプールへ返す）
+    描画は色を掛けた画像のキャッシュ（particle_frames）から1回のblitsで行う
+    """
+    fields = ProjectileArray.fields + ("life", "max_life", "tint")
+    # 粒子の色（放出直後の色，消える直前の色）：黄→赤，橙→灰色の煙，白→赤橙
+    tints = (((255, 240, 150), (150, 40, 20)), ((255, 170, 60), (90, 90, 90)), ((255, 255, 220), (200, 80, 30)))
+    steps = 8  # 寿命に応じて大きさと透明度を変える段階数
+    sizes = (24, 6)  # 放出直後と消える直前の粒子の大きさ（px）
+    max_particles = 8192  # 同時に存在できる粒子数の上限（超えた分は放出しない）
+    drag = 0.94  # 1フレームごとの速度の減衰率
+
+    def __init__(self, seed: int | None = None, capacity: int = 1024):
+        """
+        引数1 seed：粒子の乱数の種（ゲームの乱数とは別にして，見た目が結果に影響しないようにする）
+        引数2 capacity：配列の初期容量
+        """
+        super().__init__(circle=False, capacity=capacity)
+        self.life, self.max_life = np.zeros(capacity), np.ones(capacity)  # 残りの寿命，最初の寿命（フレーム数）
+        self.tint = np.zeros(capacity, dtype=np.int32)  # 色番号
+        self.random = np.random.default_rng(seed)
+        self.surfaces = particle_frames()
+        self.half_w = np.array([img.get_width() / 2 for img in self.surfaces])
+        self.half_h = np.array([img.get_height() / 2 for img in self.surfaces])
+
+    def add(self, *sprites: pg.sprite.Sprite):
+        """
+        Explosionスプライトの位置から粒子を放出し，スプライトはプールへ返す
+        引数 sprites：Explosionのインスタンス
+        """
+        for sprite in sprites:
+            life = sprite.life
+            self.emit(sprite.rect.centerx, sprite.rect.centery, max(4, life // 8), life, 2 + life / 40)
+            sprite.kill()
+
+    def emit(self, x: float, y: float, count: int, life: float, speed: float):
+        """
+        (x, y)から粒子をcount個，ランダムな向きと速さで放出する
+        引数1 x：放出位置のx座標
+        引数2 y：放出位置のy座標
+        引数3 count：粒子の数
+        引数4 life：爆発の長さ（粒子の寿命はこの3〜6割）
+        引数5 speed：粒子の最大の速さ（px/フレーム）
+        """
+        count = min(count, __class__.max_particles - self.n)
+        if count <= 0:
+            return
+        while self.n + count > len(self.x):
+            self._grow()
+        s = slice(self.n, self.n + count)
+        rnd = self.random
+        angle = rnd.uniform(0, 2*math.pi, count)
+        v = rnd.uniform(0.2, 1.0, count) * speed
+        self.x[s] = self.px[s] = x
+        self.y[s] = self.py[s] = y
+        self.vx[s] = np.cos(angle) * v
+        self.vy[s] = np.sin(angle) * v
+        self.life[s] = self.max_life[s] = np.maximum(rnd.uniform(0.3, 0.6, count) * life, 2)
+        self.tint[s] = rnd.integers(0, len(__class__.tints), count)
+        self.img[s] = self.tint[s] * __class__.steps
+        self.hw[s] = self.half_w[self.img[s]]
+        self.hh[s] = self.half_h[self.img[s]]
+        self.alive[s] = True
+        self.n += count
+
+    def update(self):
+        """
+        全ての粒子を移動・減速させ，寿命に応じて画像を切り替え，寿命が尽きたものを消す
+        """
+        n = self.n
+        if not n:
+            return
+        x, y, vx, vy, life = self.x[:n], self.y[:n], self.vx[:n], self.vy[:n], self.life[:n]
+        self.px[:n] = x
+        self.py[:n] = y
+        x += vx
+        y += vy
+        vx *= __class__.drag
+        vy *= __class__.drag
+        life -= 1
+        self.alive[:n] = life > 0
+        steps = __class__.steps
+        step = np.minimum((steps * (1 - life / self.max_life[:n])).astype(np.int32), steps-1)
+        img = self.img[:n]
+        img[:] = self.tint[:n] * steps + np.maximum(step, 0)
+        self.hw[:n] = self.half_w[img]
+        self.hh[:n] = self.half_h[img]
+        self.compact()
+
+
+class ProjectileEngine:
+    """
+    ビームと爆弾をNumPy配列（ProjectileArray）で管理し，当たり判定をまとめて行うクラス
+    main(soa=True)のとき，ビームと爆弾のスプライトグループの代わりに使う
+    """
+    def __init__(self, pixel: bool = False):
+        """
+        引数 pixel：形や矩形で重なった弾をさらに画像のマスクで判定するか
+        """
+        if np is None:
+            raise RuntimeError("--soa を使うには numpy が必要です")
+        self.pixel = pixel
+        self.beams = ProjectileArray(circle=False)
+        self.bombs = ProjectileArray(circle=True, capacity=1024)
+
+    def collide_group(self, group: pg.sprite.AbstractGroup) -> list[pg.sprite.Sprite]:
+        """
+        ビームとgroup（敵機）の当たり判定．当たったビームと敵機を消す
+        戻り値：ビームが当たったスプライトのリスト
+        """
+        beams = self.beams
+        killed = []
+        n = beams.n
+        sprites = group.sprites()
+        if not n or not sprites:
+            return killed
+        # スプライト（行）×ビーム（列）の矩形の当たり判定行列をまとめて求める
+        rects = np.array([sprite.rect for sprite in sprites], dtype=np.float64)  # (x, y, 幅, 高さ)
+        left, top = rects[:, 0:1], rects[:, 1:2]
+        right, bottom = left + rects[:, 2:3], top + rects[:, 3:4]
+        x, y, hw, hh = beams.x[:n], beams.y[:n], beams.hw[:n], beams.hh[:n]
+        hit = (x-hw < right) & (x+hw > left) & (y-hh < bottom) & (y+hh > top)
+        # スプライトを先頭から順に見て，まだ生きているビームに当たったものだけを消す（overlapを順に呼ぶのと同じ）
+        for i in np.nonzero(hit.any(axis=1))[0].tolist():
+            sprite = sprites[i]
+            idx = np.nonzero(hit[i] & beams.alive[:n])[0]
+            if self.pixel:
+                idx = beams.refine(idx, sprite.image, sprite.rect.topleft)
+            if len(idx):
+                beams.alive[idx] = False
+                sprite.kill()
+                killed.append(sprite)
+        return killed
+
+    def collide_boss(self, boss_group: pg.sprite.AbstractGroup):
+        """
+        ビームとボスの当たり判定．当たったビーム1本につき1ダメージを与え，ビームを消す
+        """
+        if not self.beams.n:
+            return
+        for boss in boss_group.sprites():
+            idx = self.beams.overlap(boss.rect)
+            if self.pixel:
+                idx = self.beams.refine(idx, boss.image, boss.rect.topleft)
+            for _ in range(len(idx)):
+                boss.damage()
+            self.beams.alive[idx] = False
+
+    def collide_beams_bombs(self) -> list[types.SimpleNamespace]:
+        """
+        ビームと爆弾の当たり判定．当たった爆弾とビームを消す
+        爆弾を先頭から順に見て，まだ生きているビームに当たった爆弾だけを消す（groupcollideと同じ）
+        戻り値：消えた爆弾の位置（rect属性を持つオブジェクト）のリスト
+        """
+        beams, bombs = self.beams, self.bombs
+        nb, nm = beams.n, bombs.n
+        if not nb or not nm:
+            return []
+        # 爆弾（行）×ビーム（列）の円と矩形の当たり判定行列
+        left = (beams.x[:nb] - beams.hw[:nb])[None, :]
+        right = (beams.x[:nb] + beams.hw[:nb])[None, :]
+        top = (beams.y[:nb] - beams.hh[:nb])[None, :]
+        bottom = (beams.y[:nb] + beams.hh[:nb])[None, :]
+        x, y = bombs.x[:nm, None], bombs.y[:nm, None]
+        dx = x - np.minimum(np.maximum(x, left), right)
+        dy = y - np.minimum(np.maximum(y, top), bottom)
+        hit = (dx*dx + dy*dy < bombs.rad[:nm, None]**2) & beams.alive[None, :nb] & bombs.alive[:nm, None]
+        destroyed = []
+        for i in np.nonzero(hit.any(axis=1))[0]:
+            cols = hit[i] & beams.alive[:nb]
+            if self.pixel and cols.any():
+                j = np.nonzero(cols)[0]
+                cols = np.zeros(nb, dtype=bool)
+                cols[beams.refine(j, bombs.surfaces[bombs.img[i]], bombs.topleft(i))] = True
+            if cols.any():
+                beams.alive[:nb][cols] = False
+                bombs.alive[i] = False
+                destroyed.append(types.SimpleNamespace(rect=bombs.rect(i)))
+        return destroyed
+
+    def collide_rect(self, rect: pg.Rect, image: pg.Surface | None = None) -> int:
+        """
+        爆弾とrect（戦闘機）の当たり判定．当たった爆弾を消す
+        引数1 rect：判定する矩形
+        引数2 image：rectの位置に描かれる画像（pixelのときはこの画像のマスクでも判定する）
+        戻り値：当たった爆弾の数
+        """
+        if not self.bombs.n:
+            return 0
+        idx = self.bombs.overlap(rect)
+        if self.pixel and image is not None:
+            idx = self.bombs.refine(idx, image, rect.topleft)
+        self.bombs.alive[idx] = False
+        return len(idx)
+
+
+class _Section:
+    """
+    FrameProfiler.sectionが返す計測用のコンテキスト
+    """
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "FrameProfiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+
+
+class FrameProfiler:
+    """
+    メインループの段階ごとの処理時間を計測し，オーバーレイ表示とChromeのtrace形式での書き出しを行うクラス
+    無効な間はsectionが何もしない共有のコンテキストを返すだけなので，ほとんどコストがかからない
+    """
+    max_events = 500000  # 記録するtraceイベント数の上限
+    refresh = 10  # オーバーレイの数値を書き換える間隔（フレーム数．毎フレーム文字を描き直して計測を重くしないように）
+    font_size = 24
+
+    def __init__(self):
+        self.overlay = False  # オーバーレイを表示するか（F3キーで切り替え）
+        self.tracing = False  # traceイベントを記録するか
+        self.recording = False  # 表示・記録なしで計測だけするか（ベンチマーク用）
+        self.enabled = False
+        self.sections = {}  # 計測中のフレームの段階名 -> ミリ秒
+        self.last = {}  # 直前のフレームの段階名 -> ミリ秒
+        self.frame_ms = 0.0  # 直前のフレームの時間（ミリ秒）
+        self.frame_start = 0.0
+        self.events = []  # Chromeのtraceイベント
+        self.origin = time.perf_counter()
+        self.texts = []  # オーバーレイの行ごとの (文字列, 描画済みSurface)
+        self.panel = None  # オーバーレイの背景（半透明の板）
+        self.overlay_ticks = 0  # オーバーレイを描いた回数
+
+    def configure(self, overlay: bool | None = None, tracing: bool | None = None, recording: bool | None = None):
+        """
+        表示・記録の設定を変える（いずれかがTrueなら計測を行う）
+        """
+        was_enabled = self.enabled
+        if overlay is not None:
+            self.overlay = overlay
+        if tracing is not None:
+            self.tracing = tracing
+        if recording is not None:
+            self.recording = recording
+        self.enabled = self.overlay or self.tracing or self.recording
+        if self.enabled and not was_enabled:
+            # フレームの途中で計測を始めたときは，止めていた間の時間をそのフレームに含めない
+            self.frame_start = time.perf_counter()
+            self.sections = {}
+
+    def section(self, name: str):
+        """
+        with文で囲んだ処理の時間を段階nameとして計測する
+        引数 name：段階名
+        """
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self, name)
+
+    def record(self, name: str, start: float, end: float):
+        self.sections[name] = self.sections.get(name, 0.0) + (end-start) * 1000
+        if self.tracing and len(self.events) < __class__.max_events:
+            self.events.append({
+                "name": name, "ph": "X", "pid": 0, "tid": 0,
+                "ts": (start-self.origin) * 1e6, "dur": (end-start) * 1e6,
+            })
+
+    def begin_frame(self):
+        """
+        フレームの計測を始める（メインループの先頭で呼ぶ）
+        """
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+
+    def end_frame(self):
+        """
+        フレームの計測を終える（メインループの最後で呼ぶ）
+        """
+        if not self.enabled:
+            return
+        end = time.perf_counter()
+        self.frame_ms = (end-self.frame_start) * 1000
+        if self.tracing and len(self.events) < __class__.max_events:
+            self.events.append({
+                "name": "frame", "ph": "X", "pid": 0, "tid": 1,
+                "ts": (self.frame_start-self.origin) * 1e6, "dur": (end-self.frame_start) * 1e6,
+            })
+        self.last, self.sections = self.sections, {}
+
+    def draw_overlay(self, screen: pg.Surface, fps: float, counts: dict[str, int],
+                     stats: dict[str, dict[str, int]] | None = None):
+        """
+        FPS，フレーム時間，段階ごとの時間，スプライト数，処理の統計を画面左上に表示する（数値はrefreshフレームごとに書き換える）
+        引数1 screen：画面Surface
+        引数2 fps：clock.get_fps()の値
+        引数3 counts：グループ名 -> スプライト数
+        引数4 stats：統計の名前 -> {項目: 値}（Game.statsの値）
+        """
+        if not self.overlay:
+            return
+        if not self.texts or self.overlay_ticks % __class__.refresh == 0:
+            lines = [f"FPS {fps:5.1f}  frame {self.frame_ms:6.2f} ms"]
+            lines += [f"{name:10s} {ms:6.2f} ms" for name, ms in self.last.items()]
+            lines.append("  ".join(f"{name} {n}" for name, n in counts.items()))
+            lines += [f"{name:10s} " + "  ".join(f"{k} {v}" for k, v in values.items())
+                      for name, values in (stats or {}).items()]
+            del self.texts[len(lines):]
+            for i, line in enumerate(lines):
+                if i < len(self.texts) and self.texts[i][0] == line:  # 変わっていない行は描き直さない
+                    continue
+                img = TEXTS.render(line, __class__.font_size, (255, 255, 255), True)
+                if i < len(self.texts):
+                    self.texts[i] = line, img
+                else:
+                    self.texts.append((line, img))
+            # 板は文字列の幅が変わるたびに作り直さないように，幅を50px単位で切り上げる
+            size = -(-(max(img.get_width() for _, img in self.texts) + 20) // 50) * 50, 22*len(self.texts) + 10
+            if self.panel is None or self.panel.get_size() != size:
+                self.panel = pg.Surface(size, pg.SRCALPHA)
+                self.panel.fill((0, 0, 0, 160))
+        self.overlay_ticks += 1
+        screen.blit(self.panel, (10, 10))
+        for i, (_, img) in enumerate(self.texts):
+            screen.blit(img, (20, 15 + 22*i))
+
+    def dump_trace(self, path: str):
+        """
+        記録したイベントをChromeのtrace形式（chrome://tracing，Perfetto）のJSONで書き出す
+        引数 path：書き出すファイル名
+        """
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+_NULL_SECTION = contextlib.nullcontext()
+PROFILER = FrameProfiler()
+
+
+def surface_bytes(surface: pg.Surface) -> int:
+    """
+    Surfaceのピクセルデータの大きさ（バイト）
+    """
+    return surface.get_pitch() * surface.get_height()
+
+
+def _surfaces_in(value):
+    """
+    値に含まれるSurface（リスト・辞書の要素と，オブジェクトの属性を1段だけ）を順に返す
+    """
+    if isinstance(value, pg.Surface):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _surfaces_in(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _surfaces_in(item)
+    elif hasattr(value, "__dict__"):
+        for item in vars(value).values():
+            if isinstance(item, pg.Surface):
+                yield item
+
+
+def _game_owners(game: "Game"):
+    """
+    ゲームがSurfaceを持つもの（背景，スコア，スプライト）を (持ち主の名前, 値) の順に返す
+    """
+    yield type(game.background).__name__, game.background.__dict__
+    yield "Score", game.score
+    for group in (game.bird_group, game.boss_group, game.emys, game.beams, game.bombs, game.exps, game.drops):
+        if isinstance(group, pg.sprite.AbstractGroup):
+            for sprite in group:
+                yield type(sprite).__name__, sprite
+        else:  # NumPy配列の弾と粒子は画像のリストを持つ
+            yield type(group).__name__, group.surfaces
+
+
+class MemoryLedger:
+    """
+    Surfaceのピクセルデータ（tracemallocでは見えないSDLのメモリ）を持ち主ごとに数え，メモリの上限を守らせるクラス
+    キャッシュとスプライトをたどって，同じSurfaceは最初に見つけた持ち主だけに数える
+    上限を超えたら作り直せるキャッシュのうち使っていない項目を捨てる（ゲームの進行は変えないので，記録の再生には影響しない）
+    """
+    interval = 50  # 上限を確かめる間隔（フレーム数）
+
+    def __init__(self):
+        self.budget = None  # メモリの上限（バイト，Noneなら無制限）
+        self.last = {}  # 直前に数えた持ち主 -> (Surface数, バイト数)
+        self.total = 0  # 直前に数えた合計バイト数
+        self.evictions = 0  # キャッシュの項目を捨てた回数
+        self.pinned = {}  # キャッシュの名前 -> 起動時に作っておいた（捨てない）項目のキー
+        self.stalled = None  # 捨てても減らなかったときの合計バイト数（合計が変わるまで捨て直さない）
+        self.warned = False  # このゲームで上限を超えた警告を出したか
+
+    def configure(self, budget_mb: float | None = None, trace: bool = False):
+        """
+        引数1 budget_mb：Surfaceのメモリの上限（MB，Noneなら無制限）
+        引数2 trace：tracemallocでPythonのメモリ確保の追跡を始めるか
+        """
+        self.budget = None if budget_mb is None else int(budget_mb * 1024 * 1024)
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+
+    def measure(self, game: "Game | None" = None) -> dict[str, tuple[int, int]]:
+        """
+        生きているSurfaceを持ち主ごとに数える
+        引数 game：スプライトを数えるゲーム（Noneならキャッシュだけ）
+        戻り値：持ち主 -> (Surface数, バイト数)
+        """
+        seen = set()
+        ledger = {}
+
+        def count(owner: str, values):
+            for surface in _surfaces_in(values):
+                if id(surface) in seen:
+                    continue
+                seen.add(id(surface))
+                n, size = ledger.get(owner, (0, 0))
+                ledger[owner] = n + 1, size + surface_bytes(surface)
+
+        count("AssetRegistry", ASSETS.surfaces)
+        for key, value in ASSETS.derived.items():
+            count(f"AssetRegistry[{key[0] if isinstance(key, tuple) else key}]", value)
+        count("RotationCache", ROTATIONS.images)
+        count("TextCache", TEXTS.surfaces)
+        count("RenderView", list(VIEW.images.values()))
+        if MASKS.masks:  # マスクはSurfaceではないが，1ピクセル1ビットで数える
+            ledger["MaskCache"] = len(MASKS.masks), sum(
+                (m.get_size()[0] * m.get_size()[1] + 7) // 8 for m in MASKS.masks.values()
+            )
+        if game is not None:
+            for owner, value in _game_owners(game):
+                count(owner, value)
+        self.last = ledger
+        self.total = sum(size for _, size in ledger.values())
+        return ledger
+
+    def report(self) -> list[str]:
+        """
+        直前に数えた結果を，バイト数の多い順に1行ずつ返す
+        """
+        lines = [f"surfaces: {self.total / 1024 / 1024:.1f} MB"
+                 + ("" if self.budget is None else f" / budget {self.budget / 1024 / 1024:.1f} MB")]
+        for owner, (n, size) in sorted(self.last.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  {owner:28s} {n:5d} surfaces {size / 1024:9.1f} KB")
+        return lines
+
+    def snapshot(self, limit: int = 10) -> list[str]:
+        """
+        tracemallocのスナップショットを取り，Pythonのメモリ確保の多い行を返す（追跡していなければここで始める）
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            return ["tracemalloc: started tracing (take another snapshot later)"]
+        stats = tracemalloc.take_snapshot().statistics("lineno")
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"tracemalloc: current {current / 1024 / 1024:.1f} MB, peak {peak / 1024 / 1024:.1f} MB"]
+        lines += [f"  {stat}" for stat in stats[:limit]]
+        return lines
+
+    @staticmethod
+    def caches() -> tuple[tuple[str, dict], ...]:
+        """
+        作り直せるキャッシュ（名前, キー -> 値の辞書）を，作り直しが安いものから順に返す
+        """
+        return (("TextCache", TEXTS.surfaces), ("MaskCache", MASKS.masks), ("RenderView", VIEW.images),
+                ("RotationCache", ROTATIONS.images), ("AssetRegistry.derived", ASSETS.derived))
+
+    def pin(self):
+        """
+        今キャッシュにある項目を起動時に作っておいたものとして記録し，上限を超えても捨てないようにする
+        （捨てるとゲーム中に作り直して画面が止まるので．build_imagesとprefill_masksの後に呼ぶ）
+        """
+        self.pinned = {name: set(cache) for name, cache in __class__.caches()}
+
+    def start_episode(self):
+        """
+        新しいゲームの開始時に，上限を超えた警告をもう一度出せるようにする
+        """
+        self.stalled = None
+        self.warned = False
+
+    def evict(self, game: "Game") -> dict[str, int]:
+        """
+        キャッシュの項目のうち，起動時に作っておいたものでも，ゲームが今使っているものでもないものを捨てる
+        戻り値：キャッシュの名前 -> 捨てた項目数
+        """
+        held = {id(surface) for _, value in _game_owners(game) for surface in _surfaces_in(value)}
+        evicted = {}
+        for name, cache in __class__.caches():
+            pinned = self.pinned.get(name, ())
+            keys = [key for key, value in list(cache.items())
+                    if key not in pinned and not any(id(surface) in held for surface in _surfaces_in((key, value)))]
+            for key in keys:
+                del cache[key]
+            if keys:
+                evicted[name] = len(keys)
+        return evicted
+
+    def check(self, game: "Game"):
+        """
+        上限を超えていれば使っていないキャッシュの項目を捨て，それでも超えていれば警告をログに出す（1ゲームに1回）
+        捨てても減らなければ，合計が変わるまで捨て直さない
+        """
+        if self.budget is None:
+            return
+        self.measure(game)
+        if self.total <= self.budget:
+            return
+        if self.total != self.stalled:
+            before = self.total
+            evicted = self.evict(game)
+            if evicted:
+                self.evictions += 1
+                self.measure(game)
+                LOG.debug("memory budget exceeded (%.1f MB > %.1f MB): evicted %s, now %.1f MB",
+                          before / 1024 / 1024, self.budget / 1024 / 1024,
+                          ", ".join(f"{name} x{n}" for name, n in evicted.items()), self.total / 1024 / 1024)
+            if self.total >= before:
+                self.stalled = self.total
+        if self.total > self.budget and not self.warned:
+            self.warned = True
+            LOG.warning("memory budget exceeded (%.1f MB > %.1f MB): the rest is in use or built at startup",
+                        self.total / 1024 / 1024, self.budget / 1024 / 1024)
+
+
+MEMORY = MemoryLedger()
+
+
+def synth(duration: float, start: float, end: float, wave: str = "square", decay: float = 6.0,
+          rate: int = 44100) -> "np.ndarray | list[float]":
+    """
+    効果音の波形（-1〜1のモノラルのサンプルの配列）を生成する（numpyが無ければ1サンプルずつ計算したリスト）
+    引数1 duration：長さ（秒）
+    引数2 start：最初の周波数（Hz）
+    引数3 end：最後の周波数（Hz，startから指数的に変化する）
+    引数4 wave：波形（"square"，"sine"，"noise"）
+    引数5 decay：音量の減衰の速さ（大きいほど早く消える）
+    引数6 rate：サンプリング周波数
+    """
+    n = int(duration * rate)
+    if np is not None:
+        i = np.arange(n)
+        t = i / n
+        phase = np.cumsum(start * (end/start) ** t / rate)
+        if wave == "noise":  # 位相が1周するごとに値を変えると低い音の雑音になる
+            cycle = phase.astype(np.int64)
+            held = np.random.default_rng(0).uniform(-1, 1, int(cycle[-1]) + 1) if n else np.zeros(1)
+            held[0] = 0.0
+            v = held[cycle]
+        elif wave == "sine":
+            v = np.sin(2 * np.pi * phase)
+        else:
+            v = np.where(phase % 1.0 < 0.5, 1.0, -1.0)
+        attack = np.minimum(1.0, i / (0.005*rate))  # 鳴り始めのプチッという音を防ぐ
+        return v * attack * np.exp(-decay * t)
+    noise = random.Random(0)  # 効果音は毎回同じ音にする
+    phase = 0.0
+    held = 0.0
+    out = []
+    for i in range(n):
+        t = i / n
+        freq = start * (end/start) ** t
+        phase += freq / rate
+        if wave == "noise":
+            if phase >= 1.0:  # 周波数ごとに値を変えると低い音の雑音になる
+                phase -= 1.0
+                held = noise.uniform(-1, 1)
+            v = held
+        elif wave == "sine":
+            v = math.sin(2 * math.pi * phase)
+        else:
+            v = 1.0 if phase % 1.0 < 0.5 else -1.0
+        attack = min(1.0, i / (0.005*rate))  # 鳴り始めのプチッという音を防ぐ
+        out.append(v * attack * math.exp(-decay * t))
+    return out
+
+
+class AudioManager:
+    """
+    効果音を起動時にまとめて作り，種類ごとに確保したチャンネルで鳴らすクラス
+    Gameはplayで鳴らしたい音を登録するだけで，実際に鳴らすのは1フレームに1回のflush
+    同じフレームに同じ音が何回登録されても1回だけ（回数に応じて少し大きく）鳴らし，cooldownの間は鳴らさない
+    """
+    frequency = 44100
+    buffer = 512  # ミキサーのバッファのサンプル数（小さいほど遅延が少ない）
+    single_level = 0.7  # 1回だけ登録された音のチャンネルの音量（同じフレームに重なった音ほど大きくする）
+    directory = os.path.join(MAIN_DIR, "sound")  # 名前.wavがあれば生成した音の代わりに使う
+    channels = {"beam": 4, "hit": 6, "explosion": 6, "ui": 2}  # 種類 -> 確保するチャンネル数
+    steal = {"beam", "explosion"}  # チャンネルが足りないとき一番古い音を止めて鳴らす種類（それ以外は鳴らさない）
+    # 名前 -> (種類, 音量, 鳴らさない間隔（フレーム数）, 波形の引数)
+    SOUNDS = {
+        "beam": ("beam", 0.25, 3, (0.08, 1800, 600, "square", 8.0)),
+        "bomb_hit": ("hit", 0.35, 2, (0.06, 3000, 800, "noise", 10.0)),
+        "boss_hit": ("hit", 0.4, 4, (0.12, 400, 150, "square", 7.0)),
+        "damage": ("hit", 0.6, 0, (0.35, 300, 60, "square", 4.0)),
+        "explosion": ("explosion", 0.6, 3, (0.45, 1200, 200, "noise", 5.0)),
+        "drop": ("ui", 0.4, 0, (0.15, 900, 1800, "sine", 4.0)),
+        "game_over": ("ui", 0.6, 0, (0.9, 440, 110, "square", 2.5)),
+        "game_clear": ("ui", 0.6, 0, (0.9, 440, 1760, "sine", 2.0)),
+    }
+
+    def __init__(self):
+        self.sounds = {}  # 名前 -> Sound（空ならplayは何もしない）
+        self.pools = {}  # 種類 -> 確保したChannelのリスト
+        self.started = {}  # Channel -> 鳴らし始めたフレーム
+        self.pending = collections.Counter()  # このフレームで鳴らす音の名前 -> 登録された回数
+        self.last = {}  # 名前 -> 最後に鳴らしたフレーム
+        self.frame = 0
+        self.stats = collections.Counter()  # played，coalesced，throttled，dropped
+
+    def pre_init(self):
+        """
+        遅延の少ないミキサーの設定をする（pg.initより前に呼ぶ）
+        """
+        pg.mixer.pre_init(__class__.frequency, -16, 2, __class__.buffer)
+
+    def preload(self) -> bool:
+        """
+        ミキサーを初期化し，全ての効果音を作ってチャンネルを確保する
+        戻り値：音を鳴らせるか（オーディオ装置が無ければFalseで，以後playは何もしない）
+        """
+        try:
+            if pg.mixer.get_init() is None:
+                pg.mixer.init(__class__.frequency, -16, 2, __class__.buffer)
+        except pg.error as e:
+            LOG.warning("audio disabled: %s", e)
+            return False
+        rate, size, stereo = pg.mixer.get_init()
+        if size != -16:
+            LOG.warning("audio disabled: unsupported mixer format %s", size)
+            return False
+        for name, (category, volume, cooldown, args) in __class__.SOUNDS.items():
+            path = os.path.join(__class__.directory, f"{name}.wav")
+            if os.path.exists(path):
+                sound = pg.mixer.Sound(path)
+            elif np is not None:
+                samples = (np.repeat(synth(*args, rate=rate), stereo) * 32767).astype(np.int16)
+                sound = pg.mixer.Sound(buffer=samples.tobytes())
+            else:
+                samples = array.array("h", (int(v * 32767) for v in synth(*args, rate=rate)
+                                            for _ in range(stereo)))
+                sound = pg.mixer.Sound(buffer=samples.tobytes())
+            sound.set_volume(volume)
+            self.sounds[name] = sound
+        total = sum(__class__.channels.values())
+        pg.mixer.set_num_channels(total)
+        pg.mixer.set_reserved(total)  # Sound.playに勝手に使わせない
+        ids = iter(range(total))
+        self.pools = {category: [pg.mixer.Channel(next(ids)) for _ in range(n)]
+                      for category, n in __class__.channels.items()}
+        return True
+
+    def play(self, name: str):
+        """
+        このフレームで鳴らす音を登録する（鳴らすのはflush）
+        """
+        if self.sounds:
+            self.pending[name] += 1
+
+    def channel(self, category: str) -> pg.mixer.Channel | None:
+        """
+        種類のチャンネルから空いているものを返す（無ければ一番古い音を止めるか，Noneを返す）
+        """
+        pool = self.pools[category]
+        for channel in pool:
+            if not channel.get_busy():
+                return channel
+        if category not in __class__.steal:
+            return None
+        return min(pool, key=lambda channel: self.started.get(channel, 0))
+
+    def flush(self):
+        """
+        このフレームに登録された音を1種類につき1回ずつ鳴らす（1フレームに1回呼ぶ）
+        """
+        for name, count in self.pending.items():
+            category, volume, cooldown, _ = __class__.SOUNDS[name]
+            self.stats["coalesced"] += count - 1
+            last = self.last.get(name)
+            if last is not None and self.frame - last < cooldown:
+                self.stats["throttled"] += 1
+                continue
+            channel = self.channel(category)
+            if channel is None:
+                self.stats["dropped"] += 1
+                continue
+            channel.play(self.sounds[name])
+            channel.set_volume(min(1.0, __class__.single_level + 0.15*math.log2(count)))
+            self.started[channel] = self.frame
+            self.last[name] = self.frame
+            self.stats["played"] += 1
+        self.pending.clear()
+        self.frame += 1
+
+
+AUDIO = AudioManager()
+
+
+class BackgroundLayer:
+    """
+    背景の1層．タイル画像と左右反転した画像を交互に並べた帯を起動時に1枚に合成して持つ
+    """
+    def __init__(self, tile: pg.Surface, factor: float = 1.0, width: int = WIDTH):
+        """
+        引数1 tile：タイル画像
+        引数2 factor：スクロール量に掛ける倍率（奥の層ほど小さくする）
+        引数3 width：画面の幅
+        """
+        self.factor = factor
+        self.period = 2 * tile.get_width()  # 元画像+反転画像で1周期
+        alpha = tile.get_flags() & pg.SRCALPHA or tile.get_colorkey() is not None
+        self.strip = pg.Surface((self.period + width, tile.get_height()), pg.SRCALPHA if alpha else 0)
+        flipped = pg.transform.flip(tile, True, False)
+        for i, x in enumerate(range(0, self.strip.get_width(), tile.get_width())):
+            self.strip.blit(flipped if i % 2 else tile, (x, 0))
+        if pg.display.get_surface() is not None:  # 画面のピクセル形式に変換しておく
+            self.strip = self.strip.convert_alpha() if alpha else self.strip.convert()
+
+    def offset(self, pos: float) -> int:
+        """
+        スクロール位置posでの帯の切り出し開始位置を返す
+        """
+        return int(pos * self.factor) % self.period
+
+
+class ScrollingBackground:
+    """
+    左右反転を繰り返す背景を横スクロールさせるクラス
+    各層の合成済みの帯から画面1枚分だけを切り出して描画するので，1層あたりのコストは画面1枚分で済む
+    """
+    def __init__(self, layers: list[BackgroundLayer], length: int, size: tuple[int, int] = (WIDTH, HEIGHT)):
+        """
+        引数1 layers：奥から順に並べた背景の層
+        引数2 length：スクロールする長さ（これを超えたら止まる）
+        引数3 size：画面の大きさ
+        """
+        self.layers = layers
+        self.length = length
+        self.size = size
+        self.frozen = None  # スクロール停止後の背景（(切り出し位置, Surface)）
+
+    def position(self, pos: float) -> float:
+        return min(pos, self.length)
+
+    def stopped(self, pos: float) -> bool:
+        """
+        スクロール位置posでスクロールが止まっているか
+        """
+        return pos >= self.length
+
+    def draw(self, screen: pg.Surface, pos: float):
+        """
+        スクロール位置posの背景を描画する
+        引数1 screen：画面Surface
+        引数2 pos：スクロール位置（px）
+        """
+        pos = self.position(pos)
+        w, h = self.size
+        for layer in self.layers:
+            screen.blit(layer.strip, (0, 0), (layer.offset(pos), 0, w, h))
+
+    def frame(self, pos: float) -> pg.Surface:
+        """
+        スクロール位置posの背景1枚分のSurfaceを返す（停止後の背景の描き直し用）
+        """
+        pos = self.position(pos)
+        key = tuple(layer.offset(pos) for layer in self.layers)
+        if self.frozen is None or self.frozen[0] != key:
+            if len(self.layers) == 1:  # 1層なら帯の一部をそのまま使う
+                surface = self.layers[0].strip.subsurface((key[0], 0, *self.size))
+            else:
+                surface = pg.Surface(self.size).convert()
+                self.draw(surface, pos)
+            self.frozen = key, surface
+        return self.frozen[1]
+
+
+class TileLoader:
+    """
+    背景のタイル画像を別スレッドでデコードするクラス（全ての背景で1本のスレッドを共有する）
+    デコード，反転，縮小だけを行い，画面のピクセル形式への変換は受け取った側が画面のスレッドで行う
+    """
+    def __init__(self):
+        self.requests = queue.Queue()  # (タイルのキー, 結果を入れるdeque)
+        self.thread = None
+
+    def request(self, key: tuple, inbox: collections.deque):
+        """
+        タイルのデコードを頼む．終わったら (キー, Surface, デコード時間（ミリ秒）) をinboxに追加する
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="tile-loader", daemon=True)
+            self.thread.start()
+        self.requests.put((key, inbox))
+
+    @staticmethod
+    def decode(key: tuple) -> pg.Surface:
+        """
+        タイルのキー (ファイル名, 左右反転するか, 描画解像度での大きさ) の画像を作る（変換はしない）
+        """
+        path, flip, size = key
+        img = pg.image.load(path)
+        if flip:
+            img = pg.transform.flip(img, True, False)
+        if img.get_size() != size:
+            img = pg.transform.smoothscale(img, size) if img.get_bitsize() >= 24 else pg.transform.scale(img, size)
+        return img
+
+    def _run(self):
+        while True:
+            key, inbox = self.requests.get()
+            start = time.perf_counter()
+            try:
+                img = __class__.decode(key)
+            except (pg.error, OSError) as e:  # 画面のスレッドで例外にする
+                img = e
+            inbox.append((key, img, (time.perf_counter()-start) * 1000))
+
+
+TILE_LOADER = TileLoader()
+
+
+class TiledBackground:
+    """
+    ステージのマニフェストに並べたタイル画像を横につないでスクロールさせる背景（ScrollingBackgroundと同じ使い方）
+    カメラの少し先のタイルをTileLoaderでデコードしておき，画面のスレッドでは1フレームに少しずつ変換する
+    変換済みのタイルはメモリの上限付きのLRUキャッシュに持ち，上限を超えたら表示範囲と先読み範囲の外のものから捨てる
+    """
+    cache_mb = 32  # タイルのキャッシュの上限（MB）
+    convert_per_frame = 1  # 1フレームに変換するタイルの数の上限（変換による引っかかりを防ぐ）
+
+    def __init__(self, tiles: list[tuple[str, bool, int]], length: int, size: tuple[int, int] = (WIDTH, HEIGHT),
+                 loop: bool = False, lookahead: int = WIDTH, cache_mb: float | None = None):
+        """
+        引数1 tiles：左から順に並べたタイルの (ファイル名, 左右反転するか, 幅（論理座標のpx）) のリスト
+        引数2 length：スクロールする長さ（これを超えたら止まる）
+        引数3 size：画面の大きさ（描画解像度）
+        引数4 loop：タイルの並びを最後まで使ったら先頭から繰り返すか
+        引数5 lookahead：画面の右端からどこまで先のタイルを先読みするか（論理座標のpx）
+        引数6 cache_mb：タイルのキャッシュの上限（MB，Noneならcache_mb）
+        """
+        self.length = length
+        self.size = size
+        self.loop = loop
+        self.lookahead = lookahead
+        self.cap = int((__class__.cache_mb if cache_mb is None else cache_mb) * 1024 * 1024)
+        self.starts = [0]  # タイルの左端（論理座標）
+        for _, _, width in tiles:
+            self.starts.append(self.starts[-1] + width)
+        self.period = self.starts[-1]  # タイルの並び1周分の長さ
+        if not loop and self.period < length + WIDTH:
+            raise ValueError(f"タイルの幅の合計 {self.period} px がスクロールする長さ {length} px + 画面の幅より短いです")
+        scale = size[0] / WIDTH
+        self.view_starts = [round(x * scale) for x in self.starts]  # 描画解像度での左端（継ぎ目ができないように丸める）
+        self.ratio = self.view_starts[-1] / self.period  # 論理座標 -> 描画解像度の倍率
+        self.keys = [
+            (path, flip, (self.view_starts[i+1] - self.view_starts[i], size[1]))
+            for i, (path, flip, _) in enumerate(tiles)
+        ]
+        self.cache = collections.OrderedDict()  # キー -> 変換済みSurface（古い順）
+        self.bytes = 0
+        self.pending = set()  # デコードを頼んだキー
+        self.inbox = collections.deque()  # デコードが終わった (キー, Surface, ミリ秒)（TileLoaderのスレッドが追加する）
+        self.decoded = {}  # inboxから受け取った変換待ちのタイル（キー -> Surface，画面のスレッドだけが使う）
+        self.frozen = None  # スクロール停止後の背景（(位置, Surface)）
+        self.stats = collections.Counter()  # hits，misses（画面のスレッドでデコードした数），loaded，evicted
+        self.prefetch(0, WIDTH + lookahead)  # 最初の画面のタイルは描画までにデコードしておく
+
+    @classmethod
+    def from_manifest(cls, manifest: dict, directory: str, length: int, size: tuple[int, int]) -> "TiledBackground":
+        """
+        ステージのJSONの"background"からタイルの背景を作る
+        引数1 manifest："tiles"（"file"，"flip"，"width"のリスト），"width"（タイルの幅の既定値），
+                       "loop"，"lookahead"，"cache_mb"を持つ辞書
+        引数2 directory：タイルのファイル名の基準のディレクトリ（ステージのJSONファイルのディレクトリ）
+        引数3 length：スクロールする長さ
+        引数4 size：画面の大きさ（描画解像度）
+        """
+        width = manifest.get("width", WIDTH)
+        tiles = [
+            (os.path.join(directory, tile["file"]), tile.get("flip", False), tile.get("width", width))
+            for tile in manifest["tiles"]
+        ]
+        return cls(tiles, length, size, manifest.get("loop", False), manifest.get("lookahead", WIDTH),
+                   manifest.get("cache_mb"))
+
+    def position(self, pos: float) -> float:
+        return min(pos, self.length)
+
+    def stopped(self, pos: float) -> bool:
+        """
+        スクロール位置posでスクロールが止まっているか
+        """
+        return pos >= self.length
+
+    def spans(self, left: float, right: float):
+        """
+        論理座標left〜rightに重なるタイルの (番号, 描画解像度での左端) を左から順に返す
+        """
+        n = len(self.keys)
+        rep, x = divmod(left, self.period) if self.loop else (0, left)
+        i = max(bisect.bisect_right(self.starts, x) - 1, 0)
+        base = rep * self.view_starts[-1]
+        while True:
+            if i == n:
+                if not self.loop:
+                    return
+                i = 0
+                rep += 1
+                base += self.view_starts[-1]
+            if rep*self.period + self.starts[i] >= right:
+                return
+            yield i, base + self.view_starts[i]
+            i += 1
+
+    def store(self, key: tuple, img: pg.Surface) -> pg.Surface:
+        """
+        デコード済みのタイルを画面のピクセル形式に変換してキャッシュに入れる
+        """
+        surface = img.convert_alpha() if img.get_flags() & pg.SRCALPHA else img.convert()
+        self.cache[key] = surface
+        self.bytes += surface_bytes(surface)
+        self.stats["loaded"] += 1
+        return surface
+
+    def receive(self):
+        """
+        inboxに届いたタイルをdecodedに移す（inboxはスレッドの間で安全なpopleftだけで取り出し，走査はしない）
+        """
+        inbox = self.inbox
+        while inbox:
+            key, img, ms = inbox.popleft()
+            self.decoded[key] = img
+
+    def take(self, key: tuple) -> pg.Surface:
+        """
+        decodedから取り出したタイルを変換してキャッシュに入れる（デコードに失敗していればその例外を投げる）
+        """
+        img = self.decoded.pop(key)
+        self.pending.discard(key)
+        if isinstance(img, Exception):
+            raise img
+        return self.cache[key] if key in self.cache else self.store(key, img)
+
+    def pump(self):
+        """
+        デコードが終わったタイルを1フレームにconvert_per_frame枚まで変換する
+        """
+        self.receive()
+        for key in list(self.decoded)[:__class__.convert_per_frame]:
+            self.take(key)
+
+    def get(self, i: int) -> pg.Surface:
+        """
+        i番目のタイルの変換済みSurfaceを返す（間に合っていなければここでデコードする）
+        """
+        key = self.keys[i]
+        surface = self.cache.get(key)
+        if surface is not None:
+            self.cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return surface
+        self.receive()
+        if key in self.decoded:  # デコードは終わっているが変換の順番待ち
+            return self.take(key)
+        self.stats["misses"] += 1  # 先読みが間に合わなかった
+        return self.store(key, TileLoader.decode(key))
+
+    def prefetch(self, left: float, right: float) -> set[tuple]:
+        """
+        論理座標left〜rightのタイルのうち，まだ無いもののデコードを頼む
+        戻り値：その範囲のタイルのキーの集合
+        """
+        keys = set()
+        for i, _ in self.spans(left, right):
+            key = self.keys[i]
+            keys.add(key)
+            if key not in self.cache and key not in self.pending:
+                self.pending.add(key)
+                TILE_LOADER.request(key, self.inbox)
+        return keys
+
+    def evict(self, keep: set[tuple]):
+        """
+        キャッシュが上限を超えていれば，keep以外のタイルを古い順に捨てる
+        """
+        while self.bytes > self.cap:
+            key = next((key for key in self.cache if key not in keep), None)
+            if key is None:  # 表示中と先読み中のタイルだけで上限を超えている
+                return
+            self.bytes -= surface_bytes(self.cache.pop(key))
+            self.stats["evicted"] += 1
+
+    def draw(self, screen: pg.Surface, pos: float):
+        """
+        スクロール位置posの背景を描画し，先のタイルを先読みする
+        引数1 screen：画面Surface
+        引数2 pos：スクロール位置（px）
+        """
+        pos = self.position(pos)
+        self.pump()
+        offset = round(pos * self.ratio)
+        for i, x in self.spans(pos, pos + WIDTH):
+            screen.blit(self.get(i), (x - offset, 0))
+        keep = self.prefetch(pos, pos + WIDTH + self.lookahead)
+        self.evict(keep)
+
+    def frame(self, pos: float) -> pg.Surface:
+        """
+        スクロール位置posの背景1枚分のSurfaceを返す（停止後の背景の描き直し用）
+        """
+        pos = self.position(pos)
+        if self.frozen is None or self.frozen[0] != pos:
+            surface = pg.Surface(self.size).convert()
+            self.draw(surface, pos)
+            self.frozen = pos, surface
+        return self.frozen[1]
+
+
+class FixedTimestep:
+    """
+    実際の経過時間を貯めておき，固定間隔のシミュレーションを何回進めるかを決めるクラス（アキュムレータ方式）
+    描画が遅れたときは1回の描画で複数回進めて追いつく（フレームスキップ）ので，ゲームがスローにならない
+    """
+    def __init__(self, rate: int = 50, max_steps: int = 10):
+        """
+        引数1 rate：1秒あたりのシミュレーションのフレーム数
+        引数2 max_steps：1回の描画の間に進める最大フレーム数（これを超えた遅れは切り捨てる）
+        """
+        self.rate = rate
+        self.dt = 1 / rate  # 1フレームの長さ（秒）
+        self.max_steps = max_steps
+        self.acc = 0.0  # まだシミュレーションしていない経過時間（秒）
+        self.dropped = 0  # 追いつけずに切り捨てたフレーム数
+
+    def advance(self, elapsed: float) -> int:
+        """
+        経過時間を加え，今回進めるシミュレーションのフレーム数を返す
+        引数 elapsed：前回の描画からの経過時間（秒）
+        戻り値：進めるフレーム数
+        """
+        self.acc += elapsed
+        steps = int(self.acc / self.dt)
+        if steps > self.max_steps:  # 処理が追いつかないときは遅れを捨てる
+            self.dropped += steps - self.max_steps
+            steps = self.max_steps
+            self.acc = steps * self.dt
+        self.acc -= steps * self.dt
+        return steps
+
+    @property
+    def alpha(self) -> float:
+        """
+        直前のフレームから次のフレームまでの進み具合（0〜1，描画の補間係数）
+        """
+        return min(self.acc / self.dt, 1.0)
+
+
+class Scheduler:
+    """
+    フレーム番号を時刻とするイベントの予約表（優先度付きキュー）
+    毎フレームのrunは先頭の時刻を見るだけなので，予約が何個あっても実行するまでコストがかからない
+    """
+    def __init__(self):
+        self.queue = []  # (フレーム番号, 順序, 予約番号, 関数, 引数)のヒープ
+        self.count = 0  # 予約番号（同じ時刻・順序なら予約した順に実行する）
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def clear(self):
+        self.queue.clear()
+
+    def schedule(self, tick: int, order: int, action, *args):
+        """
+        tickフレーム目にaction(tick, *args)を実行するよう予約する
+        引数1 tick：実行するフレーム番号
+        引数2 order：同じフレームでの実行順（小さいほど先）
+        引数3 action：実行する関数
+        """
+        heapq.heappush(self.queue, (tick, order, self.count, action, args))
+        self.count += 1
+
+    def run(self, now: int):
+        """
+        nowフレーム目までに予約されたイベントを全て実行する（実行中に予約されたものも含む）
+        """
+        queue = self.queue
+        while queue and queue[0][0] <= now:
+            tick, _, _, action, args = heapq.heappop(queue)
+            action(tick, *args)
+
+
+class Lifecycle:
+    """
+    スプライトの種類ごとの消滅条件（Despawn）を1フレームに1回まとめて適用し，
+    デバッグ時は種類ごとの生存数を記録して増え続けているもの（消し忘れ）を報告するクラス
+    """
+    window = 1000  # 生存数の増加を調べる期間（フレーム数）
+    samples = 10  # 期間内に記録する回数
+    min_rise = 8  # 期間内にこれ以上増え，一度も減っていなければ消し忘れとみなす
+
+    def __init__(self, detect: bool = False):
+        """
+        引数 detect：生存数を記録して消し忘れを調べるか
+        """
+        self.detect = detect
+        self.history = collections.defaultdict(lambda: collections.deque(maxlen=__class__.samples))  # 種類 -> 生存数
+        self.culled = collections.Counter()  # 種類 -> 消滅条件で消した数
+        self.reported = set()  # 報告済みの種類
+
+    def cull(self, groups, tick: int):
+        """
+        各グループのスプライトのうち消滅条件を満たしたものを消す
+        引数1 groups：スプライトグループ（ProjectileArrayは画面外の判定をupdateで済ませているので，親の判定だけ行う）
+        引数2 tick：今のフレーム番号
+        """
+        for group in groups:
+            if isinstance(group, ProjectileArray):
+                group.orphans()
+                continue
+            if not group:
+                continue
+            for sprite in group.sprites():
+                despawn = getattr(sprite, "despawn", None)
+                if despawn is not None and despawn.expired(sprite, tick):
+                    self.culled[type(sprite).__name__] += 1
+                    sprite.kill()
+
+    def sample(self, game: "Game"):
+        """
+        種類ごとの生存数を記録し，増え続けている種類をログに出す（window/samplesフレームごとに呼ぶ）
+        """
+        for name, n in game.counts().items():
+            self.history[name].append(n)
+        for name in self.leaks():
+            if name not in self.reported:
+                self.reported.add(name)
+                LOG.warning("生存数が増え続けています: %s %s", name, list(self.history[name]))
+
+    def leaks(self) -> list[str]:
+        """
+        期間全体で生存数が一度も減らずにmin_rise以上増えた種類のリストを返す
+        """
+        leaks = []
+        for name, counts in self.history.items():
+            if len(counts) < __class__.samples:
+                continue
+            if all(a <= b for a, b in itertools.pairwise(counts)) and counts[-1] - counts[0] >= __class__.min_rise:
+                leaks.append(name)
+        return leaks
+
+
+@functools.lru_cache(maxsize=None)
+def load_stage(path: str) -> dict:
+    """
+    ステージの定義（敵機の出現ウェーブとボスの出現フレーム）をJSONファイルから読み込む
+    引数 path：ステージのJSONファイル
+    戻り値：ステージの定義の辞書（共有するので書き換えない）
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def stage_digest(stage: dict) -> bytes:
+    """
+    ステージの定義のハッシュ値（SHA-256）を返す（ファイルの書式やキーの順番には影響されない）
+    """
+    return hashlib.sha256(json.dumps(stage, sort_keys=True).encode("utf-8")).digest()
+
+
+class Game:
+    """
+    1回のゲームの状態（スプライトグループ，スコア，タイマー）を持ち，1フレーム分の処理を行うクラス
+    ゲームの処理（step）と描画（draw）を分けているので，画面なしでも同じように進行する
+    """
+    scroll_speed = 8  # 1フレームあたりのスクロール量（px）
+    scroll_length = 9600  # スクロールする長さ（px）．スクロールが止まるとボスが出現する
+    invulnerable_ticks = 50  # 被弾後の無敵時間（フレーム数）
+    enemy_interval = 200  # 敵機を出現させる間隔（ウェーブでintervalを省略したときのフレーム数）
+    stage_file = f"{MAIN_DIR}/stage/stage1.json"  # 既定のステージ
+    BOSS_ORDER = sys.maxsize  # ボスの出現は同じフレームの出現・爆弾投下の後にする
+    # シーン（状態）
+    PLAYING = "playing"  # 通常のプレイ中
+    HIT = "hit"  # 被弾後の無敵時間中
+    GAME_OVER = "game_over"  # 残機がなくなった（ゲームの進行は止まる）
+    GAME_CLEAR = "game_clear"  # ボスを倒した（ゲームの進行は止まる）
+    END_SCENES = GAME_OVER, GAME_CLEAR
+
+    def __init__(self, soa: bool = False, seed: int | None = None, stage: str | None = None, pixel: bool = False,
+                 particles: bool = True):
+        """
+        引数1 soa：ビームと爆弾をNumPy配列でまとめて処理するか
+        引数2 seed：乱数の種（Noneならランダムに決める）．同じ種と入力なら同じ結果になる
+        引数3 stage：ステージのJSONファイル（Noneなら既定のステージ）
+        引数4 pixel：矩形で重なったスプライトを画像のマスクでも判定するか（ピクセル単位の当たり判定）
+        引数5 particles：爆発を粒子（ParticleSystem）で描くか（numpyが無ければExplosionスプライト）
+        """
+        MEMORY.start_episode()
+        self.pixel = pixel
+        if pixel:
+            prefill_masks()
+        self.soa = soa
+        self.seed = random.randrange(2**63) if seed is None else seed
+        self.rng = random.Random(self.seed)  # 敵機・爆弾・ドロップの乱数はすべてこれを使う
+        stage = stage or __class__.stage_file
+        self.stage_path = stage
+        self.stage = load_stage(stage)
+        manifest = self.stage.get("background")
+        self.scroll_length = __class__.scroll_length if manifest is None else manifest.get("length", __class__.scroll_length)
+        if manifest is not None:  # タイルを並べたステージの背景
+            self.background = TiledBackground.from_manifest(
+                manifest, os.path.dirname(stage), self.scroll_length, VIEW.size
+            )
+        else:
+            # 背景は描画解像度に縮小したタイルから合成し，スクロール量にも倍率を掛ける
+            self.background = ScrollingBackground([ASSETS.derive(
+                ("bg_layer", VIEW.size),
+                lambda: BackgroundLayer(VIEW.image(ASSETS.get("pg_bg.jpg")), VIEW.scale, VIEW.size[0]),
+            )], self.scroll_length, VIEW.size)
+        self.boss_tick = -(-self.scroll_length // __class__.scroll_speed)  # スクロールが止まるフレーム
+        self.score = Score()
+        # 描画するグループは変化した矩形を返すRenderUpdatesにする
+        self.boss_group = pg.sprite.RenderUpdates()
+        self.bird = Bird(3, (900, 400), self.boss_group)
+        self.bird_group = pg.sprite.RenderUpdates(self.bird)
+        self.engine = ProjectileEngine(pixel) if soa else None  # NumPy版の弾エンジン
+        self.bombs = pg.sprite.RenderUpdates() if self.engine is None else self.engine.bombs
+        self.beams = pg.sprite.RenderUpdates() if self.engine is None else self.engine.beams
+        # 爆発はExplosionスプライトをaddすると，粒子の放出に置き換える
+        self.exps = ParticleSystem(self.seed) if particles and np is not None else pg.sprite.RenderUpdates()
+        self.emys = pg.sprite.RenderUpdates()
+        self.drops = pg.sprite.RenderUpdates()
+        self.static_drawn = False  # 前フレームで静止した背景を画面全体に描いたか
+        self.tmr = 0
+        self.keytype = 0
+        self.boss = None
+        self.scheduler = Scheduler()  # 敵機・爆弾・ボスの出現の予約表
+        self.lifecycle = Lifecycle()  # 画面外に出たスプライトなどを消す
+        self.spawned = 0  # 出現させた敵機の数（爆弾投下の順序に使う）
+        self.start_stage(0)
+        self.scene = __class__.PLAYING
+        self.scene_timer = 0  # HITシーンの残りフレーム数
+        self.done = False  # 終了画面でキーが押されたか
+        self.end_drawn = False  # 終了画面を描画済みか
+        self.hit = False  # このフレームで戦闘機が被弾したか
+        self.invincible = False  # Trueなら被弾しても残機が減らない（ベンチマーク用）
+        self.interpolate = False  # 描画時に1フレーム前の位置との間を補間するか
+        self.moved = False  # 直前のstepでスプライトが移動したか
+
+    @property
+    def over(self) -> bool:
+        """
+        残機がなくなったか
+        """
+        return self.scene == __class__.GAME_OVER
+
+    def set_scene(self, scene: str, timer: int = 0):
+        """
+        シーンを切り替える
+        引数1 scene：新しいシーン
+        引数2 timer：シーンの継続フレーム数（HITシーンで使う）
+        """
+        self.scene = scene
+        self.scene_timer = timer
+        if scene == __class__.GAME_OVER:
+            AUDIO.play("game_over")
+        elif scene == __class__.GAME_CLEAR:
+            AUDIO.play("game_clear")
+
+    def handle_event(self, event: pg.event.Event):
+        """
+        キー入力イベントに応じてビームの種類を切り替え，ビームを発射する
+        引数 event：pg.event.get()で得たイベント
+        """
+        if event.type != pg.KEYDOWN:
+            return
+        if self.scene in __class__.END_SCENES:  # 終了画面ではキーを押したら終わる
+            self.done = True
+            return
+        bird, score, beams = self.bird, self.score, self.beams
+        if event.key == pg.K_0:
+            self.keytype = 0
+        if event.key == pg.K_1:
+            self.keytype = 1
+        if event.key == pg.K_2:
+            self.keytype = 2
+        
+        bird.change_beam_type(event.key,score)
+        if event.key == pg.K_SPACE:
+            AUDIO.play("beam")
+            if self.keytype == 0:
+                beams.add(Beam.spawn(bird, self.boss_group))
+            if self.keytype == 1 and score.value >= Bird.beam1_score:
+                beams.add(Beam1.spawn(bird, self.boss_group))
+            if self.keytype == 2 and score.value >= Bird.beam2_score:
+                beams.add(Beam2.spawn(bird, self.boss_group))
+            beams.add(bird.create_beam()) 
+
+    def step(self, key_lst: list[bool]):
+        """
+        1フレーム分ゲームを進める（敵の出現，当たり判定，移動）
+        引数 key_lst：押下キーの真理値リスト
+        """
+        self.moved = False
+        GRID.reset_counters()  # このフレームの候補ペア数を数え直す（止まっているフレームは0）
+        if self.scene in __class__.END_SCENES:  # 終了画面の裏ではゲームを進めない
+            return
+        if self.interpolate:
+            self.snapshot()
+        if self.tmr % MemoryLedger.interval == 0 and MEMORY.budget is not None:
+            MEMORY.check(self)
+        with PROFILER.section("spawn"):
+            self.spawn()
+        with PROFILER.section("collision"):
+            self.collide()
+        if self.scene == __class__.GAME_OVER:
+            return
+        with PROFILER.section("update"):
+            self.update(key_lst)
+        self.moved = True
+        self.tmr += 1
+        if self.lifecycle.detect and self.tmr % (Lifecycle.window // Lifecycle.samples) == 0:
+            self.lifecycle.sample(self)
+        if self.scene == __class__.HIT:
+            self.scene_timer -= 1
+            if self.scene_timer <= 0:  # 無敵時間が終わったら通常のプレイに戻る
+                self.set_scene(__class__.PLAYING)
+        if self.boss is not None and not self.boss.alive() and self.scene != __class__.GAME_CLEAR:
+            self.set_scene(__class__.GAME_CLEAR)
+
+    def moving_groups(self) -> tuple[pg.sprite.AbstractGroup, ...]:
+        """
+        補間して描画するスプライトグループ（NumPy版の弾と動かない爆発は除く）
+        """
+        groups = self.boss_group, self.bird_group, self.emys, self.drops
+        if self.engine is None:
+            groups += self.beams, self.bombs
+        return groups
+
+    def snapshot(self):
+        """
+        補間描画のために，移動前の位置を各スプライトに記録する
+        """
+        for group in self.moving_groups():
+            for sprite in group:
+                sprite.prev_pos = sprite.rect.topleft
+        if self.engine is not None:
+            self.engine.beams.snapshot()
+            self.engine.bombs.snapshot()
+
+    @contextlib.contextmanager
+    def interpolated(self, alpha: float):
+        """
+        with文の間だけ，スプライトの位置を1フレーム前の位置と今の位置の間に動かしておく
+        引数 alpha：補間係数（1.0なら今の位置のまま）
+        """
+        moved = []
+        if alpha < 1.0:
+            for group in self.moving_groups():
+                for sprite in group:
+                    prev = getattr(sprite, "prev_pos", None)
+                    if prev is None:  # このフレームで出現したスプライト
+                        continue
+                    rect = sprite.rect
+                    cur = rect.topleft
+                    moved.append((rect, cur))
+                    rect.topleft = prev[0] + (cur[0]-prev[0])*alpha, prev[1] + (cur[1]-prev[1])*alpha
+        try:
+            yield
+        finally:
+            for rect, cur in moved:
+                rect.topleft = cur
+
+    def scroll_pos(self, alpha: float = 1.0) -> float:
+        """
+        補間係数alphaでの背景のスクロール位置（px）を返す
+        """
+        return max(self.tmr - 1 + alpha, 0) * __class__.scroll_speed
+
+    def summary(self) -> dict[str, int | str]:
+        """
+        ゲームの結果（再現性の確認に使う最終状態）を返す
+        """
+        return {
+            "ticks": self.tmr, "score": self.score.value, "life": self.score.bird_life,
+            "boss_hp": -1 if self.boss is None else self.boss.hp, "scene": self.scene,
+        }
+
+    def counts(self) -> dict[str, int]:
+        """
+        スプライトグループごとのスプライト数を返す
+        """
+        return {
+            "emys": len(self.emys), "beams": len(self.beams), "bombs": len(self.bombs),
+            "exps": len(self.exps), "drops": len(self.drops),
+        }
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """
+        直前のフレームの処理の統計（格子の候補ペア数と衝突ペア数）と，スプライトのプールの統計を返す
+        """
+        stats = {"grid": GRID.stats()}
+        for name, pool in pool_stats().items():
+            if pool["created"] == 0:  # まだ一度も使っていないプールは表示しない
+                continue
+            stats[f"pool {name}"] = {k: pool[k] for k in ("live", "high_water", "created", "reused")}
+        return stats
+
+    def start_stage(self, tick: int):
+        """
+        ステージのウェーブとボスの出現をtickフレーム目以降について予約し直す
+        引数 tick：予約を始めるフレーム番号（途中から始めるときは，それより前の出現は飛ばす）
+        """
+        self.scheduler.clear()
+        for wave in self.stage["waves"]:
+            start = wave.get("start", 0)
+            interval = wave.get("interval") or __class__.enemy_interval
+            skipped = max(-(-(tick-start) // interval), 0)  # tickより前に出現するはずだった回数
+            count = wave.get("count")
+            if count is None or skipped < count:
+                self.scheduler.schedule(start + skipped*interval, 0, self.spawn_wave, wave, interval,
+                                        None if count is None else count-skipped)
+        boss_tick = self.stage.get("boss", {}).get("tick")
+        if boss_tick is not None:
+            self.boss_tick = boss_tick
+        if self.boss_tick >= tick:
+            self.scheduler.schedule(self.boss_tick, __class__.BOSS_ORDER, self.spawn_boss)
+
+    def spawn_wave(self, tick: int, wave: dict, interval: int, remaining: int | None):
+        """
+        ウェーブの敵機を出現させ，次の出現を予約する
+        引数1 tick：今のフレーム番号
+        引数2 wave：ウェーブの定義
+        引数3 interval：出現の間隔（フレーム数）
+        引数4 remaining：残りの出現回数（Noneなら無限）
+        """
+        for _ in range(wave.get("group", 1)):
+            self.add_enemy(Enemy(self.rng))
+        if remaining is None or remaining > 1:
+            self.scheduler.schedule(tick + interval, 0, self.spawn_wave, wave, interval,
+                                    None if remaining is None else remaining-1)
+
+    def add_enemy(self, emy: Enemy):
+        """
+        敵機を追加し，停止したら爆弾投下を予約するようにする
+        """
+        self.spawned += 1
+        emy.order = self.spawned  # 同じフレームの爆弾投下は出現した順に行う
+        emy.on_stop = self.enemy_stopped
+        self.emys.add(emy)
+        if emy.state == "stop":  # 停止状態で追加された敵機はこのフレームから投下する
+            first = -(-self.tmr // emy.interval) * emy.interval
+            self.scheduler.schedule(first, emy.order, self.drop_bomb, emy)
+
+    def enemy_stopped(self, emy: Enemy):
+        """
+        停止状態になった敵機の最初の爆弾投下を予約する（intervalの倍数のフレームに投下する）
+        """
+        first = (self.tmr // emy.interval + 1) * emy.interval
+        self.scheduler.schedule(first, emy.order, self.drop_bomb, emy)
+
+    def drop_bomb(self, tick: int, emy: Enemy):
+        """
+        敵機に爆弾を投下させ，次の投下を予約する（倒された敵機の予約はここで捨てる）
+        """
+        if not emy.alive():
+            return
+        self.bombs.add(Bomb.spawn(emy, self.bird, self.rng))
+        self.scheduler.schedule(tick + emy.interval, emy.order, self.drop_bomb, emy)
+
+    def spawn_boss(self, tick: int):
+        """
+        ボスを出現させる（既定ではスクロールが止まったフレーム）
+        """
+        self.boss = Boss(self.exps, self.rng)
+        self.boss_group.add(self.boss)
+
+    def spawn(self):
+        """
+        予約表から今のフレームの敵機の出現，爆弾投下，ボスの出現を実行する
+        """
+        self.scheduler.run(self.tmr)
+
+    def collide(self):
+        """
+        ビーム，爆弾，敵機，戦闘機，ドロップの当たり判定を行い，スコアと残機を更新する
+        """
+        engine, score, bird = self.engine, self.score, self.bird
+        beams, bombs, drops, emys, exps = self.beams, self.bombs, self.drops, self.emys, self.exps
+        GRID.clear()
+        GRID.collided = collide_mask if self.pixel else None
+        if engine is None:
+            GRID.rebuild(beams, bombs)  # 衝突判定の前に位置を格子に登録する
+            killed_emys = GRID.groupcollide(emys, beams, True, True).keys()
+        else:
+            killed_emys = engine.collide_group(emys)
+        for emy in killed_emys:
+            AUDIO.play("explosion")
+            exps.add(Explosion.spawn(emy, 100))  # 爆発エフェクト
+            score.value += 10  # 10点アップ
+            bird.change_img(6)
+            if self.rng.randint(0,100)<50:
+                drops.add(Drop.spawn(emy))
+       
+        if engine is None:
+            destroyed = GRID.groupcollide(bombs, beams, True, True).keys()
+        else:
+            destroyed = engine.collide_beams_bombs()
+        for bomb in destroyed:
+            AUDIO.play("bomb_hit")
+            exps.add(Explosion.spawn(bomb, 50))  # 爆発エフェクト
+            score.value += 1  # 1点アップ
+            
+        self.hit = False
+        if self.scene == __class__.PLAYING:  # 無敵時間中とクリアー後は被弾しない
+            if engine is None:
+                self.hit = len(GRID.spritecollide(bird, bombs, True)) != 0
+            else:
+                self.hit = engine.collide_rect(bird.rect, bird.image) != 0
+        if self.hit and not self.invincible:
+            AUDIO.play("damage")
+            score.decrease_life()
+            bird.change_img(8) 
+            if score.bird_life == 0:
+                self.set_scene(__class__.GAME_OVER)
+                return
+            self.set_scene(__class__.HIT, __class__.invulnerable_ticks)  # 一時停止の代わりに無敵時間にする
+            
+        if drops:
+            GRID.rebuild(drops)  # このフレームで出現したドロップも拾えるように，出現の後に登録する
+            for drop in GRID.spritecollide(bird, drops, True):
+                AUDIO.play("drop")
+                score.value += 10
+
+    def update(self, key_lst: list[bool]):
+        """
+        全てのスプライトを移動させる
+        引数 key_lst：押下キーの真理値リスト
+        """
+        self.boss_group.update(self.bird, self.bombs, self.score.value)
+        if self.engine is None:  # NumPy版の弾はcollide_bossで判定するので格子は使わない
+            GRID.rebuild(self.boss_group)  # ビームとボスの判定用に移動後の位置を登録
+        self.bird.update(key_lst)
+        boss_hp = None if self.boss is None else self.boss.hp
+        self.beams.update()
+        if self.engine is not None:
+            self.engine.collide_boss(self.boss_group)
+        if boss_hp is not None and self.boss.hp < boss_hp:  # ビームがボスに当たった
+            AUDIO.play("boss_hit")
+        self.emys.update()
+        self.bombs.update()
+        self.exps.update()
+        self.drops.update()
+        self.lifecycle.cull((self.boss_group, self.emys, self.beams, self.bombs, self.exps, self.drops), self.tmr)
+
+    def draw(self, screen: pg.Surface, dirty: bool = False, alpha: float = 1.0) -> list[pg.Rect] | None:
+        """
+        背景と全てのスプライト，スコアを画面に描画する
+        引数1 screen：画面Surface
+        引数2 dirty：背景が静止している間は変化した部分だけを描き直すか
+        引数3 alpha：1フレーム前の状態と今の状態の補間係数（1.0なら今の状態をそのまま描く）
+        戻り値：画面更新が必要な矩形のリスト（Noneなら画面全体）
+        """
+        if not (self.interpolate and self.moved):  # 止まっているときに補間すると前の位置に戻ってしまう
+            alpha = 1.0
+        if self.scene in __class__.END_SCENES:
+            if dirty and self.end_drawn:  # ゲームの進行が止まっているので描き直さない
+                return []
+            self.end_drawn = True
+            self.static_drawn = False
+            self.draw_scene(screen, alpha=alpha)
+            if self.scene == __class__.GAME_OVER:
+                self.score.draw_game_over(screen)
+            else:
+                self.boss.draw_game_clear(screen, self.score.value)
+            return None
+        return self.draw_scene(screen, dirty, alpha)
+
+    def draw_sprites(self, screen: pg.Surface, groups: tuple, alpha: float) -> list[pg.Rect]:
+        """
+        スプライトグループを順に描画する（NumPy版の弾には補間係数を渡す）
+        戻り値：各グループのdrawが返した矩形をまとめたリスト
+        """
+        rects = []
+        with self.interpolated(alpha), VIEW.sprites(groups):
+            for group in groups:
+                if isinstance(group, ProjectileArray):
+                    rects += group.draw(screen, alpha)
+                else:
+                    rects += group.draw(screen)
+        return rects
+
+    def draw_scene(self, screen: pg.Surface, dirty: bool = False, alpha: float = 1.0) -> list[pg.Rect] | None:
+        """
+        プレイ中の画面（背景，スプライト，スコア）を描画する
+        引数1 screen：画面Surface
+        引数2 dirty：背景が静止している間は変化した部分だけを描き直すか
+        引数3 alpha：1フレーム前の状態と今の状態の補間係数
+        戻り値：画面更新が必要な矩形のリスト（Noneなら画面全体）
+        """
+        pos = self.scroll_pos(alpha)
+        static = self.background.stopped(pos)  # ボスが出現したらスクロールはストップ
+        if dirty and static and self.static_drawn:
+            return self.draw_dirty(screen, alpha)
+        with PROFILER.section("background"):
+            self.background.draw(screen, pos)
+        with PROFILER.section("sprites"):
+            self.draw_sprites(screen, (self.boss_group, self.bird_group, self.beams, self.emys, self.bombs, self.exps), alpha)
+        with PROFILER.section("hud"):
+            self.score.update(screen)
+        with PROFILER.section("sprites"):
+            self.draw_sprites(screen, (self.drops,), alpha)
+        self.static_drawn = dirty and static
+        return None
+
+    def draw_dirty(self, screen: pg.Surface, alpha: float = 1.0) -> list[pg.Rect]:
+        """
+        前フレームの描画位置を背景で消してからスプライトを描き，変化した矩形だけを返す
+        背景が静止していて，前フレームの画面が残っている場合にだけ使う
+        引数1 screen：画面Surface
+        引数2 alpha：1フレーム前の状態と今の状態の補間係数
+        戻り値：画面更新が必要な矩形のリスト
+        """
+        bg = self.background.frame(self.scroll_pos())
+        groups = self.boss_group, self.bird_group, self.beams, self.emys, self.bombs, self.exps
+        hud = VIEW.rect(self.score.area())
+        with PROFILER.section("background"):
+            for group in groups + (self.drops,):
+                group.clear(screen, bg)
+            screen.blit(bg, hud, hud)
+        rects = [hud]
+        with PROFILER.section("sprites"):
+            rects += self.draw_sprites(screen, groups, alpha)
+        with PROFILER.section("hud"):
+            self.score.update(screen)
+            rects.append(VIEW.rect(self.score.area()))
+        with PROFILER.section("sprites"):
+            rects += self.draw_sprites(screen, (self.drops,), alpha)
+        return rects
+
+
+class InputRecorder:
+    """
+    乱数の種とフレームごとの入力（押下中の移動キーとKEYDOWNのキー）を記録し，バイナリファイルに保存するクラス
+    ファイルは ヘッダ（種，最終状態） + ステージ（パスとハッシュ値） + zlib圧縮したフレームごとの入力 からなる
+    """
+    magic = b"SGIR"
+    version = 2  # 1はステージを記録していない（再生時に指定したステージを使う）
+    header = struct.Struct("<4sHQBHIiiiB")  # magic, version, seed, flags, tick_rate, ticks, score, life, boss_hp, scene
+    stage_header = struct.Struct("<32sH")  # ステージのハッシュ値, パスのバイト数（この後にUTF-8のパスが続く）
+    SOA, PIXEL = 1, 2  # flagsのビット（結果が変わる設定）
+    keys = tuple(Bird.delta)  # 押下状態を記録するキー（戦闘機の移動キー）
+    scenes = Game.PLAYING, Game.HIT, Game.GAME_OVER, Game.GAME_CLEAR
+
+    def __init__(self, game: Game, tick_rate: int = 50):
+        """
+        引数1 game：記録するゲーム（乱数の種，soa，ステージを保存する）
+        引数2 tick_rate：1秒あたりのシミュレーションのフレーム数（再生速度の目安として保存する）
+        """
+        self.game = game
+        self.tick_rate = tick_rate
+        self.data = bytearray()
+
+    def record(self, key_lst: list[bool], events: list[pg.event.Event]):
+        """
+        1フレーム分の入力を記録する（移動キーのビットマスク，KEYDOWNの数，キー番号）
+        引数1 key_lst：押下キーの真理値リスト
+        引数2 events：このフレームで処理するイベント
+        """
+        mask = 0
+        for i, k in enumerate(__class__.keys):
+            if key_lst[k]:
+                mask |= 1 << i
+        downs = [event.key for event in events if event.type == pg.KEYDOWN]
+        self.data += struct.pack(f"<BB{len(downs)}I", mask, len(downs), *downs)
+
+    def save(self, path: str):
+        """
+        記録した入力とゲームの最終状態をファイルに書き出す
+        """
+        state = self.game.summary()
+        with open(path, "wb") as f:
+            f.write(__class__.header.pack(
+                __class__.magic, __class__.version, self.game.seed,
+                __class__.SOA*self.game.soa | __class__.PIXEL*self.game.pixel, self.tick_rate, state["ticks"],
+                state["score"], state["life"], state["boss_hp"], __class__.scenes.index(state["scene"]),
+            ))
+            # ゲームのディレクトリの中のステージは相対パスにして，別の場所に置いたゲームでも再生できるようにする
+            path = os.path.abspath(self.game.stage_path)
+            if os.path.commonpath([path, MAIN_DIR]) == MAIN_DIR:
+                path = os.path.relpath(path, MAIN_DIR)
+            name = path.encode("utf-8")
+            f.write(__class__.stage_header.pack(stage_digest(self.game.stage), len(name)) + name)
+            f.write(zlib.compress(bytes(self.data), 9))
+
+
+class InputReplay:
+    """
+    InputRecorderで保存したファイルを読み込み，フレームごとの入力を順に返すクラス
+    """
+    def __init__(self, path: str):
+        """
+        引数 path：InputRecorderで保存したファイル
+        """
+        with open(path, "rb") as f:
+            blob = f.read()
+        header = InputRecorder.header
+        magic, version, self.seed, flags, self.tick_rate, ticks, score, life, boss_hp, scene = header.unpack_from(blob)
+        self.soa = bool(flags & InputRecorder.SOA)
+        self.pixel = bool(flags & InputRecorder.PIXEL)
+        if magic != InputRecorder.magic or version not in (1, InputRecorder.version):
+            raise ValueError(f"{path} は対応していない入力記録ファイルです")
+        self.expected = {
+            "ticks": ticks, "score": score, "life": life, "boss_hp": boss_hp, "scene": InputRecorder.scenes[scene],
+        }
+        pos = header.size
+        self.stage = self.stage_digest = None  # 記録時のステージのパスとハッシュ値（バージョン1ではNone）
+        if version >= 2:
+            self.stage_digest, size = InputRecorder.stage_header.unpack_from(blob, pos)
+            pos += InputRecorder.stage_header.size
+            self.stage = os.path.join(MAIN_DIR, blob[pos:pos+size].decode("utf-8"))  # 絶対パスならそのまま
+            pos += size
+        self.data = zlib.decompress(blob[pos:])
+        self.pos = 0
+        self.frames = 0  # 返したフレーム数
+
+    def next(self) -> tuple[dict, list[pg.event.Event]] | None:
+        """
+        次のフレームの入力を返す
+        戻り値：押下キーの真理値辞書とKEYDOWNイベントのリスト（記録の終わりならNone）
+        """
+        if self.pos >= len(self.data):
+            return None
+        mask, n = struct.unpack_from("<BB", self.data, self.pos)
+        downs = struct.unpack_from(f"<{n}I", self.data, self.pos+2)
+        self.pos += 2 + 4*n
+        self.frames += 1
+        key_lst = collections.defaultdict(bool)
+        for i, k in enumerate(InputRecorder.keys):
+            key_lst[k] = bool(mask >> i & 1)
+        return key_lst, [pg.event.Event(pg.KEYDOWN, key=key) for key in downs]
+
+    def new_game(self, stage: str | None = None, particles: bool = True) -> Game:
+        """
+        記録時と同じ乱数の種と設定，ステージのGameを作る
+        引数1 stage：ステージのJSONファイル（Noneなら記録時のステージ．記録時と内容が違えばValueError）
+        引数2 particles：爆発を粒子で描くか（見た目だけなので結果には影響しない）
+        """
+        if self.stage_digest is not None:
+            stage = stage or self.stage
+            if not os.path.exists(stage):
+                raise ValueError(f"記録時のステージ {stage} が見つかりません（--stageで指定してください）")
+            if stage_digest(load_stage(stage)) != self.stage_digest:
+                raise ValueError(f"ステージ {stage} の内容が記録時と違います")
+        return Game(self.soa, self.seed, stage, self.pixel, particles)
+
+    def verify(self, game: Game) -> bool:
+        """
+        再生後のゲームの最終状態が記録時と一致するかを調べ，結果を表示する
+        """
+        actual = game.summary()
+        diff = {k: (v, actual[k]) for k, v in self.expected.items() if actual[k] != v}
+        if diff:
+            print("replay MISMATCH: " + ", ".join(f"{k} expected {a} got {b}" for k, (a, b) in diff.items()))
+        else:
+            print(f"replay OK: {self.frames} frames, " + ", ".join(f"{k}={v}" for k, v in actual.items()))
+        return not diff
+
+
+def prefill_masks():
+    """
+    当たり判定をするスプライト（戦闘機，ビーム，爆弾，敵機）の全画像のマスクを生成しておく
+    """
+    MASKS.prefill(ROTATIONS.images.values())
+    MASKS.prefill(img for key, img in ASSETS.derived.items() if isinstance(key, tuple) and key[0] == "bomb")
+    MASKS.prefill(ASSETS.get(name) for name in Enemy.imgs)
+    MEMORY.pin()
+
+
+def load_assets():
+    """
+    画面生成後に画像を読み込み，回転画像と爆弾円の画像を生成しておく
+    """
+    ASSETS.preload()  # 画面生成後に全画像を一度だけ読み込む
+    build_images()
+
+
+def build_images():
+    """
+    読み込んだ画像から回転画像と爆弾円の画像を生成しておく
+    """
+    ROTATIONS.prefill()  # ビームと戦闘機の8方向の画像を生成しておく
+    Bomb.prebuild()  # 爆弾円の画像を全種類生成しておく
+    # 描画解像度を下げているときは，スプライトの画像も縮小しておく
+    VIEW.prefill(ROTATIONS.images.values())
+    VIEW.prefill(ASSETS.surfaces.values())
+    VIEW.prefill(_surfaces_in(ASSETS.derived))
+    MEMORY.pin()  # 起動時に作った画像はメモリの上限を超えても捨てない
+
+
+def draw_loading(screen: pg.Surface, progress: float):
+    """
+    読み込み画面（文字と進み具合のバー）を描画する
+    引数1 screen：画面Surface
+    引数2 progress：読み込みの進み具合（0〜1）
+    """
+    screen.fill((0, 0, 0))
+    text = TEXTS.render("Loading...", round(80*VIEW.scale), (255, 255, 255), True)
+    screen.blit(text, text.get_rect(center=VIEW.point(WIDTH // 2, HEIGHT // 2 - 50)))
+    bar = VIEW.rect(pg.Rect(0, 0, WIDTH // 2, 20))
+    bar.center = VIEW.point(WIDTH // 2, HEIGHT // 2 + 30)
+    pg.draw.rect(screen, (255, 255, 255), bar, 2)
+    pg.draw.rect(screen, (255, 255, 255), (bar.x, bar.y, int(bar.width * progress), bar.height))
+
+
+def load_with_screen(screen: pg.Surface, clock: pg.time.Clock, sound: bool = False) -> dict[str, float] | None:
+    """
+    画像のデコードを別スレッドで行う間，読み込み画面を表示し続ける
+    変換と回転画像などの生成はデコードの終了後にこのスレッド（画面のスレッド）で行う
+    引数1 screen：画面Surface
+    引数2 clock：読み込み画面の描画間隔を調整するClock
+    引数3 sound：効果音も作るか（AUDIO.preload）
+    戻り値：起動の各段階が終わるまでの時間（ミリ秒）の辞書（読み込み中に閉じられたらNone）
+    """
+    start = time.perf_counter()
+    times = {}
+    ASSETS.start_preload()
+    while True:
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                return None
+        loading = ASSETS.loading
+        draw_loading(screen, ASSETS.progress())
+        pg.display.update()
+        if "first_frame" not in times:
+            times["first_frame"] = (time.perf_counter()-start) * 1000
+        if not loading:
+            break
+        clock.tick(60)
+    times["decoded"] = (time.perf_counter()-start) * 1000
+    ASSETS.finish_preload()
+    times["converted"] = (time.perf_counter()-start) * 1000
+    build_images()
+    times["images"] = (time.perf_counter()-start) * 1000
+    if sound:
+        AUDIO.preload()
+    times["ready"] = (time.perf_counter()-start) * 1000
+    return times
+
+
+def main(soa: bool = False, headless: bool = False, render: bool = True, ticks: int | None = None,
+         profile: bool = False, trace: str | None = None, dirty: bool = False,
+         tick_rate: int = 50, fps: int = 60, max_steps: int = 10, interpolate: bool = True,
+         seed: int | None = None, record: str | None = None, replay: str | None = None, stage: str | None = None,
+         pixel: bool = False, startup_report: bool = False, particles: bool = True,
+         memory_budget: float | None = None, memory_report: bool = False, trace_memory: bool = False,
+         resolution: str = "high", sound: bool = True, leak_check: bool = False):
+    """
+    ゲームのメインループ
+    引数1 soa：ビームと爆弾をNumPy配列でまとめて処理するか
+    引数2 headless：ウィンドウを使わず（SDLのdummyドライバ），待ち時間なしで実行するか
+    引数3 render：毎フレーム描画するか
+    引数4 ticks：このフレーム数だけ進めたら終了する（Noneなら終了しない）
+    引数5 profile：最初からプロファイラのオーバーレイを表示するか（F3キーで切り替え）
+    引数6 trace：段階ごとの処理時間をChromeのtrace形式で書き出すファイル名
+    引数7 dirty：背景が静止している間は変化した矩形だけを描き直して画面更新するか
+    引数8 tick_rate：1秒あたりのシミュレーションのフレーム数
+    引数9 fps：1秒あたりの描画回数の上限（0なら無制限）
+    引数10 max_steps：1回の描画の間に進めるシミュレーションの最大フレーム数
+    引数11 interpolate：描画時にスプライトの位置を補間するか
+    引数12 seed：乱数の種（Noneならランダム）
+    引数13 record：乱数の種とフレームごとの入力を記録するファイル名
+    引数14 replay：記録ファイルの入力で再生し，最終状態が一致するかを調べる（一致しなければ1を返す）
+    引数15 stage：ステージのJSONファイル（Noneなら既定のステージ，再生時は記録時のステージ）
+    引数16 pixel：画像のマスクを使ってピクセル単位で当たり判定するか
+    引数17 startup_report：起動の各段階までの時間と画像ごとのデコード時間を表示するか
+    引数18 particles：爆発を粒子で描くか（Falseなら従来のExplosionスプライト）
+    引数19 memory_budget：Surfaceのメモリの上限（MB，超えたらキャッシュを捨て，それでも超えれば警告する）
+    引数20 memory_report：終了時にSurfaceのメモリを持ち主ごとに表示するか（F4キーでいつでも表示）
+    引数21 trace_memory：tracemallocでPythonのメモリ確保を追跡するか（F4キーで多い行も表示）
+    引数22 resolution：描画解像度の名前（RenderView.PRESETSのキー）．ゲームの処理は解像度によらず同じ
+    引数23 sound：効果音を鳴らすか（pg.initの前にAUDIO.pre_initを呼んでおくと遅延が少ない）
+    引数24 leak_check：スプライトの種類ごとの生存数を記録し，増え続けているものをログに出すか
+    """
+    launch = time.perf_counter()
+    pg.display.set_caption("シューティング")
+    VIEW.configure(resolution)
+    # 低い解像度で描いた画面はSDLがウィンドウの大きさに拡大して表示する
+    screen = pg.display.set_mode(VIEW.size, pg.SCALED if VIEW.scaled and not headless else 0)
+    clock = pg.time.Clock()
+    setup_ms = (time.perf_counter()-launch) * 1000
+    times = load_with_screen(screen, clock, sound)  # 画像のデコード中は読み込み画面を表示する
+    if times is None:
+        return 0
+    if startup_report:
+        print(f"startup: window {setup_ms:.1f} ms, first frame {setup_ms + times['first_frame']:.1f} ms, "
+              f"decoded {setup_ms + times['decoded']:.1f} ms, converted {setup_ms + times['converted']:.1f} ms, "
+              f"images {setup_ms + times['images']:.1f} ms, ready {setup_ms + times['ready']:.1f} ms")
+        print(ASSETS.report())  # 読み込んだ画像と加工済み画像の数，キャッシュのヒット数とミス数
+        print("\n".join(ASSETS.timing_report()))
+    try:
+        player = InputReplay(replay) if replay else None
+        game = Game(soa, seed, stage, pixel, particles) if player is None else player.new_game(stage, particles)
+    except ValueError as e:  # 再生できない記録ファイル
+        print(f"replay error: {e}")
+        return 1
+    game.interpolate = interpolate and not headless
+    game.lifecycle.detect = leak_check
+    recorder = InputRecorder(game, tick_rate) if record else None
+    # 起動時に作った画像やキャッシュをGCの対象から外し，ゲーム中の世代別GCで画面が止まらないようにする
+    gc.collect()
+    gc.freeze()
+    PROFILER.configure(overlay=profile, tracing=trace is not None)
+    MEMORY.configure(memory_budget, trace_memory)
+    stepper = FixedTimestep(tick_rate, max_steps)
+    pending = []  # まだシミュレーションに渡していないキーイベント
+    start = time.perf_counter()
+    clock.tick()  # 画像の読み込み時間を経過時間に含めない
+    try:
+        while ticks is None or game.tmr < ticks:
+            PROFILER.begin_frame()
+            with PROFILER.section("events"):
+                for event in pg.event.get():
+                    if event.type == pg.QUIT:
+                        return 0
+                    if event.type == pg.KEYDOWN and event.key == pg.K_F3:  # プロファイラ表示の切り替え
+                        PROFILER.configure(overlay=not PROFILER.overlay)
+                    if event.type == pg.KEYDOWN and event.key == pg.K_F4:  # メモリの内訳の表示
+                        MEMORY.measure(game)
+                        LOG.info("\n".join(MEMORY.report() + (MEMORY.snapshot() if tracemalloc.is_tracing() else [])))
+                    if player is None:
+                        pending.append(event)
+            # headlessは待ち時間なしで1フレームずつ進め，それ以外は経過時間の分だけ進める
+            steps = 1 if headless else stepper.advance(clock.tick(fps) / 1000)
+            finished = False
+            for _ in range(steps):
+                if player is None:
+                    key_lst = pg.key.get_pressed()
+                    events, pending = pending, []  # キーイベントは次のシミュレーションのフレームの最初に処理する
+                else:
+                    frame = player.next()
+                    if frame is None:  # 記録の終わり
+                        finished = True
+                        break
+                    key_lst, events = frame
+                if recorder is not None:
+                    recorder.record(key_lst, events)
+                for event in events:
+                    game.handle_event(event)
+                if game.done:  # 終了画面でキーが押された
+                    finished = True
+                    break
+                scene = game.scene
+                game.step(key_lst)
+                if player is None and game.scene != scene and game.scene in Game.END_SCENES:
+                    # 終了画面になる前に押したキー（撃ち続けていたSPACEなど）では閉じないように，1回だけ捨てる
+                    pg.event.clear(pg.KEYDOWN)
+                    pending.clear()
+                if ticks is not None and game.tmr >= ticks:
+                    break
+            if finished:
+                break
+            with PROFILER.section("audio"):
+                AUDIO.flush()  # このフレームに進めた分の効果音をまとめて鳴らす
+            rects = None
+            if render:
+                # オーバーレイ表示中は画面全体を描き直す
+                rects = game.draw(screen, dirty and not PROFILER.overlay, 1.0 if headless else stepper.alpha)
+                PROFILER.draw_overlay(screen, clock.get_fps(), game.counts(), game.stats())
+            if headless and player is None and game.scene in Game.END_SCENES:  # キー入力が無いのでここで終わる
+                break
+            if not headless:
+                with PROFILER.section("flip"):
+                    if rects is None:
+                        pg.display.update()
+                    else:
+                        pg.display.update(rects)
+            PROFILER.end_frame()
+        if player is not None:
+            return 0 if player.verify(game) else 1
+    finally:
+        if recorder is not None:
+            recorder.save(record)
+        if trace:
+            PROFILER.dump_trace(trace)
+        if memory_report:
+            MEMORY.measure(game)
+            print("\n".join(MEMORY.report()))
+            if tracemalloc.is_tracing():
+                print("\n".join(MEMORY.snapshot()))
+        if leak_check:
+            print("culled: " + (", ".join(f"{k} {v}" for k, v in sorted(game.lifecycle.culled.items())) or "none"))
+        if headless:
+            elapsed = time.perf_counter() - start
+            print(f"{game.tmr} ticks in {elapsed:.2f} s: {game.tmr / max(elapsed, 1e-9):.0f} ticks/s "
+                  f"(score={game.score.value}, life={game.score.bird_life}, {game.scene})")
+            if AUDIO.sounds:
+                print("audio: " + ", ".join(f"{k} {v}" for k, v in sorted(AUDIO.stats.items())))
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="シューティングゲーム")
+    parser.add_argument("--soa", action="store_true", help="ビームと爆弾をNumPy配列でまとめて処理する")
+    parser.add_argument("--headless", action="store_true", help="ウィンドウなし・待ち時間なしで実行し，ticks/sを表示する")
+    parser.add_argument("--no-render", action="store_true", help="描画を省略する（--headlessと併用）")
+    parser.add_argument("--ticks", type=int, default=None, help="指定フレーム数で終了する（--headlessの既定値は3000）")
+    parser.add_argument("--profile", action="store_true", help="プロファイラのオーバーレイを表示する（F3キーで切り替え）")
+    parser.add_argument("--trace", metavar="PATH", help="段階ごとの処理時間をChromeのtrace形式のJSONで書き出す")
+    parser.add_argument("--dirty", action="store_true", help="背景が静止している間は変化した矩形だけを画面更新する")
+    parser.add_argument("--tick-rate", type=int, default=50, help="1秒あたりのシミュレーションのフレーム数")
+    parser.add_argument("--fps", type=int, default=60, help="1秒あたりの描画回数の上限（0なら無制限）")
+    parser.add_argument("--max-steps", type=int, default=10, help="描画が遅れたときに1回の描画の間に進める最大フレーム数")
+    parser.add_argument("--no-interpolate", action="store_true", help="スプライトの位置を補間せずに描画する")
+    parser.add_argument("--seed", type=int, default=None, help="乱数の種")
+    parser.add_argument("--pixel-collision", action="store_true", help="矩形で重なったものを画像のマスクでも判定する（ピクセル単位の当たり判定）")
+    parser.add_argument("--no-particles", action="store_true", help="爆発を粒子ではなく従来の爆発画像のスプライトで描く")
+    parser.add_argument("--startup-report", action="store_true", help="最初の画面表示までの時間と画像ごとのデコード時間を表示する")
+    parser.add_argument("--resolution", choices=list(RenderView.PRESETS), default="high",
+                        help="描画解像度（" + "，".join(f"{k}：{w}x{h}" for k, (w, h) in RenderView.PRESETS.items()) + "）．ゲームの処理は同じ")
+    parser.add_argument("--mute", action="store_true", help="効果音を鳴らさない")
+    parser.add_argument("--memory-budget", type=float, metavar="MB", help="Surfaceのメモリの上限（超えたら使っていないキャッシュを捨て，それでも超えれば1回警告する．ゲームの進行は変えない）")
+    parser.add_argument("--memory-report", action="store_true", help="終了時にSurfaceのメモリを持ち主ごとに表示する（F4キーでいつでも表示）")
+    parser.add_argument("--tracemalloc", action="store_true", help="tracemallocでPythonのメモリ確保を追跡し，メモリの表示に多い行を加える")
+    parser.add_argument("--leak-check", action="store_true", help="スプライトの種類ごとの生存数が増え続けていたら警告し，終了時に消した数を表示する")
+    parser.add_argument("--stage", metavar="PATH", help="ステージ（敵機のウェーブとボスの出現）のJSONファイル")
+    parser.add_argument("--record", metavar="PATH", help="乱数の種とフレームごとの入力をファイルに記録する")
+    parser.add_argument("--replay", metavar="PATH", help="記録した入力で再生し，最終状態（スコア，残機，ボスのHP）が一致するか調べる")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"  # pg.initより前に設定する
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+        if args.ticks is None and args.replay is None:  # 再生は記録の終わりまで進める
+            args.ticks = 3000
+    AUDIO.pre_init()
     pg.init()
-    main()
+    code = main(soa=args.soa, headless=args.headless, render=not args.no_render, ticks=args.ticks,
+                profile=args.profile, trace=args.trace, dirty=args.dirty,
+                tick_rate=args.tick_rate, fps=args.fps, max_steps=args.max_steps, interpolate=not args.no_interpolate,
+                seed=args.seed, record=args.record, replay=args.replay, stage=args.stage,
+                pixel=args.pixel_collision, startup_report=args.startup_report,
+                particles=not args.no_particles, memory_budget=args.memory_budget,
+                memory_report=args.memory_report, trace_memory=args.tracemalloc, resolution=args.resolution,
+                sound=not args.mute, leak_check=args.leak_check)
     pg.quit()
-    sys.exit()
+    sys.exit(code)
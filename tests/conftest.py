@@ -0,0 +1,23 @@
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # pg.initより前に設定する
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+import pytest
+
+import shootinggame as sg
+
+
+@pytest.fixture(scope="session")
+def assets():
+    """
+    ウィンドウなしでpygameを初期化し，画像を読み込む（convertに画面が必要なだけなので最小の大きさにする）
+    """
+    pg.init()
+    pg.display.set_mode((1, 1))
+    sg.load_assets()
+    yield
+    pg.quit()
@@ -0,0 +1,44 @@
+import numpy as np
+import pygame as pg
+
+import shootinggame as sg
+import shooting_env
+
+
+def test_env_keeps_global_view(assets):
+    preset = sg.VIEW.preset
+    env = shooting_env.ShootingEnv(observation="frame", frame_size=(80, 45), resolution="low")
+    obs, _ = env.reset(seed=1)
+    assert sg.VIEW.preset == preset  # ゲームの描画解像度は変えない
+    assert env.view.size == sg.RenderView.PRESETS["low"]
+    assert env.canvas.get_size() == env.view.size
+    assert obs.shape == (45, 80, 3) and obs.dtype == np.uint8
+    obs, *_ = env.step(0)
+    assert sg.VIEW.preset == preset
+
+
+def test_envs_with_different_resolutions(assets):
+    low = shooting_env.ShootingEnv(observation="frame", resolution="lowest")
+    high = shooting_env.ShootingEnv(observation="frame", resolution="high")
+    low.reset(seed=2)
+    high.reset(seed=2)
+    assert low.canvas.get_size() == (800, 450)
+    assert high.canvas.get_size() == (1600, 900)
+
+
+def test_init_loads_assets_when_display_exists(assets, monkeypatch):
+    monkeypatch.setattr(sg.ASSETS, "surfaces", {})
+    calls = []
+    monkeypatch.setattr(sg, "load_assets", lambda: calls.append(pg.display.get_surface()))
+    shooting_env.init()
+    assert calls == [pg.display.get_surface()]  # 画面があっても画像は読み込む
+
+
+def test_vector_env_step(assets):
+    envs = shooting_env.VectorShootingEnv(3, max_steps=5)
+    obs, infos = envs.reset(seed=0)
+    assert obs.shape == (3, shooting_env.ShootingEnv.observation_size)
+    for _ in range(5):
+        obs, rewards, terminated, truncated, infos = envs.step([1, 9, 17])
+    assert truncated.all()
+    assert all("final_observation" in info for info in infos)
@@ -0,0 +1,108 @@
+import random
+
+import pygame as pg
+import pytest
+
+import shootinggame as sg
+
+
+class Dummy(pg.sprite.Sprite):
+    """
+    消滅条件を調べるための最小のスプライト
+    """
+    def __init__(self, rect: pg.Rect, despawn: sg.Despawn | None = None, parent: pg.sprite.Sprite | None = None):
+        super().__init__()
+        self.rect = rect
+        self.despawn = despawn
+        self.parent = parent
+
+
+def at(x: int, y: int) -> Dummy:
+    return Dummy(pg.Rect(x, y, 10, 10))
+
+
+@pytest.mark.parametrize("margin, x, y, expected", [
+    (0, 0, 0, False),  # 画面の左上にぴったり
+    (0, -1, 0, True),  # 1 pxでもはみ出したら消す
+    (0, sg.WIDTH - 10, sg.HEIGHT - 10, False),
+    (0, sg.WIDTH - 9, 0, True),
+    (50, -50, -50, False),  # 広げた範囲の中
+    (50, -51, 0, True),
+    (50, sg.WIDTH + 40, 0, False),
+    (50, 0, sg.HEIGHT + 41, True),
+    (None, -1000, -1000, False),  # 画面外の判定をしない
+])
+def test_despawn_margin(margin, x, y, expected):
+    assert sg.Despawn(margin=margin).expired(at(x, y), 0) is expected
+
+
+def test_despawn_max_age():
+    despawn = sg.Despawn(max_age=10)
+    sprite = at(0, 0)
+    assert not despawn.expired(sprite, 100)
+    assert sprite.born == 100  # 初めて調べたフレームが出現フレームになる
+    assert not despawn.expired(sprite, 110)
+    assert despawn.expired(sprite, 111)
+
+
+def test_despawn_without_max_age():
+    sprite = at(0, 0)
+    assert not sg.Despawn().expired(sprite, 10**6)
+    assert not hasattr(sprite, "born")
+
+
+def test_despawn_parent():
+    despawn = sg.Despawn(parent=True)
+    group = pg.sprite.Group()
+    parent = at(0, 0)
+    group.add(parent)
+    child = Dummy(pg.Rect(0, 0, 10, 10), parent=parent)
+    assert not despawn.expired(child, 0)
+    parent.kill()
+    assert despawn.expired(child, 0)
+    assert not despawn.expired(Dummy(pg.Rect(0, 0, 10, 10), parent=None), 0)  # 親の無いスプライト
+    assert not sg.Despawn().expired(child, 0)  # parent=Falseなら親を見ない
+
+
+def test_cull():
+    despawn = sg.Despawn(margin=0)
+    inside = Dummy(pg.Rect(0, 0, 10, 10), despawn)
+    outside = Dummy(pg.Rect(-20, 0, 10, 10), despawn)
+    free = Dummy(pg.Rect(-20, 0, 10, 10))  # 消滅条件の無いスプライト
+    group = pg.sprite.Group(inside, outside, free)
+    lifecycle = sg.Lifecycle()
+    lifecycle.cull([group, pg.sprite.Group()], 0)
+    assert set(group) == {inside, free}
+    assert lifecycle.culled == {"Dummy": 1}
+
+
+def history(lifecycle: sg.Lifecycle, name: str, counts: list[int]):
+    for n in counts:
+        lifecycle.history[name].append(n)
+
+
+def test_leaks():
+    n = sg.Lifecycle.samples
+    rise = sg.Lifecycle.min_rise
+    lifecycle = sg.Lifecycle(detect=True)
+    history(lifecycle, "rising", list(range(n - 1)) + [rise])
+    history(lifecycle, "flat", [5] * n)
+    history(lifecycle, "dip", [0] * (n - 2) + [rise + 1, rise])  # 一度でも減れば消し忘れではない
+    history(lifecycle, "small", [1] * (n - 1) + [rise])  # 増え方が小さい
+    history(lifecycle, "short", [0, 100])  # 記録の回数が足りない
+    assert lifecycle.leaks() == ["rising"]
+
+
+def test_leaks_window_slides():
+    n = sg.Lifecycle.samples
+    lifecycle = sg.Lifecycle(detect=True)
+    history(lifecycle, "burst", [0] * (n - 1) + [100])
+    assert lifecycle.leaks() == ["burst"]
+    history(lifecycle, "burst", [50])  # 古い記録は捨てられ，直近で減っている
+    assert lifecycle.leaks() == []
+
+
+def test_stopped_enemy_is_kept(assets):
+    enemy = sg.Enemy(random.Random(0))
+    enemy.rect.center = sg.WIDTH - 200, 300  # 画面内で止まっている
+    assert not sg.Enemy.despawn.expired(enemy, 10**6)
@@ -0,0 +1,43 @@
+import pygame as pg
+
+import shootinggame as sg
+
+
+def test_evict_keeps_pinned_and_used(assets):
+    game = sg.Game(seed=1)
+    pinned = set(sg.ROTATIONS.images)
+    unused = sg.TEXTS.render("unused", 10, (255, 255, 255))
+    startup = sg.ASSETS.derive(("test", 1), lambda: pg.Surface((4, 4)))
+    ledger = sg.MemoryLedger()
+    ledger.pin()
+    used = sg.ASSETS.derive(("test", 2), lambda: pg.Surface((4, 4)))
+    game.drops.add(pg.sprite.Sprite())
+    next(iter(game.drops)).image = used  # ゲームが今使っている
+    spare = sg.ASSETS.derive(("test", 3), lambda: pg.Surface((4, 4)))
+    evicted = ledger.evict(game)
+    assert evicted["AssetRegistry.derived"] == 1
+    assert sg.ASSETS.derived[("test", 1)] is startup  # 起動時に作ったもの
+    assert sg.ASSETS.derived[("test", 2)] is used
+    assert ("test", 3) not in sg.ASSETS.derived and spare is not None
+    assert set(sg.ROTATIONS.images) == pinned
+    assert unused in sg.TEXTS.surfaces.values()
+    assert ledger.evict(game) == {}
+    game.drops.empty()
+    del sg.ASSETS.derived[("test", 1)], sg.ASSETS.derived[("test", 2)]
+
+
+def test_check_warns_once_and_stalls(assets, monkeypatch, caplog):
+    game = sg.Game(seed=1)
+    ledger = sg.MemoryLedger()
+    ledger.pin()
+    ledger.configure(0.001)
+    calls = []
+    monkeypatch.setattr(ledger, "evict", lambda game: calls.append(game) or {})
+    for _ in range(3):
+        ledger.check(game)
+    assert len(calls) == 1  # 捨てても減らなければ，合計が変わるまで捨て直さない
+    assert len([r for r in caplog.records if r.levelname == "WARNING"]) == 1
+    ledger.start_episode()
+    ledger.check(game)
+    assert len(calls) == 2
+    assert len([r for r in caplog.records if r.levelname == "WARNING"]) == 2
@@ -0,0 +1,20 @@
+import pygame as pg
+
+import shootinggame as sg
+
+
+def test_overlay_renders_only_changed_lines(assets, monkeypatch):
+    profiler = sg.FrameProfiler()
+    profiler.configure(overlay=True)
+    screen = pg.Surface((400, 300))
+    rendered = []
+    render = sg.TEXTS.render
+    monkeypatch.setattr(sg.TEXTS, "render", lambda text, *args: rendered.append(text) or render(text, *args))
+    counts = {"emys": 1}
+    profiler.draw_overlay(screen, 60.0, counts)
+    assert len(rendered) == 2  # FPSの行とスプライト数の行
+    for _ in range(sg.FrameProfiler.refresh - 1):  # 書き換える間隔までは描き直さない
+        profiler.draw_overlay(screen, 30.0, {"emys": 2})
+    assert len(rendered) == 2
+    profiler.draw_overlay(screen, 60.0, {"emys": 2})
+    assert rendered[2:] == ["emys 2"]  # FPSの行は変わっていない
@@ -0,0 +1,147 @@
+import json
+import random
+import struct
+import zlib
+
+import pygame as pg
+import pytest
+
+import shootinggame as sg
+
+
+def play(game: sg.Game, recorder: sg.InputRecorder, frames: int):
+    """
+    乱数で決めた入力（移動キーとビームの発射）でゲームを進め，入力を記録する
+    """
+    rng = random.Random(0)
+    for _ in range(frames):
+        key_lst = {k: rng.random() < 0.3 for k in sg.InputRecorder.keys}
+        events = [pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE)] if rng.random() < 0.2 else []
+        recorder.record(key_lst, events)
+        for event in events:
+            game.handle_event(event)
+        game.step(key_lst)
+
+
+def replay(player: sg.InputReplay, game: sg.Game):
+    """
+    記録の終わりまで入力を再生する
+    """
+    while (frame := player.next()) is not None:
+        key_lst, events = frame
+        for event in events:
+            game.handle_event(event)
+        game.step(key_lst)
+
+
+@pytest.mark.parametrize("soa", [False, True])
+def test_round_trip(assets, tmp_path, soa):
+    game = sg.Game(soa=soa, seed=1234)
+    recorder = sg.InputRecorder(game)
+    play(game, recorder, 600)
+    path = tmp_path / "run.rec"
+    recorder.save(str(path))
+    player = sg.InputReplay(str(path))
+    assert (player.seed, player.soa, player.stage) == (1234, soa, sg.Game.stage_file)
+    replayed = player.new_game()
+    replay(player, replayed)
+    assert player.frames == 600
+    assert replayed.summary() == game.summary()
+    assert player.verify(replayed)
+
+
+def test_short_replay_mismatch(assets, tmp_path):
+    game = sg.Game(seed=5)
+    recorder = sg.InputRecorder(game)
+    play(game, recorder, 300)
+    path = tmp_path / "run.rec"
+    recorder.save(str(path))
+    player = sg.InputReplay(str(path))
+    replayed = player.new_game()
+    for _ in range(299):  # 最後のフレームを進めない
+        key_lst, events = player.next()
+        for event in events:
+            replayed.handle_event(event)
+        replayed.step(key_lst)
+    assert not player.verify(replayed)
+
+
+def test_stage_checked(assets, tmp_path):
+    with open(sg.Game.stage_file, encoding="utf-8") as f:
+        stage = json.load(f)
+    recorded = tmp_path / "recorded.json"
+    recorded.write_text(json.dumps(stage), encoding="utf-8")
+    stage["name"] += "_changed"
+    changed = tmp_path / "changed.json"
+    changed.write_text(json.dumps(stage), encoding="utf-8")
+
+    game = sg.Game(seed=7, stage=str(recorded))
+    recorder = sg.InputRecorder(game)
+    play(game, recorder, 50)
+    path = tmp_path / "run.rec"
+    recorder.save(str(path))
+    player = sg.InputReplay(str(path))
+    assert player.stage == str(recorded)  # ゲームのディレクトリの外なので絶対パスのまま
+    assert player.new_game().stage_path == str(recorded)
+    with pytest.raises(ValueError):
+        player.new_game(str(changed))  # 内容が記録時と違う
+    recorded.unlink()
+    with pytest.raises(ValueError):
+        player.new_game()  # 記録時のステージが無い
+
+
+def record(tmp_path, frames: int = 200, seed: int = 11) -> tuple[sg.Game, sg.InputRecorder, str]:
+    """
+    乱数で決めた入力でゲームを進めて記録し，保存したファイル名とともに返す
+    """
+    game = sg.Game(seed=seed)
+    recorder = sg.InputRecorder(game)
+    play(game, recorder, frames)
+    path = str(tmp_path / "run.rec")
+    recorder.save(path)
+    return game, recorder, path
+
+
+def test_file_layout(assets, tmp_path):
+    game, recorder, path = record(tmp_path)
+    with open(path, "rb") as f:
+        blob = f.read()
+    header, stage_header = sg.InputRecorder.header, sg.InputRecorder.stage_header
+    magic, version, seed, flags, tick_rate, ticks, score, life, boss_hp, scene = header.unpack_from(blob)
+    assert (magic, version, seed, flags, tick_rate) == (b"SGIR", 2, 11, 0, 50)
+    assert (ticks, score, life) == (game.tmr, game.score.value, game.score.bird_life)
+    digest, size = stage_header.unpack_from(blob, header.size)
+    assert digest == sg.stage_digest(game.stage)
+    pos = header.size + stage_header.size
+    assert blob[pos:pos+size].decode("utf-8") == "stage/stage1.json"  # ゲームのディレクトリからの相対パス
+    data = zlib.decompress(blob[pos+size:])
+    assert data == bytes(recorder.data)
+    pos = frames = 0
+    while pos < len(data):  # 1フレームは 移動キーのビットマスク，KEYDOWNの数（各1バイト），キー番号（各4バイト）
+        pos += 2 + 4*data[pos+1]
+        frames += 1
+    assert (pos, frames) == (len(data), 200)
+
+
+def test_version1_file(assets, tmp_path):
+    game, recorder, path = record(tmp_path)
+    with open(path, "rb") as f:
+        blob = bytearray(f.read())
+    header, stage_header = sg.InputRecorder.header, sg.InputRecorder.stage_header
+    size = stage_header.unpack_from(blob, header.size)[1]
+    del blob[header.size:header.size + stage_header.size + size]  # ステージを記録していない古い形式
+    struct.pack_into("<H", blob, 4, 1)
+    old = tmp_path / "v1.rec"
+    old.write_bytes(bytes(blob))
+    player = sg.InputReplay(str(old))
+    assert player.stage is None
+    replayed = player.new_game()  # 既定のステージで再生する
+    replay(player, replayed)
+    assert player.verify(replayed)
+
+
+def test_not_a_recording(tmp_path):
+    path = tmp_path / "bad.rec"
+    path.write_bytes(b"XXXX" + bytes(sg.InputRecorder.header.size))
+    with pytest.raises(ValueError):
+        sg.InputReplay(str(path))
@@ -0,0 +1,81 @@
+import os
+
+import pygame as pg
+import pytest
+
+import shootinggame as sg
+
+TILE = os.path.join(sg.MAIN_DIR, "fig", "pg_bg.jpg")
+IMAGES = [os.path.join(sg.MAIN_DIR, "fig", name) for name in ("pg_bg.jpg", "2091142.png", "alien1.png", "alien2.png")]
+
+
+def make_background(count: int, length: int, loop: bool = False, size=(sg.WIDTH, sg.HEIGHT),
+                    distinct: bool = False) -> sg.TiledBackground:
+    """
+    幅sg.WIDTHのタイルをcount枚並べた背景を作る（最初の画面のタイルだけ先読みする）
+    distinctなら同じキーを共有しないよう，タイルごとに別の画像を使う
+    """
+    tiles = [(IMAGES[i] if distinct else TILE, i % 2 == 1, sg.WIDTH) for i in range(count)]
+    return sg.TiledBackground(tiles, length, size, loop=loop, lookahead=0)
+
+
+@pytest.mark.parametrize("left, right, expected", [
+    (0, 1600, [(0, 0)]),
+    (1000, 2600, [(0, 0), (1, 1600)]),
+    (1600, 3200, [(1, 1600)]),  # タイルの右端は次のタイルに含める
+    (3999, 5600, [(2, 3200)]),  # 最後のタイルより右には何も無い
+])
+def test_spans_without_loop(assets, left, right, expected):
+    bg = make_background(3, 3000)
+    assert list(bg.spans(left, right)) == expected
+
+
+@pytest.mark.parametrize("left, right, expected", [
+    (2400, 4000, [(1, 1600), (0, 3200)]),  # 1周目の終わりから2周目の先頭へつながる
+    (3200, 4800, [(0, 3200)]),  # ちょうど2周目の先頭
+    (3199, 4800, [(1, 1600), (0, 3200)]),
+    (6500, 8000, [(0, 6400)]),  # 3周目
+])
+def test_spans_with_loop(assets, left, right, expected):
+    bg = make_background(2, 9600, loop=True)
+    assert list(bg.spans(left, right)) == expected
+
+
+def test_spans_in_render_resolution(assets):
+    bg = make_background(2, 9600, loop=True, size=(800, 450))
+    assert list(bg.spans(2400, 4000)) == [(1, 800), (0, 1600)]  # 描画解像度での左端を返す
+
+
+def test_too_short_without_loop(assets):
+    with pytest.raises(ValueError):
+        make_background(2, 3000)  # 3000 + 画面の幅 > タイル2枚の幅
+
+
+def test_evict_least_recently_used(assets):
+    bg = make_background(4, 3000, size=(160, 90), distinct=True)
+    tiles = [bg.get(i) for i in range(4)]
+    tile_bytes = sg.surface_bytes(tiles[0])
+    assert bg.bytes == 4 * tile_bytes
+    bg.get(0)  # 0番を最近使ったことにする
+    bg.cap = 2 * tile_bytes
+    bg.evict(set())
+    assert list(bg.cache) == [bg.keys[3], bg.keys[0]]  # 古い1番と2番から捨てる
+    assert bg.bytes == 2 * tile_bytes
+    assert bg.stats["evicted"] == 2
+
+
+def test_evict_keeps_visible_tiles(assets):
+    bg = make_background(3, 3000, size=(160, 90), distinct=True)
+    for i in range(3):
+        bg.get(i)
+    bg.cap = 0
+    bg.evict({bg.keys[0], bg.keys[1]})  # 表示中と先読み中のタイルは上限を超えていても捨てない
+    assert list(bg.cache) == [bg.keys[0], bg.keys[1]]
+
+
+def test_draw_matches_single_image(assets):
+    bg = make_background(3, 3000, size=(160, 90))
+    screen = pg.Surface((160, 90)).convert()
+    bg.draw(screen, 0)
+    expected = pg.transform.smoothscale(pg.image.load(TILE), (160, 90)).convert()
+    assert pg.image.tobytes(screen, "RGB") == pg.image.tobytes(expected, "RGB")